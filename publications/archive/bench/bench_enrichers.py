@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the enrichment scripts end to end, offline, against local
+stand-ins for Crossref, OpenAlex, Unpaywall, OpenAI and publisher pages
+(bench/mock_services.py).
+
+Usage:
+    python bench/bench_enrichers.py                          # 80 rows, every scenario
+    python bench/bench_enrichers.py --rows 5000 --scenarios publications,ext-combined
+    python bench/bench_enrichers.py --error-rate 0.05 --server-errors 0.02 --pacing real
+    python bench/bench_enrichers.py --report runs/today.json --compare runs/last_week.json
+
+A synthetic corpus of --rows papers is generated (a Zotero export for
+enrich_publications.py, the website sheet for the mac scripts): most rows
+carry a synthetic DOI, about 10% only a title (resolved by title search) and
+about 3% a DOI and title no service knows. Each scenario runs in its own process with
+a fresh cache, so numbers are cold-start; --warm adds a second run on the
+warm cache.
+
+Per scenario the table shows rows/sec, p50/p95 per-row latency (from the
+checkpoint journal), requests per service, injected 429/5xx answers, peak
+RSS of the run, and how many rows came out correct (journal, citation count,
+og:image or an LLM field, checked against what the mocks served).
+
+--pacing off (default) lifts client-side per-host pacing so the numbers show
+the scripts' own overhead and concurrency; --pacing real keeps the rates of
+the real hosts and shows what politeness costs. --report writes everything
+as JSON, including the settings; --compare prints the change against an
+earlier report made with the same settings.
+"""
+import argparse
+import csv
+import datetime as dt
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH)
+
+import mock_services  # noqa: E402
+from mock_services import MISSING_PREFIX, expected  # noqa: E402
+
+NO_DOI_SHARE = 0.10
+MISSING_SHARE = 0.03
+
+Corpus = List[Tuple[str, int]]  # (kind, n) per row: kind is "doi", "title" or "missing"
+
+
+# ---- corpus ----
+def make_corpus(rows: int, seed: int = 7) -> Corpus:
+    rnd = random.Random(seed)
+    out: Corpus = []
+    for n in range(rows):
+        roll = rnd.random()
+        out.append(("title" if roll < NO_DOI_SHARE else "missing" if roll < NO_DOI_SHARE + MISSING_SHARE else "doi", n))
+    return out
+
+
+def _fields(kind: str, n: int) -> Dict[str, str]:
+    e = expected(n)
+    doi = {"doi": e["doi"], "missing": f"{MISSING_PREFIX}{n}", "title": ""}[kind]
+    # unknown DOIs get a title no search finds either, so the right answer is a blank row
+    title = f"Unindexed working paper {n}" if kind == "missing" else e["title"]
+    authors = f"{e['first_author']}, Adrian C.; Doe, Jane; Smith, Bob K."
+    return {"title": title, "authors": authors, "year": str(e["year"]), "doi": doi}
+
+
+def write_zotero(path: str, corpus: Corpus) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["Key", "Item Type", "Publication Year", "Author", "Title", "Publication Title", "DOI", "Url"])
+        for kind, n in corpus:
+            r = _fields(kind, n)
+            w.writerow([f"BENCH{n}", "journalArticle", r["year"], r["authors"], r["title"], "", r["doi"], ""])
+
+
+def write_sheet(path: str, corpus: Corpus) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=["title", "authors", "year", "doi"])
+        w.writeheader()
+        for kind, n in corpus:
+            w.writerow(_fields(kind, n))
+
+
+# ---- scenarios ----
+class Scenario:
+    def __init__(self, name: str, script: str, corpus: str, argv: Callable[[argparse.Namespace, str], List[str]],
+                 check: Callable[[str, Corpus], Tuple[int, int]]):
+        self.name = name
+        self.script = script
+        self.corpus = corpus  # "zotero" or "sheet"
+        self.argv = argv      # (args, workdir) -> script arguments
+        self.check = check    # (workdir, corpus) -> (rows correct, rows checked)
+
+
+def _num(v: Any) -> Optional[float]:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def check_publications(work: str, corpus: Corpus) -> Tuple[int, int]:
+    """DOI rows need the right citation count and og:image; unknown DOIs must stay blank."""
+    with open(os.path.join(work, "out.json"), "r", encoding="utf-8") as f:
+        by_doi = {r.get("doi"): r for r in json.load(f)}
+    good = checked = 0
+    for kind, n in corpus:
+        if kind == "title":
+            continue  # enrich_publications.py only looks rows up by DOI
+        checked += 1
+        if kind == "missing":
+            rec = by_doi.get(f"{MISSING_PREFIX}{n}") or {}
+            good += rec.get("citation_count") in (None, "")
+        else:
+            e = expected(n)
+            rec = by_doi.get(e["doi"]) or {}
+            good += (rec.get("citation_count") == e["citation_count"]
+                     and str(rec.get("image_url") or "").endswith(e["image_path"]))
+    return good, checked
+
+
+def check_sheet(llm_column: str, with_citations: bool) -> Callable[[str, Corpus], Tuple[int, int]]:
+    """Rows with a DOI or a title need the right journal (and count) plus a filled LLM column."""
+    def check(work: str, corpus: Corpus) -> Tuple[int, int]:
+        with open(os.path.join(work, "out.csv"), "r", newline="", encoding="utf-8") as f:
+            out = list(csv.DictReader(f))
+        good = 0
+        for (kind, n), row in zip(corpus, out):
+            e = expected(n)
+            if kind == "missing":
+                good += not row.get("journal")
+                continue
+            ok = row.get("journal") == e["journal"] and bool((row.get(llm_column) or "").strip())
+            if with_citations:
+                ok = ok and _num(row.get("citation_count")) == e["citation_count"]
+            good += ok
+        return good, len(corpus)
+    return check
+
+
+def _llm_args(args: argparse.Namespace) -> List[str]:
+    unlimited = args.pacing == "off"
+    return ["--llm_workers", str(args.llm_workers),
+            "--llm_rpm", "1000000" if unlimited else "500", "--llm_tpm", "1000000000" if unlimited else "200000"]
+
+
+def _publications(concurrency: Optional[int]) -> Callable[[argparse.Namespace, str], List[str]]:
+    def argv(args: argparse.Namespace, work: str) -> List[str]:
+        return ["--in", os.path.join(work, "corpus.csv"), "--email", "bench@example.org", "--fast",
+                "--concurrency", str(concurrency or args.concurrency),
+                "--out", os.path.join(work, "out.csv"), "--json", os.path.join(work, "out.json"),
+                "--cache", os.path.join(work, "cache.sqlite"), "--checkpoint", os.path.join(work, "journal.jsonl")]
+    return argv
+
+
+def _sheet(*extra: str) -> Callable[[argparse.Namespace, str], List[str]]:
+    def argv(args: argparse.Namespace, work: str) -> List[str]:
+        return (["--in", os.path.join(work, "corpus.csv"), "--out", os.path.join(work, "out.csv"),
+                 "--cache", os.path.join(work, "cache.sqlite"), "--checkpoint", os.path.join(work, "journal.jsonl")]
+                + _llm_args(args) + list(extra))
+    return argv
+
+
+SCENARIOS: Dict[str, Scenario] = {s.name: s for s in [
+    Scenario("publications", "enrich_publications", "zotero", _publications(None), check_publications),
+    Scenario("publications-serial", "enrich_publications", "zotero", _publications(1), check_publications),
+    Scenario("mac", "enrich_pubs_mac", "sheet", _sheet(), check_sheet("plain_summary", False)),
+    Scenario("ext-combined", "enrich_pubs_mac_ext", "sheet", _sheet("--llm_mode", "combined"),
+             check_sheet("study_type", True)),
+    Scenario("ext-separate", "enrich_pubs_mac_ext", "sheet", _sheet("--llm_mode", "separate"),
+             check_sheet("study_type", True)),
+]}
+
+
+# ---- running ----
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def journal_latencies(path: str) -> List[float]:
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                continue  # torn last line
+            if isinstance(e.get("elapsed"), (int, float)):
+                out.append(e["elapsed"])
+    return out
+
+
+def _diff(after: Dict[str, Dict[str, int]], before: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+    return {svc: {k: v - before.get(svc, {}).get(k, 0) for k, v in st.items()} for svc, st in after.items()}
+
+
+def run_scenario(sc: Scenario, work: str, corpus: Corpus, services: "mock_services.Services",
+                 args: argparse.Namespace) -> Dict[str, Any]:
+    journal = os.path.join(work, "journal.jsonl")
+    if os.path.exists(journal):
+        os.remove(journal)
+    stats_path = os.path.join(work, "stats.json")
+    cmd = [sys.executable, os.path.join(BENCH, "run_enricher.py"), "--script", sc.script, "--stats", stats_path,
+           "--pacing", args.pacing]
+    for name in mock_services.SERVICES:
+        cmd += [f"--{name}", services.url(name)]
+    cmd += ["--"] + sc.argv(args, work)
+
+    before = services.stats()
+    with open(os.path.join(work, "log.txt"), "a", encoding="utf-8") as log:
+        proc = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT, cwd=work)
+    traffic = _diff(services.stats(), before)
+    try:
+        with open(stats_path, "r", encoding="utf-8") as f:
+            run = json.load(f)
+    except (OSError, ValueError):
+        run = {"wall_s": 0.0, "import_s": 0.0, "peak_rss_mb": 0.0, "exit": proc.returncode}
+
+    lat = journal_latencies(journal) if os.path.exists(journal) else []
+    try:
+        good, checked = sc.check(work, corpus) if proc.returncode == 0 else (0, len(corpus))
+    except (OSError, ValueError, KeyError):
+        good, checked = 0, len(corpus)
+    wall = run["wall_s"] or 1e-9
+    return {
+        "exit": proc.returncode,
+        "rows": len(lat),
+        "wall_s": run["wall_s"],
+        "import_s": run["import_s"],
+        "rows_per_s": round(len(lat) / wall, 2),
+        "p50_s": round(percentile(lat, 0.50), 3),
+        "p95_s": round(percentile(lat, 0.95), 3),
+        "peak_rss_mb": run["peak_rss_mb"],
+        "requests": {svc: st.get("requests", 0) for svc, st in traffic.items()},
+        "throttled": sum(st.get("429", 0) for st in traffic.values()),
+        "server_errors": sum(st.get("5xx", 0) for st in traffic.values()),
+        "not_modified": sum(st.get("304", 0) for st in traffic.values()),
+        "correct": good,
+        "checked": checked,
+    }
+
+
+# ---- reporting ----
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    head = (f"{'scenario':<24}{'rows':>6}{'wall s':>9}{'rows/s':>9}{'p50 s':>8}{'p95 s':>8}"
+            f"{'cr':>6}{'oa':>6}{'ua':>6}{'pages':>6}{'llm':>6}{'429/5xx':>9}{'RSS MB':>8}{'correct':>12}")
+    print(head)
+    print("-" * len(head))
+    for name, r in results.items():
+        q = r["requests"]
+        flag = "" if r["exit"] == 0 else f"  (exit {r['exit']}, see log.txt)"
+        print(f"{name:<24}{r['rows']:>6}{r['wall_s']:>9.1f}{r['rows_per_s']:>9.1f}{r['p50_s']:>8.2f}{r['p95_s']:>8.2f}"
+              f"{q.get('crossref', 0):>6}{q.get('openalex', 0):>6}{q.get('unpaywall', 0):>6}{q.get('pages', 0):>6}"
+              f"{q.get('openai', 0):>6}{str(r['throttled']) + '/' + str(r['server_errors']):>9}{r['peak_rss_mb']:>8.0f}"
+              f"{str(r['correct']) + '/' + str(r['checked']):>12}{flag}")
+
+
+def compare(report: Dict[str, Any], prev_path: str) -> None:
+    with open(prev_path, "r", encoding="utf-8") as f:
+        prev = json.load(f)
+    changed = {k for k in set(report["config"]) | set(prev.get("config", {}))
+               if k not in ("report", "compare", "keep", "scenarios", "warm") and report["config"].get(k) != prev.get("config", {}).get(k)}
+    if changed:
+        print(f"Note: settings differ from {prev_path}: {', '.join(sorted(changed))}")
+    print(f"\nChange against {prev_path} ({prev.get('created', '?')}):")
+    for name, r in report["results"].items():
+        p = prev.get("results", {}).get(name)
+        if not p:
+            continue
+
+        def pct(key: str) -> str:
+            return f"{(r[key] - p[key]) / p[key] * 100:+.0f}%" if p.get(key) else "n/a"
+        print(f"  {name:<24} rows/s {pct('rows_per_s'):>6}   p95 {pct('p95_s'):>6}   RSS {pct('peak_rss_mb'):>6}"
+              f"   requests {sum(r['requests'].values()) - sum(p['requests'].values()):+d}"
+              f"   correct {r['correct'] - p['correct']:+d}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--rows", type=int, default=80, help="Synthetic corpus size (80 to 50000)")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated: {', '.join(SCENARIOS)}")
+    ap.add_argument("--pacing", choices=["off", "real"], default="off", help="Client-side per-host pacing")
+    ap.add_argument("--concurrency", type=int, default=8, help="enrich_publications.py --concurrency")
+    ap.add_argument("--llm-workers", dest="llm_workers", type=int, default=8, help="--llm_workers of the mac scripts")
+    ap.add_argument("--warm", action="store_true", help="Also re-run each scenario on its warm cache")
+    ap.add_argument("--seed", type=int, default=7, help="Corpus seed")
+    ap.add_argument("--report", default="", help="Write the results as JSON here")
+    ap.add_argument("--compare", default="", help="Earlier --report to compare against")
+    ap.add_argument("--keep", action="store_true", help="Keep the work directory (outputs, logs, caches)")
+    mock_services.add_arguments(ap)
+    args = ap.parse_args()
+
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenario(s): {', '.join(unknown)}")
+
+    corpus = make_corpus(args.rows, args.seed)
+    services = mock_services.start_from_args(args)
+    root = tempfile.mkdtemp(prefix="bench_enrichers_")
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for name in names:
+            sc = SCENARIOS[name]
+            work = os.path.join(root, name)
+            os.makedirs(work)
+            (write_zotero if sc.corpus == "zotero" else write_sheet)(os.path.join(work, "corpus.csv"), corpus)
+            for label in [name] + ([name + "+warm"] if args.warm else []):
+                print(f"Running {label} ({args.rows} rows)...", flush=True)
+                results[label] = run_scenario(sc, work, corpus, services, args)
+    finally:
+        services.stop()
+        if args.keep:
+            print(f"Work directory kept: {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print()
+    print_table(results)
+    report = {
+        "created": dt.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "results": results,
+    }
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport: {args.report}")
+    if args.compare:
+        compare(report, args.compare)
+    if any(r["exit"] != 0 for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
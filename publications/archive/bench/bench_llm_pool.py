@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: LLM calls one at a time vs several at once, run the way the sheet
+scripts run them (a pipeline stage in the shared "llm" group, enrichkit/pipeline.py),
+against the local OpenAI stub (bench/openai_stub.py).
+
+Usage:
+    python bench/bench_llm_pool.py                      # 80 rows, 1 vs 8 workers
+    python bench/bench_llm_pool.py --rows 200 --workers 16 --latency 0.5 --error-rate 0.05
+    python bench/bench_llm_pool.py --rpm 120            # watch the budget cap throughput
+
+Each row asks for the combined AI fields (llm.enrich_fields) under the shared
+BUDGET; the stub echoes the title, so the run fails (exit 1) if any result is
+written back to the wrong row.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from enrichkit import llm  # noqa: E402
+from enrichkit.pipeline import Pipeline, Stage  # noqa: E402
+from openai_stub import serve  # noqa: E402
+
+FIELDS = ["plain_summary", "why_it_matters", "study_type", "sdg_tags", "keywords"]
+
+
+def run(rows: int, workers: int, rpm: float, tpm: float):
+    llm.configure_budget(rpm=rpm, tpm=tpm)
+    pipe = Pipeline([
+        Stage("ai", lambda c: {"ai": llm.enrich_fields(c["title"], c["abstract"], FIELDS)},
+              needs=("title", "abstract"), gives=("ai",), limit=workers, group="llm"),
+    ])
+    results = {}
+
+    def finish(i, ctx, err, secs):
+        if err is None:
+            results[i - 1] = ctx["ai"]
+
+    t0 = time.perf_counter()
+    pipe.run_sync(({"title": f"Paper {i}", "abstract": "An abstract about kelp forests. " * 20}
+                   for i in range(rows)), finish, window=workers * 2)
+    secs = time.perf_counter() - t0
+    wrong = [i for i in range(rows) if f"Paper {i}." not in results.get(i, {}).get("plain_summary", "")]
+    return secs, wrong, llm.BUDGET.summary()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--rows", type=int, default=80)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--latency", type=float, default=0.3, help="Stub seconds per completion")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Stub 429 fraction")
+    ap.add_argument("--rpm", type=float, default=llm.DEFAULT_RPM)
+    ap.add_argument("--tpm", type=float, default=llm.DEFAULT_TPM)
+    args = ap.parse_args()
+
+    server = serve(0, args.latency, args.error_rate, retry_after=0.5)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    if not llm.available():
+        sys.exit("openai package not installed")
+
+    failed = False
+    for workers in sorted({1, args.workers}):
+        secs, wrong, budget = run(args.rows, workers, args.rpm, args.tpm)
+        print(f"workers={workers:<3} {secs:7.2f} s  {args.rows / secs:6.1f} rows/s  wrong rows: {len(wrong)}")
+        print(f"             {budget}")
+        failed |= bool(wrong)
+    print(f"stub: {server.stats['requests']} requests, {server.stats['429']} answered 429")
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
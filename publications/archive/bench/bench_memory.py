@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark and check: memory per record of the scripts' in-memory results.
+
+Usage:
+    python bench/bench_memory.py                       # 50,000 records per shape
+    python bench/bench_memory.py --rows 200000 --shapes metadata
+
+Two record shapes, filled with synthetic values at realistic cardinalities
+(about 1,500 journals, 80 publishers, 400 funders, 20,000 author names, small
+tag vocabularies; titles, abstracts, summaries and URLs unique):
+
+  publications  the EnrichedRow dicts enrich_publications.py keeps per finished row
+  metadata      crossref_fields() output as the mac scripts prefetch it per DOI
+
+Each record goes through json.loads first, so every string is its own
+object, as when it comes off the network or out of the checkpoint journal.
+Three ways of holding them are compared by the bytes tracemalloc still sees
+allocated once all records are in:
+
+  dicts         {key: record}, what the scripts kept before enrichkit/records.py
+  DataFrame     pandas, one row per record, built from the same dicts
+  RecordStore   enrichkit/records.py
+
+Build is the time to take in all records, read the time to get every record
+back as a dict. Fails (exit 1) if any record read back from the RecordStore
+differs from what went in.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enrichkit.records import RecordStore  # noqa: E402
+
+WORDS = ("kelp urchin reef coral fish predator grazing recruitment settlement larval dispersal "
+         "habitat cascade trophic disturbance recovery resilience climate warming heatwave "
+         "nutrient herbivore invertebrate abundance density growth mortality survival model "
+         "bayesian spatial temporal experiment field survey community ecology marine coastal").split()
+THEMES = ["Coral", "Kelp", "Fisheries", "Climate", "Food webs", "Disease", "Restoration", "Methods",
+          "Conservation", "Larval ecology", "Predation", "Mutualism"]
+METHODS = ["Field experiment", "Survey", "Meta-analysis", "Model", "Lab experiment", "Time series",
+           "Remote sensing", "Genomics", "Stable isotopes", "Telemetry", "Eco-physiology", "Review",
+           "Simulation", "Bayesian", "Mark-recapture"]
+IMPACTS = ["Management", "Policy", "Conservation", "Fisheries", "Restoration", "Education", "Media", "Data"]
+REGIONS = ["Moorea", "Santa Barbara Channel", "Caribbean", "Great Barrier Reef", "Hawaii",
+           "Gulf of California", "Red Sea", "Channel Islands", "Global", ""]
+AUDIENCES = ["Research", "Practitioner", "Policy", "Public"]
+
+
+def _phrase(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+class Corpus:
+    """Pools of repeated values, and records drawn from them (the same records for the same seed)."""
+
+    def __init__(self, seed: int):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.journals = [(f"Journal of {_phrase(rng, 2).title()} {i}", f"J. {i}", f"{1000 + i:04d}-{i % 9000:04d}")
+                         for i in range(1500)]
+        self.publishers = [f"{_phrase(rng, 1).title()} Press {i}" for i in range(80)]
+        self.funders = [f"{_phrase(rng, 2).title()} Foundation {i}" for i in range(400)]
+        self.authors = [f"{chr(65 + i % 26)}. {_phrase(rng, 1).title()}{i}" for i in range(20000)]
+        self.subjects = [_phrase(rng, 2).title() for _ in range(300)]
+
+    def lines(self, shape: str, rows: int) -> List[str]:
+        """The records as JSON text, generated up front (outside the measurement)."""
+        rng = random.Random(self.seed * 7919 + len(shape))
+        make = self._publication if shape == "publications" else self._metadata
+        return [json.dumps(make(rng, i)) for i in range(rows)]
+
+    def _people(self, rng: random.Random) -> str:
+        return "; ".join(rng.choice(self.authors) for _ in range(rng.randint(2, 8)))
+
+    def _publication(self, rng: random.Random, i: int) -> Dict[str, Any]:
+        return {
+            "title": f"{_phrase(rng, 8).capitalize()} {i}",
+            "authors": self._people(rng),
+            "year": str(rng.randint(1995, 2025)),
+            "doi": f"10.5555/bench.{i}",
+            "plain_summary": f"{_phrase(rng, 60).capitalize()}.",
+            "why_it_matters": f"{_phrase(rng, 30).capitalize()}.",
+            "theme_tags": rng.sample(THEMES, rng.randint(1, 3)),
+            "audience_level": rng.choice(AUDIENCES),
+            "featured": None,
+            "open_access": rng.random() < 0.6,
+            "data_code_links": [f"https://github.com/lab/repo-{i}"] if rng.random() < 0.2 else [],
+            "policy_relevance": None,
+            "press_links": [],
+            "image_url": f"https://example.org/figures/{i}.png",
+            "alt_text": f"Figure from {_phrase(rng, 4)} {i}",
+            "impact_tags": rng.sample(IMPACTS, rng.randint(0, 2)),
+            "citation_count": rng.randint(0, 400),
+            "funders": rng.sample(self.funders, rng.randint(0, 3)),
+            "region_system": rng.choice(REGIONS),
+            "methods_tags": rng.sample(METHODS, rng.randint(0, 3)),
+            "source_url": f"https://example.org/article/{i}",
+        }
+
+    def _metadata(self, rng: random.Random, i: int) -> Dict[str, Any]:
+        journal, abbrev, issn = rng.choice(self.journals)
+        return {
+            "title": f"{_phrase(rng, 8).capitalize()} {i}",
+            "journal": journal,
+            "journal_abbrev": abbrev,
+            "volume": str(rng.randint(1, 120)),
+            "issue": str(rng.randint(1, 12)),
+            "pages": f"{rng.randint(1, 900)}-{rng.randint(901, 999)}",
+            "year": rng.randint(1995, 2025),
+            "publisher": rng.choice(self.publishers),
+            "url": f"https://doi.org/10.5555/bench.{i}",
+            "authors": self._people(rng),
+            "abstract": f"{_phrase(rng, 180).capitalize()}.",
+            "doi": f"10.5555/bench.{i}",
+            "issn": issn,
+            "keywords": "; ".join(rng.sample(self.subjects, rng.randint(0, 5))),
+        }
+
+
+# ---- holders ----
+def parsed(lines: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(DOI, record) per line; json.loads makes every string its own object, as off the wire."""
+    for line in lines:
+        rec = json.loads(line)
+        yield rec["doi"], rec
+
+
+def build_dicts(records: Iterator[Tuple[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    return dict(records)
+
+
+def build_frame(records: Iterator[Tuple[str, Dict[str, Any]]]) -> Any:
+    import pandas as pd
+
+    keys, rows = [], []
+    for key, rec in records:
+        keys.append(key)
+        rows.append(rec)
+    return pd.DataFrame(rows, index=keys)
+
+
+def build_store(records: Iterator[Tuple[str, Dict[str, Any]]]) -> RecordStore:
+    store = RecordStore()
+    for key, rec in records:
+        store[key] = rec
+    return store
+
+
+def read_all(holder: Any) -> int:
+    if hasattr(holder, "to_dict") and not isinstance(holder, dict):
+        return len(holder.to_dict("records"))
+    return sum(1 for _ in holder.items())
+
+
+HOLDERS: List[Tuple[str, Callable[[Iterator[Tuple[str, Dict[str, Any]]]], Any]]] = [
+    ("dicts", build_dicts),
+    ("DataFrame", build_frame),
+    ("RecordStore", build_store),
+]
+
+
+def measure(build: Callable[..., Any], lines: List[str]) -> Tuple[Any, int, float]:
+    """(holder, bytes it keeps allocated, build seconds); timed in a separate run without tracemalloc."""
+    gc.collect()
+    t0 = time.perf_counter()
+    build(parsed(lines))
+    secs = time.perf_counter() - t0
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    holder = build(parsed(lines))
+    gc.collect()
+    kept = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return holder, kept, secs
+
+
+def check(store: RecordStore, lines: List[str]) -> int:
+    """Records that do not read back exactly as stored."""
+    return sum(1 for key, rec in parsed(lines) if store.get(key) != rec)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--rows", type=int, default=50000, help="Records per shape")
+    ap.add_argument("--shapes", default="publications,metadata", help="Comma-separated: publications, metadata")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    import pandas  # noqa: F401  (imported up front so its own memory is not counted)
+
+    corpus = Corpus(args.seed)
+    failed = False
+    print(f"{'shape':<14}{'holder':<13}{'bytes/rec':>10}{'total MB':>10}{'vs dicts':>10}{'build s':>9}{'read s':>8}")
+    for shape in args.shapes.split(","):
+        lines = corpus.lines(shape, args.rows)
+        base = None
+        for name, build in HOLDERS:
+            holder, kept, secs = measure(build, lines)
+            t0 = time.perf_counter()
+            read_all(holder)
+            read = time.perf_counter() - t0
+            base = kept if base is None else base
+            print(f"{shape:<14}{name:<13}{kept / args.rows:>10.0f}{kept / 2**20:>10.1f}"
+                  f"{kept / base:>9.2f}x{secs:>9.2f}{read:>8.2f}")
+            if isinstance(holder, RecordStore):
+                bad = check(holder, lines)
+                if bad:
+                    print(f"  {bad} record(s) did not read back as stored  <- FAIL")
+                    failed = True
+            del holder
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the stage pipeline (enrichkit/pipeline.py) against running the same
+steps one row at a time, with sleeps standing in for network latency.
+
+Usage:
+    python bench/bench_pipeline.py                      # 60 rows, window 16
+    python bench/bench_pipeline.py --rows 200 --meta 0.2 --llm 0.8 --window 32
+
+Stages mirror enrich_pubs_mac_ext.py in separate mode: metadata, then three
+independent LLM prompts sharing one worker limit. Each stage echoes the row
+number, so the run fails (exit 1) if a result lands on the wrong row.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enrichkit.pipeline import Pipeline, Stage  # noqa: E402
+
+
+def build(meta: float, llm: float, meta_workers: int, llm_workers: int) -> Pipeline:
+    def fetch(c):
+        time.sleep(meta)
+        return {"meta": {"n": c["n"]}}
+
+    def prompt(name):
+        def run(c):
+            time.sleep(llm)
+            return {name: c["meta"]["n"]}
+        return Stage(name, run, needs=("meta",), gives=(name,), limit=llm_workers, group="llm")
+
+    return Pipeline([Stage("metadata", fetch, needs=("n",), gives=("meta",), limit=meta_workers)]
+                    + [prompt(p) for p in ("summaries", "classify", "keywords")])
+
+
+def run(pipe: Pipeline, rows: int, window: int):
+    wrong = []
+
+    def check(i, ctx, err, secs):
+        if err or any(ctx[k] != ctx["n"] for k in ("summaries", "classify", "keywords")):
+            wrong.append(i)
+
+    t0 = time.perf_counter()
+    pipe.run_sync(({"n": n} for n in range(rows)), check, window=window)
+    return time.perf_counter() - t0, wrong
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--rows", type=int, default=60)
+    ap.add_argument("--meta", type=float, default=0.1, help="Seconds per metadata fetch")
+    ap.add_argument("--llm", type=float, default=0.4, help="Seconds per LLM completion")
+    ap.add_argument("--window", type=int, default=16, help="Rows in flight")
+    ap.add_argument("--meta-workers", type=int, default=4)
+    ap.add_argument("--llm-workers", type=int, default=8)
+    args = ap.parse_args()
+
+    failed = False
+    for label, window, mw, lw in (("serial", 1, 1, 1), ("pipeline", args.window, args.meta_workers, args.llm_workers)):
+        pipe = build(args.meta, args.llm, mw, lw)
+        secs, wrong = run(pipe, args.rows, window)
+        print(f"{label:<9} {secs:7.2f} s  {args.rows / secs:6.1f} rows/s  wrong rows: {len(wrong)}")
+        print(pipe.summary())
+        failed |= bool(wrong)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark and check: peak memory of reading a Zotero export, whole vs streamed.
+
+Usage:
+    python bench/bench_reader.py                          # 10,000 and 40,000 rows
+    python bench/bench_reader.py --rows 20000,80000,160000 --chunk-size 2000
+
+Writes synthetic Zotero exports as wide as the real ones (the usual 87
+columns, with abstracts, notes and file paths filled in) and reads each in a
+fresh interpreter two ways, parsing every row as enrich_publications.py
+does (parse_input_row):
+
+  whole     read_table() and df.to_dict(orient="records"), the script's old load
+  streamed  iter_rows() over INPUT_COLUMNS (enrichkit/tables.py), its load now
+
+Peak RSS is reported above an interpreter that imported the same modules and
+read nothing. Fails (exit 1) if the streamed peak for the largest file is
+more than --max-growth times the one for the smallest (memory should follow
+the chunk size, not the file), or if the two ways parse any row differently.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+ARCHIVE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ARCHIVE)
+
+ZOTERO_COLUMNS = [
+    "Key", "Item Type", "Publication Year", "Author", "Title", "Publication Title", "ISBN", "ISSN", "DOI",
+    "Url", "Abstract Note", "Date", "Date Added", "Date Modified", "Access Date", "Pages", "Num Pages",
+    "Issue", "Volume", "Number Of Volumes", "Journal Abbreviation", "Short Title", "Series",
+    "Series Number", "Series Text", "Series Title", "Publisher", "Place", "Language", "Rights", "Type",
+    "Archive", "Archive Location", "Library Catalog", "Call Number", "Extra", "Notes", "File Attachments",
+    "Link Attachments", "Manual Tags", "Automatic Tags", "Editor", "Series Editor", "Translator",
+    "Contributor", "Attorney Agent", "Book Author", "Cast Member", "Commenter", "Composer",
+    "Cosponsor", "Counsel", "Interviewer", "Producer", "Recipient", "Reviewed Author", "Scriptwriter",
+    "Words By", "Guest", "Number", "Edition", "Running Time", "Scale", "Medium", "Artwork Size",
+    "Filing Date", "Application Number", "Assignee", "Issuing Authority", "Country", "Meeting Name",
+    "Conference Name", "Court", "References", "Reporter", "Legal Status", "Priority Numbers",
+    "Programming Language", "Version", "System", "Code", "Code Number", "Section", "Session",
+    "Committee", "History", "Legislative Body",
+]
+WORDS = ("kelp urchin reef coral fish predator grazing recruitment settlement larval dispersal habitat "
+         "cascade trophic disturbance recovery resilience climate warming nutrient herbivore").split()
+FILLED = {"Abstract Note": 150, "Notes": 60, "Extra": 12, "Manual Tags": 6, "Automatic Tags": 10,
+          "File Attachments": 4, "Publication Title": 4, "Publisher": 2, "Library Catalog": 1}
+
+
+def write_export(path: str, rows: int, seed: int = 3) -> None:
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(ZOTERO_COLUMNS)
+        for i in range(rows):
+            row: Dict[str, Any] = {c: "" for c in ZOTERO_COLUMNS}
+            for col, words in FILLED.items():
+                row[col] = " ".join(rng.choice(WORDS) for _ in range(words))
+            row.update({
+                "Key": f"K{i:07d}", "Item Type": "journalArticle", "Publication Year": 1990 + i % 35,
+                "Author": f"Stier, Adrian C.; Author{i}, A.", "Title": f"{row['Notes'][:60]} record {i}",
+                "DOI": f"10.5555/bench.{i}" if i % 10 else "", "Url": f"https://example.org/{i}",
+                "Date Added": "2024-01-01 00:00:00", "Pages": f"{i % 900}-{i % 900 + 12}",
+            })
+            w.writerow([row[c] for c in ZOTERO_COLUMNS])
+
+
+# ---- child: one read in a fresh interpreter ----
+def child(mode: str, path: str, chunk_size: int) -> None:
+    import resource
+
+    import pandas as pd  # noqa: F401
+
+    from enrich_publications import INPUT_COLUMNS, parse_input_row
+    from enrichkit.tables import iter_rows, read_table
+
+    t0 = time.perf_counter()
+    digest = hashlib.sha1()
+    rows = 0
+    if mode == "whole":
+        records = read_table(path, sidecar=False).to_dict(orient="records")
+    elif mode == "streamed":
+        records = iter_rows(path, INPUT_COLUMNS, chunksize=chunk_size)
+    else:
+        records = []
+    for r in records:
+        digest.update(json.dumps(parse_input_row(r)).encode())
+        rows += 1
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    print(json.dumps({"peak_mb": peak, "secs": time.perf_counter() - t0, "rows": rows, "digest": digest.hexdigest()}))
+
+
+def measure(mode: str, path: str, chunk_size: int) -> Dict[str, Any]:
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, path,
+                          "--chunk-size", str(chunk_size)], cwd=ARCHIVE, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--rows", default="10000,40000", help="Comma-separated export sizes")
+    ap.add_argument("--chunk-size", type=int, default=5000)
+    ap.add_argument("--max-growth", type=float, default=1.5,
+                    help="Largest allowed ratio of streamed peaks, largest file over smallest")
+    ap.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], args.chunk_size)
+        return
+
+    sizes = [int(n) for n in args.rows.split(",")]
+    failed = False
+    streamed: List[float] = []
+    with tempfile.TemporaryDirectory(prefix="bench_reader_") as tmp:
+        base = measure("baseline", os.path.join(tmp, "none.csv"), args.chunk_size)["peak_mb"]
+        print(f"{'rows':>8}{'file MB':>9}  {'mode':<10}{'peak MB':>9}{'read s':>8}")
+        for n in sizes:
+            path = os.path.join(tmp, f"export_{n}.csv")
+            write_export(path, n)
+            size = os.path.getsize(path) / 2**20
+            results = {mode: measure(mode, path, args.chunk_size) for mode in ("whole", "streamed")}
+            for mode, r in results.items():
+                print(f"{n:>8}{size:>9.1f}  {mode:<10}{r['peak_mb'] - base:>9.1f}{r['secs']:>8.2f}")
+            if results["whole"]["digest"] != results["streamed"]["digest"]:
+                print("  the two reads parse rows differently  <- FAIL")
+                failed = True
+            streamed.append(max(results["streamed"]["peak_mb"] - base, 1.0))
+    growth = streamed[-1] / streamed[0]
+    bad = len(sizes) > 1 and growth > args.max_growth
+    print(f"streamed peak, largest file / smallest: {growth:.2f}x{'  <- FAIL' if bad else ''}")
+    sys.exit(1 if failed or bad else 0)
+
+
+if __name__ == "__main__":
+    main()
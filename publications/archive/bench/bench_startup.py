@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark and check: cold-start time of the enrichment entry points.
+
+Usage:
+    python bench/bench_startup.py                  # 5 fresh interpreters per case
+    python bench/bench_startup.py --runs 10 --max-ms 600
+
+Every case runs in a new interpreter, timed from the outside (what a user
+waits for), next to a bare `python -c pass` and a reference that imports all
+the heavy dependencies the scripts used to import at module load. One extra
+run per case under -X importtime lists which heavy dependencies it loaded.
+
+Fails (exit 1) if a --help or a plain import of a script loads any heavy
+dependency, or if a case's median exceeds --max-ms above the bare
+interpreter.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+ARCHIVE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ("pandas", "numpy", "requests", "bs4", "tqdm", "dotenv", "openai", "pyarrow")
+
+# (label, python arguments, must stay light)
+CASES: List[Tuple[str, List[str], bool]] = [
+    ("python -c pass", ["-c", "pass"], True),
+    ("enrich.py --help", ["enrich.py", "--help"], True),
+    ("enrich.py enrich --help", ["enrich.py", "enrich", "--help"], True),
+    ("enrich.py summarize --help", ["enrich.py", "summarize", "--help"], True),
+    ("enrich.py extended --help", ["enrich.py", "extended", "--help"], True),
+    ("enrich.py refresh --help", ["enrich.py", "refresh", "--help"], True),
+    ("import enrich_publications", ["-c", "import enrich_publications"], True),
+    ("import enrich_pubs_mac", ["-c", "import enrich_pubs_mac"], True),
+    ("import enrich_pubs_mac_ext", ["-c", "import enrich_pubs_mac_ext"], True),
+    ("reference: eager imports", ["-c", "import pandas, requests, tenacity, tqdm, dotenv, openai"], False),
+]
+
+_IMPORTTIME = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)")
+
+
+def timed_run(args: List[str]) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=ARCHIVE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+
+def heavy_imports(args: List[str]) -> Dict[str, float]:
+    """{heavy top-level package: cumulative import ms} for one run under -X importtime."""
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=ARCHIVE,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    found: Dict[str, float] = {}
+    for m in _IMPORTTIME.finditer(proc.stderr):
+        name = m.group(3)
+        if name in HEAVY:
+            found[name] = max(found.get(name, 0.0), int(m.group(1)) / 1000)
+    return found
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--runs", type=int, default=5, help="Fresh interpreters per case")
+    ap.add_argument("--max-ms", type=float, default=500.0,
+                    help="Largest median allowed for a light case, above the bare interpreter")
+    args = ap.parse_args()
+
+    for _, argv, _ in CASES:  # warm the OS file cache and __pycache__ first
+        timed_run(argv)
+
+    failed = False
+    base = None
+    print(f"{'case':<30}{'median ms':>10}{'min ms':>9}  heavy imports (ms)")
+    for label, argv, light in CASES:
+        times = sorted(timed_run(argv) * 1000 for _ in range(args.runs))
+        median = statistics.median(times)
+        base = median if base is None else base
+        heavy = heavy_imports(argv)
+        bad = light and (heavy or median - base > args.max_ms)
+        failed |= bad
+        loaded = ", ".join(f"{k} {v:.0f}" for k, v in sorted(heavy.items(), key=lambda kv: -kv[1])) or "-"
+        print(f"{label:<30}{median:>10.0f}{times[0]:>9.0f}  {loaded}{'  <- FAIL' if bad else ''}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
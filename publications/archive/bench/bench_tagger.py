@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark: compiled single-pass tagger (enrichkit/tagger.py) vs the original
+per-family `any(k in s ...)` heuristics, on a synthetic corpus.
+
+Usage:
+    python bench/bench_tagger.py            # 100k records
+    python bench/bench_tagger.py --n 20000 --refs 50
+
+Each synthetic record is a title plus a Crossref-shaped dict with container
+title, subjects, abstract, authors with affiliations, funders, links, license
+and a reference list. Keywords also turn up in the non-text fields the old
+methods check saw through json.dumps (funder names, affiliations, DOIs and
+URLs such as 10.1002/pca.2931). Exits non-zero if any record is tagged
+differently.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enrichkit.tagger import TAGGER, crossref_segments  # noqa: E402
+
+
+# ---- original implementations (enrich_publications.py before the tagger) ----
+
+def legacy_theme(title: str, container_title: str) -> List[str]:
+    s = f"{title} {container_title}".lower()
+    tags: List[str] = []
+    if any(k in s for k in ["coral", "acropora", "pocillopora", "reef"]):
+        tags.append("Coral")
+    if "kelp" in s or "macroalgae" in s:
+        tags.append("Kelp")
+    if any(k in s for k in ["mutualis", "symbio", "facilitation"]):
+        tags.append("Mutualisms")
+    if any(k in s for k in ["model", "bayesian", "surplus production", "statistical", "meta-analys"]):
+        tags.append("Methods/Models")
+    if any(k in s for k in ["management", "policy", "restoration", "fishery", "ecosystem-based"]):
+        tags.append("Policy/Management")
+    return list(dict.fromkeys(tags))
+
+def legacy_audience(container_title: str) -> str:
+    c = (container_title or "").lower()
+    if any(k in c for k in ["ecology letters", "coral reefs", "marine ecology", "journal", "proceedings"]):
+        return "Research"
+    if any(k in c for k in ["current biology", "nature", "science"]):
+        return "Policy"
+    return ""
+
+def legacy_policy(title: str) -> Optional[bool]:
+    t = (title or "").lower()
+    return True if any(k in t for k in ["management", "policy", "harvest control", "restoration"]) else None
+
+def legacy_methods(title: str, cr: dict) -> List[str]:
+    s = f"{title} {json.dumps(cr)}".lower()
+    tags: List[str] = []
+    for key, tag in [
+        ("photogrammetry", "photogrammetry"),
+        ("bayesian", "Bayesian models"),
+        ("permanova", "PERMANOVA"),
+        ("pcoa", "PCoA"),
+        ("pca", "PCA"),
+        ("meta-analy", "Meta-analysis"),
+        ("field experiment", "Field experiment"),
+        ("mesocosm", "Mesocosm"),
+        ("machine learning", "Machine learning"),
+    ]:
+        if key in s:
+            tags.append(tag)
+    return list(dict.fromkeys(tags))
+
+def legacy_region(cr: dict) -> str:
+    suspects: List[str] = []
+    for k in ["subject", "subtitle", "container-title", "short-container-title"]:
+        v = cr.get(k)
+        if isinstance(v, list):
+            suspects.extend([str(x) for x in v])
+        elif isinstance(v, str):
+            suspects.append(v)
+    s = " ".join(suspects).lower()
+    for cand in ["mo'orea", "moorea", "california", "dominican republic", "caribbean", "pacific", "polynesia"]:
+        if cand in s:
+            return cand.title()
+    return ""
+
+
+# ---- synthetic corpus ----
+
+WORDS = ("fish population dynamics growth recruitment survival predator prey habitat "
+         "density dependence spatial temporal variation community structure herbivory "
+         "larval settlement competition resilience disturbance climate warming").split()
+SIGNAL = ("coral reef kelp macroalgae mutualism symbiont facilitation model Bayesian "
+          "surplus production statistical meta-analysis management policy restoration "
+          "fishery ecosystem-based harvest control photogrammetry PERMANOVA PCoA PCA "
+          "field experiment mesocosm machine learning Moorea Mo'orea California Caribbean "
+          "Pacific Polynesia Dominican Republic").split()
+JOURNALS = ["Coral Reefs", "Ecology Letters", "Marine Ecology Progress Series", "Nature",
+            "Science", "Current Biology", "Oecologia", "Ecology", "Proceedings B", "Oikos"]
+
+
+def _phrase(rng: random.Random, n: int, p_signal: float) -> str:
+    return " ".join(rng.choice(SIGNAL) if rng.random() < p_signal else rng.choice(WORDS) for _ in range(n))
+
+
+def _doi(rng: random.Random) -> str:
+    prefix = rng.choice(["x", "x", "x", "pca.", "mesocosm-"])
+    return f"10.{rng.randint(1000, 9999)}/{prefix}{rng.randint(0, 10**6)}"
+
+
+def make_record(rng: random.Random, n_refs: int):
+    title = _phrase(rng, rng.randint(6, 14), 0.15).capitalize()
+    journal = rng.choice(JOURNALS)
+    doi = _doi(rng)
+    cr = {
+        "DOI": doi,
+        "URL": f"https://doi.org/{doi}",
+        "title": [title],
+        "container-title": [journal],
+        "short-container-title": [journal[:8]],
+        "subject": [_phrase(rng, 2, 0.3) for _ in range(rng.randint(0, 3))],
+        "abstract": "<jats:p>" + _phrase(rng, 150, 0.03) + "</jats:p>",
+        "publisher": "Springer Science and Business Media LLC",
+        "author": [
+            {"given": "A.", "family": rng.choice(WORDS).capitalize(), "sequence": "first" if i == 0 else "additional",
+             "affiliation": [{"name": _phrase(rng, 3, 0.1).title() + " Lab"}] if rng.random() < 0.5 else []}
+            for i in range(rng.randint(1, 6))
+        ],
+        "funder": [
+            {"name": _phrase(rng, 4, 0.1).title() + " Initiative", "DOI": "10.13039/100000001",
+             "award": [str(rng.randint(10**5, 10**6))]}
+            for _ in range(rng.randint(0, 2))
+        ],
+        "issued": {"date-parts": [[rng.randint(2000, 2025), rng.randint(1, 12)]]},
+        "license": [{"URL": "http://www.springer.com/tdm", "content-version": "tdm", "delay-in-days": 0}],
+        "link": [{"URL": f"https://link.springer.com/content/pdf/{rng.randint(0, 10**6)}.pdf",
+                  "content-type": "application/pdf"}],
+        "reference": [
+            {"key": f"ref{i}", "DOI": _doi(rng),
+             "article-title": _phrase(rng, 10, 0.05), "journal-title": rng.choice(JOURNALS),
+             "year": str(rng.randint(1980, 2024))}
+            for i in range(n_refs)
+        ],
+        "is-referenced-by-count": rng.randint(0, 500),
+    }
+    return title, cr
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--n", type=int, default=100_000, help="Synthetic records")
+    ap.add_argument("--refs", type=int, default=30, help="References per record")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [make_record(rng, rng.randint(0, args.refs * 2)) for _ in range(args.n)]
+
+    t0 = time.perf_counter()
+    old = []
+    for title, cr in corpus:
+        container = cr["container-title"][0]
+        old.append((legacy_theme(title, container), legacy_audience(container), legacy_policy(title),
+                    legacy_methods(title, cr), legacy_region(cr)))
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    new = []
+    for title, cr in corpus:
+        tags = TAGGER.tag(crossref_segments(title, cr, cr["container-title"][0]))
+        new.append((tags["theme"], tags["audience"], tags["policy"], tags["methods"], tags["region"]))
+    t_new = time.perf_counter() - t0
+
+    mismatches = [i for i, (a, b) in enumerate(zip(old, new)) if a != b]
+    print(f"records:   {args.n:,} (up to {args.refs * 2} references each)")
+    print(f"legacy:    {t_old:8.2f} s  ({args.n / t_old:,.0f} rec/s)")
+    print(f"compiled:  {t_new:8.2f} s  ({args.n / t_new:,.0f} rec/s)")
+    print(f"speedup:   {t_old / t_new:8.1f}x")
+    print(f"mismatch:  {len(mismatches)}")
+    for i in mismatches[:5]:
+        print(f"  #{i}: legacy={old[i]} compiled={new[i]}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for every service the enrichment scripts call: Crossref,
+OpenAlex, Unpaywall, OpenAI chat completions and publisher landing pages.
+
+Each service runs on its own 127.0.0.1 port, so the scripts' per-host rate
+limiter keeps separate buckets for them exactly as for the real hosts.
+Records are built from the trimmed real responses in bench/fixtures/, with
+the DOI, title, journal, year, first author and citation count filled in from
+the synthetic row number, so any row's expected output is known (expected()).
+
+Synthetic DOIs look like 10.5555/bench.<n>; 10.5555/missing.<n> is unknown
+everywhere (404 / left out of batches). Titles end in "record <n>", which is
+how title searches find their row.
+
+Supported routes:
+  crossref   GET /works/<doi>            GET /works?filter=doi:a,doi:b&rows=
+  openalex   GET /works/doi:<doi>        GET /works/W<n>
+             GET /works?filter=doi:a|b   GET /works?search=<title>&per_page=
+             (select= projections are honoured)
+  unpaywall  GET /v2/<doi>
+  pages      GET /article/<n>            GET /robots.txt
+  openai     POST /v1/chat/completions   (answers from bench/openai_stub.py)
+
+JSON records carry an ETag and answer If-None-Match with 304. Every service
+adds latency (mean seconds, 20% jitter) and can answer a fraction of requests
+with 429 or 503 and a Retry-After header.
+
+Usage:
+    python bench/mock_services.py --latency 0.05 --llm-latency 0.4 --error-rate 0.02
+or in-process: services = start(latency=0.05); services.url("crossref"); services.stop()
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from openai_stub import answer  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SERVICES = ("crossref", "openalex", "unpaywall", "pages", "openai")
+API_SERVICES = ("crossref", "openalex", "unpaywall", "openai")  # where errors are injected
+
+DOI_PREFIX = "10.5555/bench."
+MISSING_PREFIX = "10.5555/missing."
+JOURNALS = ["Ecology", "Marine Ecology Progress Series", "Coral Reefs", "Oecologia",
+            "Journal of Animal Ecology", "Ecological Applications", "PLOS ONE", "Fish and Fisheries"]
+FAMILIES = ["Stier", "Hixon", "Osenberg", "Holbrook", "Schmitt", "Brooks", "Adam", "Shima",
+            "Hamilton", "Carr", "Kendall", "Steele", "Caselle", "White", "Samhouri", "Essington"]
+_WORDS = ("predation recruitment coral reef fish kelp forest density dependence larval settlement "
+          "marine reserve fisheries herbivory competition habitat complexity survival growth "
+          "ocean warming seagrass grazing mortality population dynamics connectivity nutrient "
+          "subsidies trophic cascade invertebrate community structure spatial scale disturbance "
+          "resilience predator prey behaviour telemetry model bayesian experiment").split()
+
+
+# ---- synthetic rows ----
+def title_for(n: int) -> str:
+    words = random.Random(n).sample(_WORDS, 6)
+    return f"{' '.join(words).capitalize()}: synthetic record {n}"
+
+
+def expected(n: int) -> Dict[str, Any]:
+    """What a correct enrichment of row n looks like (for result checks)."""
+    return {
+        "doi": f"{DOI_PREFIX}{n}",
+        "title": title_for(n),
+        "year": 2000 + n % 25,
+        "first_author": FAMILIES[n % len(FAMILIES)],
+        "journal": JOURNALS[n % len(JOURNALS)],
+        "citation_count": (n * 7) % 300,
+        "image_path": f"/img/{n}.png",
+    }
+
+
+def _row_of_doi(doi: str) -> Optional[int]:
+    doi = unquote(doi).lower().replace("https://doi.org/", "").strip()
+    if doi.startswith(DOI_PREFIX) and doi[len(DOI_PREFIX):].isdigit():
+        return int(doi[len(DOI_PREFIX):])
+    return None
+
+
+# ---- records ----
+@lru_cache(maxsize=None)
+def _template(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@lru_cache(maxsize=8192)
+def record(service: str, n: int, page_base: str) -> Dict[str, Any]:
+    """The fixture record of `service` personalized for row n (shared; do not mutate)."""
+    e = expected(n)
+    raw = (_template(f"{service}.json").replace("{doi}", e["doi"]).replace("{title}", e["title"])
+           .replace("{page}", f"{page_base}/article/{n}").replace("{i}", str(n)))
+    rec = json.loads(raw)
+    if service == "crossref":
+        rec["container-title"] = [e["journal"]]
+        rec["short-container-title"] = [e["journal"]]
+        rec["issued"] = {"date-parts": [[e["year"], 10]]}
+        rec["is-referenced-by-count"] = e["citation_count"]
+        rec["author"][0]["family"] = e["first_author"]
+    elif service == "openalex":
+        rec["host_venue"]["display_name"] = e["journal"]
+        rec["primary_location"]["source"]["display_name"] = e["journal"]
+        rec["publication_year"] = e["year"]
+        rec["cited_by_count"] = e["citation_count"]
+        rec["authorships"][0]["author"]["display_name"] = f"Adrian C. {e['first_author']}"
+    elif service == "unpaywall":
+        rec["journal_name"] = e["journal"]
+        rec["year"] = e["year"]
+    return rec
+
+
+def _project(rec: Dict[str, Any], select: str) -> Dict[str, Any]:
+    return {k: rec[k] for k in select.split(",") if k in rec} if select else rec
+
+
+def page(n: int, page_base: str, size_kb: int) -> bytes:
+    e = expected(n)
+    filler = "<p>" + ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 18) + "</p>\n"
+    body = filler * max(0, (size_kb * 1024) // len(filler))
+    return (_template("page.html").replace("{title}", e["title"]).replace("{doi}", e["doi"])
+            .replace("{image}", page_base + e["image_path"]).replace("{filler}", body)).encode("utf-8")
+
+
+# ---- HTTP ----
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:  # quiet
+        pass
+
+    @property
+    def service(self) -> str:
+        return self.server.service
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self.server.lock:
+            self.server.stats[key] = self.server.stats.get(key, 0) + n
+
+    def _send(self, status: int, raw: bytes = b"", ctype: str = "application/json",
+              headers: Optional[Dict[str, str]] = None) -> None:
+        self._count(str(status) if status in (200, 304, 404, 429) else "5xx" if status >= 500 else "other")
+        self._count("bytes", len(raw))
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if raw:
+            try:
+                self.wfile.write(raw)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # head-only readers hang up early
+
+    def _json(self, payload: Any, etag: str = "") -> None:
+        if etag and self.headers.get("If-None-Match") == etag:
+            self._send(304, headers={"ETag": etag})
+            return
+        self._send(200, json.dumps(payload).encode("utf-8"), headers={"ETag": etag} if etag else None)
+
+    def _not_found(self) -> None:
+        self._send(404, b'{"message":"not found"}')
+
+    def _delay_or_fail(self) -> bool:
+        """Sleep the configured latency; True when an injected error was sent instead."""
+        cfg = self.server.cfg
+        self._count("requests")
+        if self.service in API_SERVICES:
+            roll = random.random()
+            if roll < cfg["error_rate"] + cfg["server_errors"]:
+                status = 429 if roll < cfg["error_rate"] else 503
+                self._send(status, b'{"message":"try again later"}', headers={"Retry-After": str(cfg["retry_after"])})
+                return True
+        time.sleep(max(0.0, random.gauss(cfg["latency"], cfg["latency"] * 0.2)))
+        return False
+
+    def do_GET(self) -> None:
+        if self._delay_or_fail():
+            return
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = unquote(url.path)
+        try:
+            getattr(self, "_" + self.service)(path, q)
+        except Exception as e:  # a bug here should show up as a failed request, not a hung one
+            self._send(500, json.dumps({"message": repr(e)}).encode("utf-8"))
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if self.service != "openai" or not self.path.rstrip("/").endswith("/chat/completions"):
+            self._not_found()
+            return
+        if self._delay_or_fail():
+            return
+        content = answer(body)
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages") or []) // 4
+        completion_tokens = len(content) // 4
+        self._json({
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    # ---- per service ----
+    def _record_response(self, service: str, n: Optional[int], wrap) -> None:
+        if n is None:
+            self._not_found()
+        else:
+            self._json(wrap(record(service, n, self.server.page_base)), etag=f'"{service}-{n}"')
+
+    def _crossref(self, path: str, q: Dict[str, str]) -> None:
+        if path.rstrip("/") == "/works":
+            dois = [f[4:] for f in q.get("filter", "").split(",") if f.startswith("doi:")]
+            items = [record("crossref", n, self.server.page_base)
+                     for n in (_row_of_doi(d) for d in dois) if n is not None]
+            self._json({"status": "ok", "message-type": "work-list",
+                        "message": {"total-results": len(items), "items": items}})
+        elif path.startswith("/works/"):
+            self._record_response("crossref", _row_of_doi(path[len("/works/"):]),
+                                  lambda r: {"status": "ok", "message-type": "work", "message": r})
+        else:
+            self._not_found()
+
+    def _openalex(self, path: str, q: Dict[str, str]) -> None:
+        select = q.get("select", "")
+        base = self.server.page_base
+        if path.rstrip("/") == "/works":
+            if q.get("filter", "").startswith("doi:"):
+                rows = [_row_of_doi(d) for d in q["filter"][4:].split("|")]
+            elif "search" in q:
+                m = re.search(r"record (\d+)\b", q["search"])
+                hit = int(m.group(1)) if m else None
+                # the right work first, then near misses from other rows
+                rows = [] if hit is None else [hit, hit + 1, hit + 7, hit + 31, hit + 101]
+            else:
+                rows = []
+            per_page = int(q.get("per_page") or 25)
+            results = [_project(record("openalex", n, base), select) for n in rows if n is not None][:per_page]
+            self._json({"meta": {"count": len(results), "per_page": per_page}, "results": results})
+        elif path.startswith("/works/doi:"):
+            n = _row_of_doi(path[len("/works/doi:"):])
+            self._record_response("openalex", n, lambda r: _project(r, select))
+        elif re.fullmatch(r"/works/W\d+", path):
+            self._record_response("openalex", int(path[len("/works/W"):]), lambda r: _project(r, select))
+        else:
+            self._not_found()
+
+    def _unpaywall(self, path: str, q: Dict[str, str]) -> None:
+        if path.startswith("/v2/"):
+            self._record_response("unpaywall", _row_of_doi(path[len("/v2/"):]), lambda r: r)
+        else:
+            self._not_found()
+
+    def _pages(self, path: str, q: Dict[str, str]) -> None:
+        if path == "/robots.txt":
+            self._send(200, b"User-agent: *\nDisallow: /private/\n", ctype="text/plain")
+        elif re.fullmatch(r"/article/\d+", path):
+            self._send(200, page(int(path.rsplit("/", 1)[1]), self.server.page_base, self.server.cfg["page_kb"]),
+                       ctype="text/html; charset=utf-8")
+        else:
+            self._not_found()
+
+    def _openai(self, path: str, q: Dict[str, str]) -> None:
+        self._not_found()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # head-only readers hang up early
+            super().handle_error(request, client_address)
+
+
+class Services:
+    """The running mock servers; url(name) is the base URL to point a script at."""
+
+    def __init__(self, servers: Dict[str, "_Server"]):
+        self.servers = servers
+
+    def url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self.servers[name].server_port}" + ("/v1" if name == "openai" else "")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        out = {}
+        for name, s in self.servers.items():
+            with s.lock:
+                out[name] = dict(s.stats)
+        return out
+
+    def stop(self) -> None:
+        for s in self.servers.values():
+            s.shutdown()
+            s.server_close()
+
+
+def start(latency: float = 0.05, llm_latency: float = 0.4, page_latency: float = 0.05,
+          error_rate: float = 0.0, server_errors: float = 0.0, retry_after: float = 1.0,
+          page_kb: int = 200) -> Services:
+    """Start every service on its own free port, each on a background thread."""
+    servers: Dict[str, _Server] = {}
+    for name in SERVICES:
+        s = _Server(("127.0.0.1", 0), MockHandler)
+        s.service = name
+        s.cfg = {"latency": llm_latency if name == "openai" else page_latency if name == "pages" else latency,
+                 "error_rate": error_rate, "server_errors": server_errors,
+                 "retry_after": retry_after, "page_kb": page_kb}
+        s.stats = {"requests": 0}
+        s.lock = threading.Lock()
+        servers[name] = s
+    for s in servers.values():
+        s.page_base = f"http://127.0.0.1:{servers['pages'].server_port}"
+        threading.Thread(target=s.serve_forever, daemon=True).start()
+    return Services(servers)
+
+
+def add_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--latency", type=float, default=0.05, help="Mean seconds per Crossref/OpenAlex/Unpaywall request")
+    ap.add_argument("--llm-latency", dest="llm_latency", type=float, default=0.4, help="Mean seconds per chat completion")
+    ap.add_argument("--page-latency", dest="page_latency", type=float, default=0.05, help="Mean seconds per publisher page")
+    ap.add_argument("--error-rate", dest="error_rate", type=float, default=0.0, help="Fraction of API requests answered with 429")
+    ap.add_argument("--server-errors", dest="server_errors", type=float, default=0.0, help="Fraction of API requests answered with 503")
+    ap.add_argument("--retry-after", dest="retry_after", type=float, default=1.0, help="Retry-After seconds sent with a 429/503")
+    ap.add_argument("--page-kb", dest="page_kb", type=int, default=200, help="Size of each landing page")
+
+
+def start_from_args(args: argparse.Namespace) -> Services:
+    return start(args.latency, args.llm_latency, args.page_latency, args.error_rate,
+                 args.server_errors, args.retry_after, args.page_kb)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    add_arguments(ap)
+    args = ap.parse_args()
+    services = start_from_args(args)
+    for name in SERVICES:
+        print(f"{name:>10}: {services.url(name)}")
+    print("Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        services.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Answers POST /v1/chat/completions after a configurable delay, optionally with
+injected 429s, and reports token usage (prompt chars / 4) like the real API.
+Requests with a json_schema response_format get a JSON object with every
+schema property filled in; plain prompts get canned text in the shape the
+enrichment prompts expect. Every answer echoes the paper title, so callers can
+check results landed on the right row.
+
+Usage:
+    python bench/openai_stub.py --port 8089 --latency 0.8 --error-rate 0.05
+    export OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub
+    python enrich_pubs_mac_ext.py --in pubs.csv --out out.csv --no_cache
+
+or in-process: server = serve(port=0, latency=0.5); server.server_port
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+
+def _title(messages) -> str:
+    for m in messages:
+        hit = re.search(r"Title:\s*(.*)", m.get("content") or "")
+        if hit:
+            return hit.group(1).strip()
+    return ""
+
+
+def _fill(schema: Dict[str, Any], title: str) -> Any:
+    t = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][0]
+    if t == "array":
+        return [f"{title.lower()} keyword", "sdg 14" if "SDG" in schema.get("description", "") else "ecology"]
+    if t == "object":
+        return {k: _fill(v, title) for k, v in (schema.get("properties") or {}).items()}
+    return f"About {title}."
+
+
+def answer(body: Dict[str, Any]) -> str:
+    messages = body.get("messages") or []
+    title = _title(messages)
+    rf = body.get("response_format") or {}
+    if rf.get("type") == "json_schema":
+        return json.dumps(_fill(rf["json_schema"]["schema"], title))
+    system = (messages[0].get("content") or "").lower() if messages else ""
+    if "classify" in system:
+        return f"study_type: Experiment\nsdg_tags: SDG 14\n# {title}"
+    if "keyword" in system:
+        return f"{title.lower()}; ecology; kelp forests"
+    return f"Lay summary of {title}. It is short.\nWhy it matters: it informs {title}."
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:  # quiet
+        pass
+
+    def _send(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+        raw = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_POST(self) -> None:
+        cfg = self.server.cfg
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        with self.server.lock:
+            self.server.stats["requests"] += 1
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        if cfg["error_rate"] and random.random() < cfg["error_rate"]:
+            with self.server.lock:
+                self.server.stats["429"] += 1
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                       {"retry-after": str(cfg["retry_after"])})
+            return
+        time.sleep(max(0.0, random.gauss(cfg["latency"], cfg["latency"] * 0.2)))
+        content = answer(body)
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages") or []) // 4
+        completion_tokens = len(content) // 4
+        self._send(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+
+def serve(port: int = 0, latency: float = 0.5, error_rate: float = 0.0,
+          retry_after: float = 1.0) -> ThreadingHTTPServer:
+    """Start the stub on a background thread; port=0 picks a free port (see .server_port)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.cfg = {"latency": latency, "error_rate": error_rate, "retry_after": retry_after}
+    server.stats = {"requests": 0, "429": 0}
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", type=float, default=0.8, help="Mean seconds per completion")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429")
+    args = ap.parse_args()
+    server = serve(args.port, args.latency, args.error_rate, args.retry_after)
+    print(f"OpenAI stub on http://127.0.0.1:{server.server_port}/v1 (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
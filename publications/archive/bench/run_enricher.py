@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Run one enrichment script against the mock services (child process of
+bench/bench_enrichers.py, one per scenario so peak RSS is per run).
+
+The script module is imported, its API base URLs are pointed at the mocks,
+the shared rate limiter gets rates for the mock hosts, and its main() runs
+with the remaining arguments as its command line. Timings and peak RSS go
+to --stats as JSON.
+
+    python bench/run_enricher.py --script enrich_pubs_mac --stats s.json \
+        --crossref http://127.0.0.1:5001 --openalex ... --unpaywall ... --openai ... \
+        --pacing off -- --in sheet.csv --out out.csv --no_cache
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+
+ARCHIVE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ARCHIVE)
+
+UNLIMITED = (1e6, 1e6)
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def point_at_mocks(mod, args) -> None:
+    from enrichkit.ratelimit import DEFAULT_RATES, LIMITER, OTHER_RATE, host_of
+
+    bases = {
+        "CR_BASE": args.crossref + "/works/", "UA_BASE": args.unpaywall + "/v2/", "OA_BASE": args.openalex + "/works/",
+        "CROSSREF_WORKS": args.crossref + "/works/", "OPENALEX_BASE": args.openalex + "/works/",
+    }
+    for name, url in bases.items():
+        if hasattr(mod, name):
+            setattr(mod, name, url)
+    real = {args.crossref: DEFAULT_RATES["api.crossref.org"], args.openalex: DEFAULT_RATES["api.openalex.org"],
+            args.unpaywall: DEFAULT_RATES["api.unpaywall.org"], args.pages: OTHER_RATE}
+    for url, rate in real.items():
+        if url:
+            LIMITER.rates[host_of(url)] = rate if args.pacing == "real" else UNLIMITED
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--script", required=True, help="Module name, e.g. enrich_publications")
+    ap.add_argument("--stats", required=True, help="Where to write the timing/RSS JSON")
+    for name in ("crossref", "openalex", "unpaywall", "pages", "openai"):
+        ap.add_argument(f"--{name}", default="", help=f"Base URL of the {name} mock")
+    ap.add_argument("--pacing", choices=["real", "off"], default="off",
+                    help="real: the limiter's rates for the real hosts; off: no client-side pacing")
+    ap.add_argument("rest", nargs=argparse.REMAINDER, help="-- then the script's own arguments")
+    args = ap.parse_args()
+    rest = args.rest[1:] if args.rest[:1] == ["--"] else args.rest
+
+    if args.openai:
+        os.environ["OPENAI_BASE_URL"] = args.openai
+        os.environ["OPENAI_API_KEY"] = "bench"
+    t0 = time.perf_counter()
+    mod = importlib.import_module(args.script)
+    import_s = time.perf_counter() - t0
+    point_at_mocks(mod, args)
+
+    sys.argv = [args.script + ".py"] + rest
+    exit_code = 0
+    t1 = time.perf_counter()
+    try:
+        mod.main()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    wall = time.perf_counter() - t1
+
+    with open(args.stats, "w", encoding="utf-8") as f:
+        json.dump({"import_s": round(import_s, 3), "wall_s": round(wall, 3),
+                   "peak_rss_mb": round(peak_rss_mb(), 1), "exit": exit_code}, f)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
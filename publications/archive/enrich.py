@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+One entry point for the enrichment scripts.
+
+    python enrich.py enrich    --in "Exported Items.csv" --email you@your.org
+    python enrich.py summarize --in enriched_publications.csv --out pubs_enriched_out.csv
+    python enrich.py extended  --in enriched_publications.csv --out pubs_enriched_out.csv
+    python enrich.py refresh   --in enriched_publications.json
+    python enrich.py merge     --out pubs_enriched_out.csv --shards 4
+    python enrich.py COMMAND --help
+
+Each command runs the main() of the script (or enrichkit module) it names
+below with the rest of the command line, so the options are exactly the
+script's own and `python enrich_pubs_mac.py ...` keeps working.
+
+Nothing heavy is imported up front: this file only imports the one module
+its command needs, and the scripts themselves import pandas, requests, tqdm,
+dotenv and openai inside main() (openai only when a completion is not
+cached). `--help` at either level answers in well under a second;
+`python bench/bench_startup.py` measures it.
+"""
+import argparse
+import importlib
+from typing import Dict, List, Optional, Tuple
+
+# command -> (module whose main(argv, prog) runs it, one-line description)
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "enrich": ("enrich_publications",
+               "Zotero CSV export -> website CSV/JSON (Crossref, Unpaywall, OpenAlex, page images)"),
+    "summarize": ("enrich_pubs_mac",
+                  "Fill metadata and plain-language summaries in the publications sheet"),
+    "extended": ("enrich_pubs_mac_ext",
+                 "Metadata, summaries, study type, SDGs, keywords and APA citations for the sheet"),
+    "refresh": ("enrichkit.citations",
+                "Only refresh citation_count from OpenAlex and keep a dated snapshot"),
+    "merge": ("enrichkit.shard",
+              "Merge the outputs of a sharded run (--shard I/N) back into one table"),
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    width = max(map(len, COMMANDS))
+    ap = argparse.ArgumentParser(
+        prog="enrich.py",
+        description=__doc__.split("\n\n")[0].strip(),
+        epilog="commands:\n" + "\n".join(f"  {name:<{width}}  {desc}" for name, (_, desc) in COMMANDS.items())
+               + "\n\nRun `enrich.py COMMAND --help` for a command's options.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    ap.add_argument("command", choices=list(COMMANDS), metavar="COMMAND", help="One of: " + ", ".join(COMMANDS))
+    ap.add_argument("args", nargs=argparse.REMAINDER, help="The command's own options")
+    args = ap.parse_args(argv)
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    module.main(args.args, prog=f"{ap.prog} {args.command}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,29 +15,73 @@ Outputs:
 
 Usage:
     python enrich_publications.py --in "/path/Exported Items.csv" --email you@your.org --out out.csv --json out.json
+    python enrich_publications.py --in "/path/Exported Items.csv" --email you@your.org --concurrency 8
 
 Notes:
 - This script never guesses; it leaves fields blank when not verifiable.
-- Rate-limited and polite by default (sleep between calls). Use --fast to reduce delays.
+- Rate-limited and polite by default: each host (Crossref, Unpaywall, OpenAlex, publisher
+  pages) has an adaptive token bucket that backs off on 429/503 + Retry-After and follows
+  the X-Rate-Limit-* headers. Use --fast to start every host at its ceiling rate.
+- og:image scraping reads landing pages only up to </head>, honours robots.txt and
+  sends one request at a time per publisher domain (enrichkit/ogimage.py).
+- Crossref/Unpaywall/OpenAlex responses are cached in a shared SQLite file (--cache PATH,
+  disable with --no-cache), so re-runs only fetch DOIs that are new or stale. Stale entries
+  are revalidated with If-None-Match / If-Modified-Since; a 304 just renews the entry.
+- Finished rows are journaled to <json>.journal.jsonl as they complete; after a crash,
+  re-run with --resume to skip rows that are already done and unchanged.
+- A 429/5xx is retried after the server's Retry-After (up to 5 attempts per request). A row
+  whose lookups still failed that way is written with those fields blank but left out of
+  the journal, so --resume fetches it again.
+- --concurrency N keeps up to N rows in flight; the Crossref, Unpaywall and OpenAlex
+  lookups for a row run at the same time, and the page scrape starts as soon as Crossref
+  and Unpaywall are back (see build_pipeline). Output order always matches the input.
+- --ndjson PATH streams each finished row to PATH (and to --out with --stream-csv)
+  instead of holding everything until the end, so memory stays flat and partial
+  results are readable mid-run. --finalize then writes the pretty --json array;
+  `python -m enrichkit.ndjson IN.ndjson OUT.json` does the same afterwards.
+- The input is streamed: only the title/author/year/DOI columns are read, --chunk-size
+  rows at a time (default 5000), so a wide export of a large group library is never
+  held in memory whole. CSV cells are read as text, exactly as in the file.
+- --profile writes <json>.profile.{txt,folded,pstats}: time and memory per stage (load,
+  fetch, json, mapping, tagging, page, write), the top functions, and a flame graph.
 """
 
 import argparse
-import json
+import asyncio
 import re
 import sys
 import time
-from dataclasses import dataclass, asdict, field
-from typing import Dict, List, Optional, Tuple
-
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import quote, urlparse
+from dataclasses import dataclass, asdict, field, fields
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+if TYPE_CHECKING:
+    import requests
+
+from tenacity import retry, retry_if_exception_type, stop_after_attempt
+
+from enrichkit.cache import (DEFAULT_CACHE_PATH, NOT_MODIFIED, ResponseCache, cached_conditional,
+                             normalize_doi, validators_from)
+from enrichkit.checkpoint import Journal, row_fingerprint
+from enrichkit.metrics import METRICS
+from enrichkit.ndjson import CSVStreamWriter, NDJSONWriter, finalize_json, join_list, write_json_array
+from enrichkit.ogimage import OGScraper
+from enrichkit.openalex import covers, projection, select_params
+from enrichkit.pipeline import Pipeline, Stage
+from enrichkit.profiling import PROFILER, profiled
+from enrichkit.ratelimit import LIMITER, TransientHTTPError, parse_retry_after, wait_retry_after
+from enrichkit.records import RecordStore
+from enrichkit.tables import iter_rows, table_format, write_table
+from enrichkit.tagger import TAGGER, crossref_segments
 
 CR_BASE = "https://api.crossref.org/works/"
 UA_BASE = "https://api.unpaywall.org/v2/"
 OA_BASE = "https://api.openalex.org/works/"
 
+CACHE: Optional[ResponseCache] = None  # set in main() unless --no-cache
+OG: Optional[OGScraper] = None  # set in main(), with the cache
+OA_SELECT: Tuple[str, ...] = ()  # set in main(): the OpenAlex fields build_enriched_row reads (select=)
+
 # --------------------------
 # Helpers
 # --------------------------
@@ -50,70 +94,78 @@ def clean_doi(doi: str) -> Optional[str]:
     doi = doi.replace("doi:", "").strip()
     return doi if ("/" in doi) else None
 
-def safe_get(url: str, params: dict = None, headers: dict = None, timeout: int = 25) -> Optional[requests.Response]:
+@profiled("fetch")
+@retry(wait=wait_retry_after,
+       stop=stop_after_attempt(5),
+       retry=retry_if_exception_type(TransientHTTPError),
+       reraise=True)
+def safe_get(url: str, params: dict = None, headers: dict = None, timeout: int = 25) -> Optional["requests.Response"]:
+    """
+    The response for a 200 (or a 304 to a conditional request); None otherwise (see the run report).
+    A 429/5xx is retried after Retry-After; TransientHTTPError once the attempts run out.
+    """
+    import requests  # imported on first use, like pandas in main(), to keep startup fast
+
     try:
-        r = requests.get(url, params=params, headers=headers, timeout=timeout)
-        if r.status_code == 200:
-            return r
-        return None
+        LIMITER.acquire(url)
+        with METRICS.timed(url) as t:
+            r = requests.get(url, params=params, headers=headers, timeout=timeout)
+            t.status = r.status_code
     except Exception:
         return None
+    LIMITER.observe(url, r.status_code, r.headers)
+    if r.status_code == 429 or r.status_code >= 500:
+        raise TransientHTTPError(f"Transient {r.status_code} for {url}",
+                                 retry_after=parse_retry_after(r.headers.get("Retry-After")))
+    if r.status_code == 200 or (r.status_code == 304 and headers):
+        return r
+    return None
 
-def crossref_lookup(doi: str) -> dict:
-    if not doi:
-        return {}
-    r = safe_get(CR_BASE + quote(doi))
+def get_json_conditional(url: str, params: dict = None, headers: dict = None) -> Tuple[object, Dict[str, str]]:
+    """(parsed JSON, validators) for cached_conditional; NOT_MODIFIED on a 304, {} on failure."""
+    r = safe_get(url, params=params, headers=headers or None)
     if not r:
-        return {}
+        return {}, {}
+    if r.status_code == 304:
+        return NOT_MODIFIED, validators_from(r.headers)
     try:
-        data = r.json().get("message", {})
-        return data if isinstance(data, dict) else {}
+        with PROFILER.phase("json"):
+            return r.json(), validators_from(r.headers)
     except Exception:
+        return {}, {}
+
+def crossref_lookup(doi: str) -> dict:
+    if not doi:
         return {}
+    def fetch(headers: dict):
+        data, validators = get_json_conditional(CR_BASE + quote(doi), headers=headers)
+        if data is NOT_MODIFIED:
+            return data, validators
+        msg = data.get("message", {}) if isinstance(data, dict) else {}
+        return (msg if isinstance(msg, dict) else {}), validators
+    return cached_conditional(CACHE, "crossref", normalize_doi(doi), fetch)
 
 def unpaywall_lookup(doi: str, email: str) -> dict:
     if not (doi and email):
         return {}
-    r = safe_get(f"{UA_BASE}{quote(doi)}", params={"email": email})
-    if not r:
-        return {}
-    try:
-        data = r.json()
-        return data if isinstance(data, dict) else {}
-    except Exception:
-        return {}
+    def fetch(headers: dict):
+        data, validators = get_json_conditional(f"{UA_BASE}{quote(doi)}", params={"email": email}, headers=headers)
+        return (data if data is NOT_MODIFIED or isinstance(data, dict) else {}), validators
+    return cached_conditional(CACHE, "unpaywall", normalize_doi(doi), fetch)
 
 def openalex_lookup(doi: str) -> dict:
     if not doi:
         return {}
-    r = safe_get(OA_BASE + f"doi:{quote(doi)}")
-    if not r:
-        return {}
-    try:
-        data = r.json()
-        return data if isinstance(data, dict) else {}
-    except Exception:
-        return {}
+    def fetch(headers: dict):
+        data, validators = get_json_conditional(OA_BASE + f"doi:{quote(doi)}", params=select_params(OA_SELECT),
+                                                headers=headers)
+        return (data if data is NOT_MODIFIED or isinstance(data, dict) else {}), validators
+    return cached_conditional(CACHE, "openalex", normalize_doi(doi), fetch, covers(OA_SELECT))
 
+@profiled("page")
 def try_og_image(url: str) -> Tuple[Optional[str], Optional[str]]:
     """Attempt to fetch a representative image (og:image) + og:title as alt text."""
-    if not url or not isinstance(url, str):
-        return (None, None)
-    parsed = urlparse(url)
-    if parsed.path.lower().endswith(".pdf"):
-        return (None, None)
-    r = safe_get(url, headers={"User-Agent": "Mozilla/5.0 (compatible; ORL-Bot/1.0)"})
-    if not r:
-        return (None, None)
-    try:
-        soup = BeautifulSoup(r.text, "html.parser")
-        og_img = soup.find("meta", property="og:image")
-        og_title = soup.find("meta", property="og:title")
-        img_url = og_img.get("content").strip() if og_img and og_img.get("content") else None
-        alt_text = og_title.get("content").strip() if og_title and og_title.get("content") else None
-        return (img_url, alt_text)
-    except Exception:
-        return (None, None)
+    return OG.fetch(url)
 
 def first_nonempty(*vals):
     for v in vals:
@@ -159,6 +211,8 @@ class EnrichedRow:
     # Provenance
     source_url: str = ""  # best landing page from Crossref/Unpaywall
 
+OUTPUT_COLUMNS = [f.name for f in fields(EnrichedRow)]
+
 # --------------------------
 # Summary + tagging stubs (no hallucinations)
 # --------------------------
@@ -176,33 +230,17 @@ def generate_plain_summary(title: str, cr: dict) -> str:
         return " ".join(sentences[:3]).strip()
     return ""
 
-def infer_theme_tags(title: str, container_title: str) -> List[str]:
-    s = f"{title} {container_title}".lower()
-    tags: List[str] = []
-    if any(k in s for k in ["coral", "acropora", "pocillopora", "reef"]):
-        tags.append("Coral")
-    if "kelp" in s or "macroalgae" in s:
-        tags.append("Kelp")
-    if any(k in s for k in ["mutualis", "symbio", "facilitation"]):
-        tags.append("Mutualisms")
-    if any(k in s for k in ["model", "bayesian", "surplus production", "statistical", "meta-analys"]):
-        tags.append("Methods/Models")
-    if any(k in s for k in ["management", "policy", "restoration", "fishery", "ecosystem-based"]):
-        tags.append("Policy/Management")
-    return list(dict.fromkeys(tags))
-
-def infer_audience_level(container_title: str) -> str:
-    c = (container_title or "").lower()
-    if any(k in c for k in ["ecology letters", "coral reefs", "marine ecology", "journal", "proceedings"]):
-        return "Research"
-    if any(k in c for k in ["current biology", "nature", "science"]):
-        return "Policy"
+def container_title(cr: dict) -> str:
+    """First Crossref container-title (the journal), or ''."""
+    if not cr:
+        return ""
+    ct = cr.get("container-title")
+    if isinstance(ct, list) and ct:
+        return ct[0]
+    if isinstance(ct, str):
+        return ct
     return ""
 
-def infer_policy_relevance(title: str) -> Optional[bool]:
-    t = (title or "").lower()
-    return True if any(k in t for k in ["management", "policy", "harvest control", "restoration"]) else None
-
 def extract_funders_from_crossref(cr: dict) -> List[str]:
     funders: List[str] = []
     for f in cr.get("funder", []) or []:
@@ -211,71 +249,26 @@ def extract_funders_from_crossref(cr: dict) -> List[str]:
             funders.append(name.strip())
     return list(dict.fromkeys(funders))
 
-def extract_methods_tags(title: str, cr: dict) -> List[str]:
-    s = f"{title} {json.dumps(cr)}".lower()
-    tags: List[str] = []
-    for key, tag in [
-        ("photogrammetry", "photogrammetry"),
-        ("bayesian", "Bayesian models"),
-        ("permanova", "PERMANOVA"),
-        ("pcoa", "PCoA"),
-        ("pca", "PCA"),
-        ("meta-analy", "Meta-analysis"),
-        ("field experiment", "Field experiment"),
-        ("mesocosm", "Mesocosm"),
-        ("machine learning", "Machine learning"),
-    ]:
-        if key in s:
-            tags.append(tag)
-    return list(dict.fromkeys(tags))
-
-def extract_region_system(cr: dict) -> str:
-    suspects: List[str] = []
-    for k in ["subject", "subtitle", "container-title", "short-container-title"]:
-        v = cr.get(k)
-        if isinstance(v, list):
-            suspects.extend([str(x) for x in v])
-        elif isinstance(v, str):
-            suspects.append(v)
-    s = " ".join(suspects).lower()
-    for cand in ["mo'orea", "moorea", "california", "dominican republic", "caribbean", "pacific", "polynesia"]:
-        if cand in s:
-            return cand.title()
-    return ""
-
 # --------------------------
 # Main enrichment per row
 # --------------------------
 
-def enrich_row(row: dict, args) -> EnrichedRow:
+# Every input column parse_input_row reads (used for checkpoint fingerprints)
+INPUT_COLUMNS = ["Title", "title", "Author", "Authors", "creators", "Year", "Publication Year", "Date",
+                 "DOI", "Url DOI", "doi", "Identifier DOI"]
+
+def parse_input_row(row: dict) -> Tuple[str, str, str, Optional[str]]:
+    """Pull (title, authors, year, doi) out of a Zotero-style row."""
     title = first_nonempty(row.get("Title"), row.get("title")) or ""
     authors = first_nonempty(row.get("Author"), row.get("Authors"), row.get("creators")) or ""
     year = first_nonempty(str(row.get("Year") or ""), str(row.get("Publication Year") or ""), str(row.get("Date") or "")) or ""
     doi = clean_doi(first_nonempty(row.get("DOI"), row.get("Url DOI"), row.get("doi"), row.get("Identifier DOI")) or "")
+    return title, authors, year, doi
 
-    cr = crossref_lookup(doi) if doi else {}
-    time.sleep(0.6 if not args.fast else 0.1)
-
-    ua = unpaywall_lookup(doi, args.email) if (doi and args.email) else {}
-    time.sleep(0.6 if not args.fast else 0.1)
-
-    oa = openalex_lookup(doi) if doi else {}
-    time.sleep(0.6 if not args.fast else 0.1)
-
-    # Container (journal) title
-    container = ""
-    if cr:
-        ct = cr.get("container-title")
-        if isinstance(ct, list) and ct:
-            container = ct[0]
-        elif isinstance(ct, str):
-            container = ct
-
-    # Open access + best source URL
-    open_access = None
+def best_source_url(cr: dict, ua: dict) -> str:
+    """Best landing page: Unpaywall OA location first, then Crossref links."""
     source_url = ""
     if ua:
-        open_access = bool(ua.get("is_oa"))
         best_oa = ua.get("best_oa_location") or {}
         if best_oa.get("url"):
             source_url = best_oa.get("url") or ""
@@ -287,6 +280,18 @@ def enrich_row(row: dict, args) -> EnrichedRow:
         # sometimes Crossref has links
         link_obj = (cr.get("link") or [{}])[0] if cr.get("link") else {}
         source_url = link_obj.get("URL") or cr.get("URL") or ""
+    return source_url
+
+@profiled("mapping")
+def build_enriched_row(title: str, authors: str, year: str, doi: Optional[str],
+                       cr: dict, ua: dict, oa: dict,
+                       page_to_scrape: str, image_url: str, alt_text: str) -> EnrichedRow:
+    """Assemble the output row from already-fetched Crossref/Unpaywall/OpenAlex records."""
+    # Container (journal) title
+    container = container_title(cr)
+
+    # Open access
+    open_access = bool(ua.get("is_oa")) if ua else None
 
     # Citation count
     citation_count = None
@@ -296,20 +301,14 @@ def enrich_row(row: dict, args) -> EnrichedRow:
     # Funders
     funders = extract_funders_from_crossref(cr) if cr else []
 
-    # Conservatively try og:image
-    image_url, alt_text = ("", "")
-    page_to_scrape = source_url or (cr.get("URL") if cr else "")
-    if page_to_scrape:
-        img, alt = try_og_image(page_to_scrape)
-        image_url = img or ""
-        alt_text = alt or ""
-
-    # Tags + fields (heuristics, non-fabricated)
-    theme_tags = infer_theme_tags(title, container)
-    audience_level = infer_audience_level(container)
-    policy_relevance = infer_policy_relevance(title)
-    methods_tags = extract_methods_tags(title, cr) if cr else []
-    region_system = extract_region_system(cr) if cr else ""
+    # Tags + fields (heuristics, non-fabricated): one scan per text segment
+    with PROFILER.phase("tagging"):
+        tags = TAGGER.tag(crossref_segments(title, cr, container))
+    theme_tags = tags["theme"]
+    audience_level = tags["audience"]
+    policy_relevance = tags["policy"]
+    methods_tags = tags["methods"] if cr else []
+    region_system = tags["region"] if cr else ""
 
     # Data/code links from Crossref "link" (best-effort)
     data_code_links: List[str] = []
@@ -338,8 +337,8 @@ def enrich_row(row: dict, args) -> EnrichedRow:
         policy_relevance=policy_relevance,
         press_links=[],
 
-        image_url=image_url,
-        alt_text=alt_text,
+        image_url=image_url or "",
+        alt_text=alt_text or "",
         impact_tags=[],
 
         citation_count=citation_count,
@@ -351,65 +350,270 @@ def enrich_row(row: dict, args) -> EnrichedRow:
     )
     return enriched
 
+# --------------------------
+# Stage pipeline (many rows in flight, polite per host)
+# --------------------------
+
+PER_HOST_INFLIGHT = 2  # never more than this many open requests to one API host
+
+def build_pipeline(args) -> Pipeline:
+    """
+    Per-row enrichment as a stage DAG: the three API lookups only need the DOI and run
+    side by side; the page scrape starts as soon as Crossref and Unpaywall are in
+    (it does not wait for OpenAlex); the row is assembled once everything is back.
+    Request spacing itself is handled by the shared rate limiter inside safe_get.
+    A lookup that is still throttled after safe_get's retries gives {} and sets
+    `<key>_throttled`, so the row is finished but not journaled as done.
+    """
+    concurrency = max(1, int(getattr(args, "concurrency", 1) or 1))
+    email = args.email
+
+    def lookup(key: str, fn) -> Callable[[dict], dict]:
+        def run(c: dict) -> dict:
+            try:
+                return {key: fn(c)}
+            except TransientHTTPError:
+                return {key: {}, key + "_throttled": True}
+        return run
+
+    def parse(c: dict) -> dict:
+        return dict(zip(("title", "authors", "year", "doi"), parse_input_row(c["row"])))
+
+    def page(c: dict) -> dict:
+        cr, ua = c["cr"], c["ua"]
+        url = best_source_url(cr, ua) or (cr.get("URL") if cr else "")
+        img, alt = try_og_image(url) if url else (None, None)
+        return {"page": url or "", "image": (img or "", alt or "")}
+
+    def build(c: dict) -> dict:
+        return {"enriched": build_enriched_row(c["title"], c["authors"], c["year"], c["doi"],
+                                               c["cr"], c["ua"], c["oa"], c["page"], *c["image"])}
+
+    return Pipeline([
+        Stage("parse", parse, needs=("row",), gives=("title", "authors", "year", "doi"), inline=True),
+        Stage("crossref", lookup("cr", lambda c: crossref_lookup(c["doi"]) if c["doi"] else {}),
+              needs=("doi",), gives=("cr", "cr_throttled"), limit=PER_HOST_INFLIGHT),
+        Stage("unpaywall", lookup("ua", lambda c: unpaywall_lookup(c["doi"], email) if (c["doi"] and email) else {}),
+              needs=("doi",), gives=("ua", "ua_throttled"), limit=PER_HOST_INFLIGHT),
+        Stage("openalex", lookup("oa", lambda c: openalex_lookup(c["doi"]) if c["doi"] else {}),
+              needs=("doi",), gives=("oa", "oa_throttled"), limit=PER_HOST_INFLIGHT),
+        # landing pages are spread over many publisher hosts
+        Stage("og_image", page, needs=("cr", "ua"), gives=("page", "image"), limit=concurrency),
+        Stage("build", build, needs=("title", "authors", "year", "doi", "cr", "ua", "oa", "page", "image"),
+              gives=("enriched",), inline=True),
+    ])
+
+SOURCES = (("cr", "crossref"), ("ua", "unpaywall"), ("oa", "openalex"))
+
+def row_outcome(ctx: dict, email: str) -> Tuple[str, List[str]]:
+    """
+    ('ok' / 'no_doi' / 'no_metadata' / 'partial' / 'throttled', sources that came back
+    empty) for the run report; 'throttled' rows are not journaled as done.
+    """
+    if not ctx.get("doi"):
+        return "no_doi", []
+    missing = [name for k, name in SOURCES if not ctx.get(k) and (k != "ua" or email)]
+    if any(ctx.get(k + "_throttled") for k, _ in SOURCES):
+        return "throttled", missing
+    if not ctx.get("cr") and not ctx.get("oa"):
+        return "no_metadata", missing
+    return ("partial" if missing else "ok"), missing
+
+async def iter_enriched_async(rows: Iterable[dict], args) -> AsyncIterator[Tuple[int, Optional[EnrichedRow], Optional[Exception], float, bool]]:
+    """
+    Enrich rows with up to args.concurrency rows in flight and yield
+    (row_number, EnrichedRow | None, error | None, seconds, complete) in the original
+    input order; complete is False for a row some API kept throttling.
+    """
+    concurrency = max(1, int(getattr(args, "concurrency", 1) or 1))
+    pipe = build_pipeline(args)
+    async for i, ctx, err, secs in pipe.run(({"row": row} for row in rows), window=concurrency):
+        key = ctx.get("doi") or (ctx.get("title") or "")[:80]
+        outcome = "error"
+        if err is not None:
+            METRICS.row("error", key, error=repr(err)[:200])
+        else:
+            outcome, missing = row_outcome(ctx, args.email)
+            METRICS.row(outcome, key, **({"empty": missing} if missing else {}))
+        yield i, (None if err else ctx["enriched"]), err, secs, outcome != "throttled"
+
 # --------------------------
 # CLI
 # --------------------------
 
-def main():
-    ap = argparse.ArgumentParser()
+def write_run_report(args, rows: int, resumed: int) -> None:
+    print(METRICS.summary())
+    path = METRICS.write_report(args.report or args.json + ".report.json", script="enrich_publications",
+                                argv=sys.argv[1:], rows=rows, resumed=resumed, sections={
+        "cache": CACHE.report() if CACHE else None, "og_image": OG.stats})
+    if path:
+        print(f"Run report: {path}")
+    if args.profile:
+        for path in PROFILER.write(args.profile_prefix or args.json + ".profile", title="enrich_publications"):
+            print(f"Profile: {path}")
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None):
+    ap = argparse.ArgumentParser(prog=prog)
     ap.add_argument("--in", dest="inp", required=True, help="Path to input CSV (Zotero export)")
     ap.add_argument("--email", default="", help="Contact email for Unpaywall (required for OA lookups)")
-    ap.add_argument("--out", default="enriched_publications.csv", help="Output CSV path")
+    ap.add_argument("--out", default="enriched_publications.csv", help="Output table: .csv, .xlsx, .parquet or .feather")
     ap.add_argument("--json", default="enriched_publications.json", help="Output JSON path")
-    ap.add_argument("--fast", action="store_true", help="Reduce wait times (risking rate limits)")
-    args = ap.parse_args()
-
-    # Load CSV defensively
-    try:
-        df = pd.read_csv(args.inp)
-    except UnicodeDecodeError:
-        df = pd.read_csv(args.inp, encoding="latin-1")
-    except Exception as e:
-        print(f"Failed to read CSV: {e}", file=sys.stderr)
-        sys.exit(2)
-
-    rows = df.to_dict(orient="records")
-
-    enriched_list: List[Dict] = []
-    total = len(rows)
-    for i, row in enumerate(rows, 1):
+    ap.add_argument("--fast", action="store_true", help="Start each host at its ceiling rate instead of ramping up")
+    ap.add_argument("--concurrency", type=int, default=1, help="Rows enriched in parallel (per-host pacing still applies)")
+    ap.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="SQLite response cache shared by the enrichment scripts")
+    ap.add_argument("--no-cache", dest="no_cache", action="store_true", help="Always hit the APIs; do not read or write the cache")
+    ap.add_argument("--checkpoint", default="", help="Checkpoint journal path (default: <json>.journal.jsonl)")
+    ap.add_argument("--resume", action="store_true", help="Skip rows already finished in the checkpoint journal")
+    ap.add_argument("--ndjson", default="", help="Stream each finished row to this NDJSON file instead of collecting them")
+    ap.add_argument("--stream-csv", dest="stream_csv", action="store_true", help="With --ndjson, also append each row to --out as it finishes")
+    ap.add_argument("--finalize", action="store_true", help="With --ndjson, write the pretty JSON array (--json) from it at the end")
+    ap.add_argument("--no-sidecar", dest="no_sidecar", action="store_true", help="Do not read or write the Parquet sidecar of an .xlsx input")
+    ap.add_argument("--chunk-size", dest="chunk_size", type=int, default=5000, help="Input rows read at a time (only the columns used are kept)")
+    ap.add_argument("--report", default="", help="Run report JSON path (default: <json>.report.json)")
+    ap.add_argument("--profile", action="store_true", help="Profile the run (cProfile, tracemalloc, per-stage timings)")
+    ap.add_argument("--profile-prefix", dest="profile_prefix", default="", help="Profile output prefix (default: <json>.profile)")
+    args = ap.parse_args(argv)
+    if args.stream_csv and table_format(args.out) != "csv":
+        ap.error("--stream-csv needs a .csv --out")
+    if args.profile:
+        PROFILER.start()
+    import pandas as pd
+
+    global CACHE, OG, OA_SELECT
+    CACHE = None if args.no_cache else ResponseCache(args.cache)
+    OA_SELECT = projection((build_enriched_row, "oa"), also=("id",))
+    OG = OGScraper(CACHE)
+    if args.fast:
+        LIMITER.start_at_ceiling()
+
+    # Stream the input: only INPUT_COLUMNS, chunk_size rows at a time, encoding detected once
+    # (see iter_rows in enrichkit/tables.py). Rows are read as the pipeline asks for them.
+    with PROFILER.phase("load", exclusive=True):
         try:
-            enr = enrich_row(row, args)
-            enriched_list.append(asdict(enr))
-            print(f"[{i}/{total}] {enr.title[:80]}")
-        except KeyboardInterrupt:
-            print("Interrupted by user.")
-            break
+            reader = iter_rows(args.inp, INPUT_COLUMNS, chunksize=args.chunk_size, sidecar=not args.no_sidecar)
         except Exception as e:
-            print(f"Error on row {i}: {e}", file=sys.stderr)
-        if not args.fast:
-            time.sleep(0.3)
+            print(f"Failed to read CSV: {e}", file=sys.stderr)
+            sys.exit(2)
+
+    # Checkpoint journal: finished rows are appended as they complete. In memory they are
+    # kept by fingerprint in a compact RecordStore (enrichkit/records.py).
+    journal = Journal(args.checkpoint or args.json + ".journal.jsonl")
+    done = journal.load_data(RecordStore()) if args.resume else RecordStore()
+    if args.resume:
+        print(f"Resuming: {len(done)} rows in the checkpoint journal")
+    journal.open(reset=not args.resume)
+
+    # Per input row, in order, only its fingerprint is kept (for --resume and the output order)
+    salt = f"email={bool(args.email)}"
+    fps: List[str] = []
+    pending: List[int] = []  # indices of the rows sent to the pipeline
+
+    def read(rows: Iterable[dict]) -> Iterator[dict]:
+        """Fingerprint each row; yield those not already done."""
+        for row in rows:
+            fp = row_fingerprint(row, INPUT_COLUMNS, salt)
+            fps.append(fp)
+            if fp not in done:
+                pending.append(len(fps) - 1)
+                yield row
+
+    # --ndjson: rows go to disk as they finish and are not kept in memory.
+    # Resumed rows are written from the journal in input order ahead of new ones.
+    stream = NDJSONWriter(args.ndjson) if args.ndjson else None
+    csv_stream = CSVStreamWriter(args.out, OUTPUT_COLUMNS) if stream and args.stream_csv else None
+    cursor = 0
+
+    def stream_upto(stop: int, data: Optional[Dict] = None) -> None:
+        """Write the resumed rows before index `stop`, then `data` (the row at `stop`) if given."""
+        nonlocal cursor
+        recs = [done[fps[j]] for j in range(cursor, stop) if fps[j] in done]
+        if data is not None:
+            recs.append(data)
+            stop += 1
+        with PROFILER.phase("write"):
+            for rec in recs:
+                stream.write(rec)
+                if csv_stream:
+                    csv_stream.write(rec)
+        cursor = max(cursor, stop)
+
+    async def _run():
+        async for k, enr, err, secs, complete in iter_enriched_async(read(reader), args):
+            i = pending[k - 1]
+            if err is not None:
+                print(f"Error on row {i + 1}: {err}", file=sys.stderr)
+                continue
+            data = asdict(enr)
+            if complete:
+                journal.append(fps[i], i, data, t=time.time(), elapsed=secs)
+            else:
+                print(f"Row {i + 1} still throttled after retries; not checkpointed, --resume will fetch it again", file=sys.stderr)
+            if stream:
+                stream_upto(i, data)
+            else:
+                done[fps[i]] = data
+            print(f"[{i + 1}] {enr.title[:80]}")
 
-    # Save JSON
     try:
-        with open(args.json, "w", encoding="utf-8") as f:
-            json.dump(enriched_list, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Failed to write JSON: {e}", file=sys.stderr)
-
-    # Save CSV (lists -> semicolon-joined)
-    def join_list(v):
-        if isinstance(v, list):
-            return "; ".join([str(x) for x in v])
-        return v
-
-    out_df = pd.DataFrame(enriched_list).applymap(join_list)
-    try:
-        out_df.to_csv(args.out, index=False)
-        print(f"Saved: {args.out} and {args.json}")
-    except Exception as e:
-        print(f"Failed to write CSV: {e}", file=sys.stderr)
-        sys.exit(3)
+        asyncio.run(_run())
+    except KeyboardInterrupt:
+        print("Interrupted by user.")
+    finally:
+        journal.close()
+    # After an interruption, the rest of the input still places its resumed rows in the output
+    for _ in read(reader):
+        pass
+    total = len(fps)
+
+    if stream:
+        stream_upto(total)
+        stream.close()
+        if csv_stream:
+            csv_stream.close()
+        saved = [args.ndjson] + ([args.out] if csv_stream else [])
+        if args.finalize:
+            try:
+                with PROFILER.phase("write", exclusive=True):
+                    finalize_json(args.ndjson, args.json)
+                saved.append(args.json)
+            except Exception as e:
+                print(f"Failed to write JSON: {e}", file=sys.stderr)
+        print(f"Saved: {' and '.join(saved)}")
+        print(LIMITER.summary())
+        print(OG.summary())
+        write_run_report(args, total, total - len(pending))
+        return
+
+    # Rebuild output from the finished rows, in input order, one record at a time
+    # (no list of all rows as dicts)
+    finished = [fp for fp in fps if fp in done]
+
+    with PROFILER.phase("write", exclusive=True):
+        # Save JSON
+        try:
+            write_json_array((done[fp] for fp in finished), args.json)
+        except Exception as e:
+            print(f"Failed to write JSON: {e}", file=sys.stderr)
+
+        # Save the table, built column by column (CSV/Excel: lists -> semicolon-joined;
+        # Parquet/Arrow keep them as list columns)
+        if finished:
+            out_df = done.to_frame(finished).reset_index(drop=True)
+            if table_format(args.out) not in ("parquet", "feather"):
+                for col in out_df.columns:
+                    if out_df[col].dtype == object:
+                        out_df[col] = out_df[col].map(join_list)
+        else:
+            out_df = pd.DataFrame(columns=OUTPUT_COLUMNS)
+        try:
+            write_table(out_df, args.out)
+            print(f"Saved: {args.out} and {args.json}")
+        except Exception as e:
+            print(f"Failed to write {args.out}: {e}", file=sys.stderr)
+            sys.exit(3)
+    print(LIMITER.summary())
+    print(OG.summary())
+    write_run_report(args, total, total - len(pending))
 
 if __name__ == "__main__":
     main()
@@ -28,63 +28,99 @@ USAGE (Mac):
   # optional flags
   --limit 80
   --overwrite_summaries   # forces regeneration of plain_summary and why_it_matters
+  --cache PATH            # SQLite response cache shared with the other enrichers
+  --no_cache              # always hit Crossref/OpenAlex
+  --resume                # skip rows already finished in the checkpoint journal
+  --checkpoint PATH       # journal path (default: <out>.journal.jsonl)
+  --llm_workers N         # concurrent LLM requests (default 8)
+  --llm_rpm N             # requests per minute for your OpenAI tier (default 500)
+  --llm_tpm N             # tokens per minute (default 200000)
+  --llm_cache_bypass      # ask the model again even when a cached completion exists
+  --llm_invalidate NAMES  # drop cached completions of these prompts (summaries, or all)
+  --no_sidecar            # do not cache a CSV/XLSX input as .<name>.sidecar.parquet (needs pyarrow)
+  --profile               # write <out>.profile.{txt,folded,pstats}: per-stage time/memory + flame graph
+  --shards N              # run N processes in parallel (rows split by DOI/title, rate budget shared),
+                          # then merge them into --out in the original row order (enrichkit/shard.py)
+  --shard I/N             # run only shard I of N; merge later with `python enrich.py merge`
 
 NOTES:
   - DOIs give best results. If DOI is missing, we try OpenAlex by title.
-  - We back off politely; 80 rows is fine.
+  - We back off politely: the shared per-host rate limiter (enrichkit/ratelimit.py) adapts
+    to Retry-After and X-Rate-Limit-* headers instead of sleeping a fixed time per row.
 """
 import os
 import sys
-import json
 import time
 import argparse
-from typing import Optional, Dict, Any, List
-
-import pandas as pd
-import requests
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
-from tqdm import tqdm
-
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except Exception:
-    pass
-
-try:
-    from openai import OpenAI
-    _HAS_OPENAI = True
-except Exception:
-    _HAS_OPENAI = False
-
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+import re
+from typing import Optional, Dict, Any, List, Tuple
+
+from urllib.parse import quote
+
+from tenacity import retry, stop_after_attempt, retry_if_exception_type
+
+from enrichkit.cache import (DEFAULT_CACHE_PATH, NOT_MODIFIED, ResponseCache, cached_conditional,
+                             normalize_doi, validators_from)
+from enrichkit.checkpoint import Journal, row_fingerprint
+from enrichkit.doibatch import resolve_dois
+from enrichkit.frame import cell_text, merge_records
+from enrichkit import llm
+from enrichkit.metrics import METRICS
+from enrichkit.openalex import covers, projection, select_params
+from enrichkit.pipeline import Pipeline, Stage
+from enrichkit.tables import read_table, write_table
+from enrichkit.profiling import PROFILER, profiled
+from enrichkit.records import Interner, RecordStore
+from enrichkit.shard import (parse_shard, run_shards, shard_count, shard_path, shard_rows, split_budget,
+                             write_shard)
+from enrichkit.titles import TitleResolver
+from enrichkit.ratelimit import LIMITER, TransientHTTPError, parse_retry_after, wait_retry_after
 
 CROSSREF_WORKS = "https://api.crossref.org/works/"
 OPENALEX_BASE = "https://api.openalex.org/works/"
-SESSION = requests.Session()
-SESSION.headers.update({"User-Agent": "Adrian-ORL-Pub-Enricher/1.1 (mailto:adrian@ucsb.edu)"})
+USER_AGENT = "Adrian-ORL-Pub-Enricher/1.1 (mailto:adrian@ucsb.edu)"
+SESSION = None  # requests.Session, set in main()
 TIMEOUT = 30
-
-class TransientHTTPError(Exception):
-    pass
+CACHE: Optional[ResponseCache] = None  # set in main() unless --no_cache
+RESOLVER: Optional[TitleResolver] = None  # set in main(); resolves rows without a DOI
+# Fields requested from OpenAlex (select=): what openalex_fields reads, set in main()
+OPENALEX_SELECT: Tuple[str, ...] = ()
+# Records resolved up front by prefetch_metadata(), already mapped by crossref_fields /
+# openalex_fields; {} marks a DOI known to be missing. Compact stores sharing one string
+# table (see enrichkit/records.py), so a large sheet does not keep every raw record around.
+STRINGS = Interner()
+PREFETCHED: Dict[str, RecordStore] = {"crossref": RecordStore(STRINGS), "openalex": RecordStore(STRINGS)}
 
 def norm(s: str) -> str:
     return (s or "").strip().lower()
 
-@retry(wait=wait_exponential(multiplier=1, min=1, max=30),
+@profiled("fetch")
+@retry(wait=wait_retry_after,
        stop=stop_after_attempt(5),
        retry=retry_if_exception_type(TransientHTTPError))
-def http_get_json(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    r = SESSION.get(url, params=params, timeout=TIMEOUT)
+def http_get_json_conditional(url: str, params: Optional[Dict[str, Any]] = None,
+                              headers: Optional[Dict[str, str]] = None) -> Tuple[Any, Dict[str, str]]:
+    """(parsed JSON, validators); NOT_MODIFIED when a conditional request gets a 304."""
+    LIMITER.acquire(url)
+    with METRICS.timed(url) as t:
+        r = SESSION.get(url, params=params, headers=headers or None, timeout=TIMEOUT)
+        t.status = r.status_code
+    LIMITER.observe(url, r.status_code, r.headers)
     if r.status_code in (429,) or r.status_code >= 500:
-        raise TransientHTTPError(f"Transient {r.status_code} for {url}")
+        raise TransientHTTPError(f"Transient {r.status_code} for {url}",
+                                 retry_after=parse_retry_after(r.headers.get("Retry-After")))
+    if r.status_code == 304 and headers:
+        return NOT_MODIFIED, validators_from(r.headers)
     if r.status_code != 200:
-        return {}
+        return {}, {}
     try:
-        return r.json()
+        with PROFILER.phase("json"):
+            return r.json(), validators_from(r.headers)
     except Exception:
-        return {}
+        return {}, {}
+
+def http_get_json(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return http_get_json_conditional(url, params)[0]
 
 def strip_tags(text: str) -> str:
     import re
@@ -93,30 +129,26 @@ def strip_tags(text: str) -> str:
 def fetch_crossref_by_doi(doi: str) -> Dict[str, Any]:
     if not doi:
         return {}
-    url = CROSSREF_WORKS + requests.utils.quote(doi, safe="")
-    data = http_get_json(url)
-    return data.get("message", {}) if isinstance(data, dict) else {}
+    def fetch(headers: Dict[str, str]):
+        url = CROSSREF_WORKS + quote(doi, safe="")
+        data, validators = http_get_json_conditional(url, headers=headers)
+        if data is NOT_MODIFIED:
+            return data, validators
+        return (data.get("message", {}) if isinstance(data, dict) else {}), validators
+    return cached_conditional(CACHE, "crossref", normalize_doi(doi), fetch)
 
 def fetch_openalex_by_doi(doi: str) -> Dict[str, Any]:
     if not doi:
         return {}
-    url = OPENALEX_BASE + "doi:" + requests.utils.quote(doi, safe="")
-    data = http_get_json(url)
-    if isinstance(data, dict) and data.get("id"):
-        return data
-    return {}
-
-def fetch_openalex_by_title(title: str) -> Dict[str, Any]:
-    if not title:
-        return {}
-    url = OPENALEX_BASE.rstrip("/")
-    data = http_get_json(url, params={"search": title, "per_page": 1})
-    if isinstance(data, dict):
-        res = data.get("results", [])
-        if res:
-            return res[0]
-    return {}
-
+    def fetch(headers: Dict[str, str]):
+        url = OPENALEX_BASE + "doi:" + quote(doi, safe="")
+        data, validators = http_get_json_conditional(url, params=select_params(OPENALEX_SELECT), headers=headers)
+        if data is NOT_MODIFIED or (isinstance(data, dict) and data.get("id")):
+            return data, validators
+        return {}, {}
+    return cached_conditional(CACHE, "openalex", normalize_doi(doi), fetch, covers(OPENALEX_SELECT))
+
+@profiled("mapping")
 def crossref_fields(msg: Dict[str, Any]) -> Dict[str, Any]:
     title = ""
     if isinstance(msg.get("title"), list) and msg["title"]:
@@ -153,8 +185,10 @@ def crossref_fields(msg: Dict[str, Any]) -> Dict[str, Any]:
         "doi": msg.get("DOI","") or ""
     }
 
+@profiled("mapping")
 def openalex_fields(obj: Dict[str, Any]) -> Dict[str, Any]:
-    host = obj.get("host_venue", {}) or {}
+    # host_venue is gone from OpenAlex (and not in the select=); its successor is primary_location.source
+    host = obj.get("host_venue", {}) or (obj.get("primary_location") or {}).get("source") or {}
     biblio = obj.get("biblio", {}) or {}
     # reconstruct abstract if inverted index present
     abstract = ""
@@ -189,18 +223,35 @@ def openalex_fields(obj: Dict[str, Any]) -> Dict[str, Any]:
         "url": obj.get("primary_location", {}).get("landing_page_url","") or obj.get("id",""),
         "authors": "; ".join(authors),
         "abstract": abstract,
-        "doi": obj.get("doi","") or ""
+        # OpenAlex gives the DOI as a URL; the doi column holds the bare DOI
+        "doi": re.sub(r"^https?://(dx\.)?doi\.org/", "", obj.get("doi","") or "", flags=re.I)
     }
 
-def get_metadata(doi: str, title: str) -> Dict[str, Any]:
+def crossref_meta(doi: str) -> Dict[str, Any]:
+    """crossref_fields() of the DOI's Crossref record; {} if there is none."""
+    if not doi:
+        return {}
+    if normalize_doi(doi) in PREFETCHED["crossref"]:
+        return PREFETCHED["crossref"][normalize_doi(doi)]
+    cr = fetch_crossref_by_doi(doi)
+    return crossref_fields(cr) if cr else {}
+
+def openalex_meta(doi: str) -> Dict[str, Any]:
+    """openalex_fields() of the DOI's OpenAlex work; {} if there is none."""
+    if not doi:
+        return {}
+    if normalize_doi(doi) in PREFETCHED["openalex"]:
+        return PREFETCHED["openalex"][normalize_doi(doi)]
+    oa = fetch_openalex_by_doi(doi)
+    return openalex_fields(oa) if oa else {}
+
+def get_metadata(doi: str, title: str, year: str = "", authors: str = "") -> Dict[str, Any]:
     if doi:
-        cr = fetch_crossref_by_doi(doi)
-        if cr:
-            fields = crossref_fields(cr)
+        fields = crossref_meta(doi)
+        if fields:
             if not fields.get("abstract"):
-                oa = fetch_openalex_by_doi(doi)
-                if oa:
-                    f2 = openalex_fields(oa)
+                f2 = openalex_meta(doi)
+                if f2:
                     for k, v in f2.items():
                         if not fields.get(k):
                             fields[k] = v
@@ -208,11 +259,51 @@ def get_metadata(doi: str, title: str) -> Dict[str, Any]:
                         fields["abstract"] = f2["abstract"]
             return fields
     if title:
-        oa = fetch_openalex_by_title(title)
+        # best-scoring candidate for title/year/first author, or nothing
+        oa = RESOLVER.resolve(title, year, authors)
         if oa:
             return openalex_fields(oa)
     return {}
 
+# Columns that trigger a metadata fetch when any of them is blank
+META_COLS = ["journal","volume","issue","pages","publisher","abstract","source_url"]
+
+def needs_metadata(row) -> bool:
+    return any([not cell_text(row.get(c,"")) for c in META_COLS])
+
+def prefetch_metadata(rows: List[Dict[str, Any]]) -> None:
+    """
+    Before the row loop: resolve every DOI that will need metadata in batches of 50,
+    and run the title searches for rows without a DOI concurrently.
+    """
+    RESOLVER.prefetch((cell_text(row.get("title","")), cell_text(row.get("year","")), cell_text(row.get("authors","")))
+                      for row in rows if needs_metadata(row) and not cell_text(row.get("doi","")))
+    dois = [cell_text(row.get("doi","")) for row in rows if needs_metadata(row)]
+    dois = [d for d in dois if d]
+    if not dois:
+        return
+    cr = resolve_dois(dois, "crossref", http_get_json, CACHE, CROSSREF_WORKS.rstrip("/"),
+                      transform=crossref_fields, into=PREFETCHED["crossref"])
+    # get_metadata only asks OpenAlex when Crossref has no abstract
+    oa_dois = [d for d, fields in cr.items() if fields and not fields.get("abstract")]
+    resolve_dois(oa_dois, "openalex", http_get_json, CACHE, OPENALEX_BASE.rstrip("/"),
+                 transform=openalex_fields, into=PREFETCHED["openalex"], select=OPENALEX_SELECT)
+
+# Columns filled from Crossref/OpenAlex when empty
+FILL_COLS = ["journal","volume","issue","pages","publisher","abstract","title","doi"]
+
+def metadata_updates(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata values for one row; merge_records only writes them into empty cells."""
+    if not needs_metadata(row):
+        return {}
+    meta = get_metadata(cell_text(row.get("doi","")), cell_text(row.get("title","")),
+                        cell_text(row.get("year","")), cell_text(row.get("authors","")))
+    rec = {k: meta[k] for k in FILL_COLS if k in meta}
+    # source_url: prefer existing, else Crossref/OpenAlex url
+    if meta.get("url"):
+        rec["source_url"] = meta["url"]
+    return rec
+
 def gen_summaries(title: str, abstract: str, overwrite: bool,
                   existing_plain: str, existing_wim: str) -> (str, str):
     """Return (plain_summary, why_it_matters)."""
@@ -223,10 +314,9 @@ def gen_summaries(title: str, abstract: str, overwrite: bool,
     if not (need_plain or need_wim):
         return plain, wim
 
-    if not _HAS_OPENAI or not OPENAI_API_KEY:
+    if not llm.available():
         return plain or "", wim or ""
 
-    client = OpenAI(api_key=OPENAI_API_KEY)
     system = (
         "You create plain-language outputs for scientific papers. "
         "Use ONLY the provided title and abstract; do not add external facts. "
@@ -238,21 +328,7 @@ def gen_summaries(title: str, abstract: str, overwrite: bool,
         "1) Write a 2–3 sentence lay summary at about Grade 7 reading level.\n"
         "2) On a new line, write: Why it matters: <a single concise clause>."
     )
-    # modest retries
-    out = ""
-    for attempt in range(5):
-        try:
-            resp = client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[{"role":"system","content":system},
-                          {"role":"user","content":user}],
-                temperature=0.2,
-                max_tokens=240
-            )
-            out = resp.choices[0].message.content.strip()
-            break
-        except Exception:
-            time.sleep(min(2**attempt, 30))
+    out = llm.chat(system, user, temperature=0.2, max_tokens=240, prompt="summaries")  # modest retries inside
 
     if out:
         # split into summary + why it matters
@@ -273,19 +349,104 @@ def gen_summaries(title: str, abstract: str, overwrite: bool,
             wim = wim_text
     return plain or "", wim or ""
 
-def main():
-    ap = argparse.ArgumentParser(description="Enrich Adrian's publication CSV with metadata + lay summaries.")
-    ap.add_argument("--in", dest="inp", required=True, help="Input CSV/XLSX path")
-    ap.add_argument("--out", dest="out", required=True, help="Output CSV/XLSX path")
+def summary_updates(row, title: str, abstract: str, overwrite: bool) -> Dict[str, str]:
+    """Summary columns for one row (runs on a pipeline worker thread, so it only reads)."""
+    plain_existing = cell_text(row.get("plain_summary",""))
+    wim_existing = cell_text(row.get("why_it_matters",""))
+    plain, wim = gen_summaries(title, abstract, overwrite, plain_existing, wim_existing)
+    updates: Dict[str, str] = {}
+    if (overwrite or not plain_existing) and plain:
+        updates["plain_summary"] = plain
+    if (overwrite or not wim_existing) and wim:
+        updates["why_it_matters"] = wim
+    return updates
+
+META_WORKERS = 4  # rows fetching Crossref/OpenAlex at once (LIMITER still paces each host)
+
+def build_pipeline(args) -> Pipeline:
+    """metadata -> summaries; metadata for the next rows is fetched while the LLM works."""
+    def summaries(c: Dict[str, Any]) -> Dict[str, Any]:
+        row = c["row"]
+        abstract_now = cell_text(row.get("abstract","")) or cell_text(c["meta"].get("abstract",""))
+        return {"summaries": summary_updates(row, cell_text(row.get("title","")), abstract_now, args.overwrite_summaries)}
+
+    return Pipeline([
+        # If core metadata missing OR abstract empty → fetch (empty cells only; 'pdf link ' is left alone)
+        Stage("metadata", lambda c: {"meta": metadata_updates(c["row"])}, needs=("row",), gives=("meta",), limit=META_WORKERS),
+        Stage("summaries", summaries, needs=("row", "meta"), gives=("summaries",), limit=args.llm_workers, group="llm"),
+    ])
+
+def row_outcome(ctx: Dict[str, Any]) -> str:
+    """'ok', or why the row is still missing metadata / a summary (for the run report)."""
+    row, meta = ctx["row"], ctx["meta"]
+    if not cell_text(row.get("journal","")) and not meta.get("journal"):
+        return "no_metadata"
+    if llm.available() and not cell_text(row.get("plain_summary","")) and not ctx["summaries"].get("plain_summary"):
+        return "no_summary"
+    return "ok"
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None):
+    ap = argparse.ArgumentParser(prog=prog, description="Enrich Adrian's publication CSV with metadata + lay summaries.")
+    ap.add_argument("--in", dest="inp", required=True, help="Input CSV/XLSX/Parquet/Feather path")
+    ap.add_argument("--out", dest="out", required=True, help="Output CSV/XLSX/Parquet/Feather path")
     ap.add_argument("--limit", type=int, default=None, help="Process only first N rows")
     ap.add_argument("--overwrite_summaries", action="store_true", help="Regenerate plain_summary & why_it_matters")
-    args = ap.parse_args()
+    ap.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="SQLite response cache shared by the enrichment scripts")
+    ap.add_argument("--no_cache", action="store_true", help="Always hit Crossref/OpenAlex; do not read or write the cache")
+    ap.add_argument("--checkpoint", default="", help="Checkpoint journal path (default: <out>.journal.jsonl)")
+    ap.add_argument("--resume", action="store_true", help="Skip rows already finished in the checkpoint journal")
+    ap.add_argument("--llm_workers", type=int, default=llm.DEFAULT_WORKERS, help="Concurrent LLM requests")
+    ap.add_argument("--llm_rpm", type=float, default=llm.DEFAULT_RPM, help="LLM requests-per-minute budget")
+    ap.add_argument("--llm_tpm", type=float, default=llm.DEFAULT_TPM, help="LLM tokens-per-minute budget")
+    ap.add_argument("--llm_cache_bypass", action="store_true", help="Ignore cached LLM completions (fresh answers still replace them)")
+    ap.add_argument("--llm_invalidate", default="", help="Comma-separated prompt names whose cached completions are dropped first, or 'all'")
+    ap.add_argument("--no_sidecar", action="store_true", help="Do not read or write the Parquet sidecar of a CSV/XLSX input")
+    ap.add_argument("--report", default="", help="Run report JSON path (default: <out>.report.json)")
+    ap.add_argument("--profile", action="store_true", help="Profile the run (cProfile, tracemalloc, per-stage timings)")
+    ap.add_argument("--profile_prefix", default="", help="Profile output prefix (default: <out>.profile)")
+    ap.add_argument("--shard", type=parse_shard, default=None, metavar="I/N",
+                    help="Process only shard I of N (rows split by DOI/title) and write <out>.shard-I-of-N")
+    ap.add_argument("--shards", type=shard_count, default=0, metavar="N",
+                    help="Run N shards as parallel processes sharing the rate budget, then merge them into --out")
+    args = ap.parse_args(argv)
+    if args.shards:
+        if args.shard:
+            ap.error("--shard and --shards cannot be combined")
+        sys.exit(run_shards(argv, args.shards, args.out, os.path.abspath(__file__)))
+    if args.shard:
+        # this process's outputs get the shard suffix; its pacing is 1/N of the run's budget
+        share = split_budget(args.shard[1])
+        args.llm_rpm *= share
+        args.llm_tpm *= share
+        for opt in ("out", "checkpoint", "report", "profile_prefix"):
+            if getattr(args, opt):
+                setattr(args, opt, shard_path(getattr(args, opt), *args.shard))
+    if args.profile:
+        PROFILER.start()
+    # Heavy dependencies are imported here rather than at module load (fast --help and startup)
+    import requests
+    from tqdm import tqdm
+    # Optional .env
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+    global SESSION
+    SESSION = requests.Session()
+    SESSION.headers.update({"User-Agent": USER_AGENT})
+
+    global CACHE, RESOLVER, OPENALEX_SELECT
+    CACHE = None if args.no_cache else ResponseCache(args.cache)
+    OPENALEX_SELECT = projection(openalex_fields, also=("id",))
+    RESOLVER = TitleResolver(http_get_json, CACHE, base=OPENALEX_BASE, select=OPENALEX_SELECT)
+    # LLM completions cost money, so they stay cached under --no_cache too
+    llm.configure_cache(CACHE or ResponseCache(args.cache), bypass=args.llm_cache_bypass,
+                        invalidate=args.llm_invalidate.split(","))
 
     # Read
-    if args.inp.lower().endswith(".csv"):
-        df = pd.read_csv(args.inp)
-    else:
-        df = pd.read_excel(args.inp)
+    with PROFILER.phase("load", exclusive=True):
+        df = read_table(args.inp, sidecar=not args.no_sidecar)
 
     # Ensure expected columns exist
     expected = [
@@ -306,58 +467,79 @@ def main():
     rows = df.index.tolist()
     if args.limit is not None:
         rows = rows[:args.limit]
+    if args.shard:
+        mine = shard_rows(df, *args.shard)
+        keep = set(mine)
+        rows = [idx for idx in rows if idx in keep]
+
+    # Checkpoint journal: skip rows already finished (and unchanged) on --resume
+    journal = Journal(args.checkpoint or args.out + ".journal.jsonl")
+    done = journal.load_data(RecordStore(STRINGS)) if args.resume else RecordStore()
+    salt = f"summaries={args.overwrite_summaries}"
+    input_cols = list(df.columns)
+    inputs = df.loc[rows].to_dict("index")
+    fps = {idx: row_fingerprint(inputs[idx], input_cols, salt) for idx in rows}
+    # Per-row results ({column: value}), kept compactly; merged into df in one step after the loop
+    overwrite = ["plain_summary", "why_it_matters"] if args.overwrite_summaries else []
+    results = RecordStore(STRINGS)
+    for idx in rows:
+        if fps[idx] in done:
+            results[idx] = {k: v for k, v in done[fps[idx]].items() if k in df.columns}
+    pending = [idx for idx in rows if fps[idx] not in done]
+    del done
+    if args.resume:
+        print(f"Resuming: {len(rows) - len(pending)} of {len(rows)} rows already done")
+    journal.open(reset=not args.resume)
+
+    prefetch_metadata([inputs[idx] for idx in pending])
+
+    llm.configure_budget(rpm=args.llm_rpm, tpm=args.llm_tpm)
+    pipe = build_pipeline(args)
+    progress = tqdm(total=len(pending), desc="Enriching pubs")
+
+    def finish(k: int, ctx: Dict[str, Any], err: Optional[BaseException], secs: float) -> None:
+        idx = pending[k - 1]
+        progress.update(1)
+        key = cell_text(ctx["row"].get("doi","")) or cell_text(ctx["row"].get("title",""))[:80]
+        if err is not None:
+            print(f"Error on row {idx}: {err}", file=sys.stderr)
+            METRICS.row("error", key, error=repr(err)[:200])
+            return
+        METRICS.row(row_outcome(ctx), key)
+        results[idx] = rec = {**ctx["meta"], **ctx["summaries"]}
+        journal.append(fps[idx], idx, rec, t=time.time(), elapsed=secs)
 
-    for idx in tqdm(rows, desc="Enriching pubs"):
-        row = df.loc[idx]
-
-        title = str(row.get("title","") or "").strip()
-        doi = str(row.get("doi","") or "").strip()
-        abstract_existing = str(row.get("abstract","") or "").strip()
-
-        # If core metadata missing OR abstract empty → fetch
-        need_meta = any([not str(row.get(c,"") or "").strip() for c in
-                         ["journal","volume","issue","pages","publisher","abstract","source_url"]])
-        meta = {}
-        if need_meta:
-            meta = get_metadata(doi, title)
-
-        # Fill metadata
-        for k in ["journal","volume","issue","pages","publisher","abstract","title","doi"]:
-            if k in meta and not str(row.get(k,"") or "").strip():
-                df.at[idx, k] = meta[k]
-
-        # source_url: prefer existing, else Crossref/OpenAlex url
-        if not str(row.get("source_url","") or "").strip():
-            src = meta.get("url","")
-            if src:
-                df.at[idx, "source_url"] = src
-
-        # pdf link  (keep exact name with trailing space)
-        if "pdf link " in df.columns and not str(row.get("pdf link ","") or "").strip():
-            # try to guess a PDF from Crossref link (we don't hit publisher PDFs directly)
-            # leave empty; you can populate manually or add Unpaywall later
-            pass
-
-        # Summaries
-        abstract_now = str(df.at[idx, "abstract"]).strip()
-        plain_existing = str(row.get("plain_summary","") or "").strip()
-        wim_existing = str(row.get("why_it_matters","") or "").strip()
-
-        plain, wim = gen_summaries(title, abstract_now, args.overwrite_summaries, plain_existing, wim_existing)
-        if (args.overwrite_summaries or not plain_existing) and plain:
-            df.at[idx, "plain_summary"] = plain
-        if (args.overwrite_summaries or not wim_existing) and wim:
-            df.at[idx, "why_it_matters"] = wim
-
-        time.sleep(0.4)
+    try:
+        pipe.run_sync(({"row": inputs.pop(idx)} for idx in pending), finish, window=max(args.llm_workers, META_WORKERS) * 2)
+    finally:
+        progress.close()
+    journal.close()
+
+    with PROFILER.phase("merge", exclusive=True):
+        merge_records(df, results, overwrite=overwrite)
 
     # Write
-    if args.out.lower().endswith(".csv"):
-        df.to_csv(args.out, index=False)
-    else:
-        df.to_excel(args.out, index=False)
+    with PROFILER.phase("write", exclusive=True):
+        if args.shard:
+            write_shard(df, mine, args.out, *args.shard, source=args.inp)
+        else:
+            write_table(df, args.out)
 
     print(f"[OK] Wrote → {args.out}")
+    print(LIMITER.summary())
+    print(RESOLVER.summary())
+    print(llm.BUDGET.summary())
+    print(pipe.summary())
+    print(METRICS.summary())
+    report = METRICS.write_report(args.report or args.out + ".report.json", script="enrich_pubs_mac",
+                                  argv=sys.argv[1:], rows=len(rows), resumed=len(rows) - len(pending), sections={
+        "cache": CACHE.report() if CACHE else None, "llm_cache": llm.CACHE.report() if llm.CACHE not in (None, CACHE) else None,
+        "llm": llm.BUDGET.stats, "titles": RESOLVER.stats, "pipeline": pipe.stats})
+    if report:
+        print(f"Run report: {report}")
+    if args.profile:
+        for path in PROFILER.write(args.profile_prefix or args.out + ".profile", title="enrich_pubs_mac"):
+            print(f"Profile: {path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -26,39 +26,69 @@ Optional flags:
   --overwrite_summaries         # Regenerate plain_summary and why_it_matters even if present
   --overwrite_ai_tags           # Regenerate AI fields (study_type, sdg_tags, keywords if missing)
   --infer_collaborators         # Try to infer collaborators from author list (non-lab names)
+  --llm_mode separate           # Old behaviour: up to three prompts per row instead of one
+                                # JSON-schema call that only asks for the missing AI fields
+  --cache PATH                  # SQLite response cache shared with the other enrichers
+  --no_cache                    # Always hit Crossref/OpenAlex
+  --resume                      # Skip rows already finished in the checkpoint journal
+  --checkpoint PATH             # Journal path (default: <out>.journal.jsonl)
+  --llm_workers N               # Concurrent LLM requests (default 8)
+  --llm_rpm N / --llm_tpm N     # Requests / tokens per minute for your OpenAI tier (default 500 / 200000)
+  --llm_cache_bypass            # Ask the model again even when a cached completion exists
+  --llm_invalidate NAMES        # Drop cached completions of these prompts (summaries,classify,keywords,fields or all)
+  --refresh_citations           # Only refresh citation_count from OpenAlex (overwriting it) and snapshot
+                                # the counts to .citations.sqlite; nothing else is fetched or changed
+  --no_sidecar                  # Do not cache a CSV/XLSX input as .<name>.sidecar.parquet (needs pyarrow)
+  --profile                     # Write <out>.profile.{txt,folded,pstats}: per-stage time/memory + flame graph
+  --shards N                    # Run N processes in parallel (rows split by DOI/title, rate budget shared),
+                                # then merge them into --out in the original row order (enrichkit/shard.py)
+  --shard I/N                   # Run only shard I of N; merge later with `python enrich.py merge`
+
+Pacing: requests go through the shared per-host rate limiter (enrichkit/ratelimit.py),
+which adapts to Retry-After and X-Rate-Limit-* headers instead of sleeping a fixed time.
 """
 import os, sys, time, argparse, re
-from typing import Optional, Dict, Any, List, Tuple
-import pandas as pd
-import requests
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
-from tqdm import tqdm
-
-# Optional .env
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except Exception:
-    pass
-
-# OpenAI client (optional; only used if key present)
-try:
-    from openai import OpenAI
-    _HAS_OPENAI = True
-except Exception:
-    _HAS_OPENAI = False
-
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-SESSION = requests.Session()
-SESSION.headers.update({"User-Agent":"ORL-Pub-Enricher-EXT/1.2 (mailto:adrian@ucsb.edu)"})
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Tuple
+from urllib.parse import quote
+from tenacity import retry, stop_after_attempt, retry_if_exception_type
+
+from enrichkit.cache import (DEFAULT_CACHE_PATH, NOT_MODIFIED, ResponseCache, cached_conditional,
+                             normalize_doi, validators_from)
+from enrichkit.checkpoint import Journal, row_fingerprint
+from enrichkit.citations import CitationStore, refresh_file
+from enrichkit.doibatch import resolve_dois
+from enrichkit.frame import fill_where_blank, merge_records, text
+from enrichkit import llm
+from enrichkit.metrics import METRICS
+from enrichkit.openalex import covers, projection, select_params
+from enrichkit.pipeline import Pipeline, Stage
+from enrichkit.tables import read_table, write_table
+from enrichkit.profiling import PROFILER, profiled
+from enrichkit.records import Interner, RecordStore
+from enrichkit.shard import (parse_shard, run_shards, shard_count, shard_path, shard_rows, split_budget,
+                             write_shard)
+from enrichkit.titles import TitleResolver
+from enrichkit.ratelimit import LIMITER, TransientHTTPError, parse_retry_after, wait_retry_after
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+USER_AGENT = "ORL-Pub-Enricher-EXT/1.2 (mailto:adrian@ucsb.edu)"
+SESSION = None  # requests.Session, set in main()
 TIMEOUT = 30
 
 CROSSREF_WORKS = "https://api.crossref.org/works/"
 OPENALEX_BASE  = "https://api.openalex.org/works/"  # works/doi:... or works?search=...
 
-class TransientHTTPError(Exception): pass
+CACHE: Optional[ResponseCache] = None  # set in main() unless --no_cache
+RESOLVER: Optional[TitleResolver] = None  # set in main(); resolves rows without a DOI
+# Fields requested from OpenAlex (select=): what openalex_fields reads, set in main()
+OPENALEX_SELECT: Tuple[str, ...] = ()
+# Records resolved up front by prefetch_metadata(), already mapped by crossref_fields /
+# openalex_fields; {} marks a DOI known to be missing. Compact stores sharing one string
+# table (see enrichkit/records.py), so a large sheet does not keep every raw record around.
+STRINGS = Interner()
+PREFETCHED: Dict[str, RecordStore] = {"crossref": RecordStore(STRINGS), "openalex": RecordStore(STRINGS)}
 
 
 def norm(s: object) -> str:
@@ -80,49 +110,59 @@ def norm(s: object) -> str:
 def strip_tags(text: str) -> str:
     return re.sub(r"<[^>]*>", "", text or "").strip()
 
-@retry(wait=wait_exponential(multiplier=1, min=1, max=30),
+@profiled("fetch")
+@retry(wait=wait_retry_after,
        stop=stop_after_attempt(5),
        retry=retry_if_exception_type(TransientHTTPError))
-def http_get_json(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    r = SESSION.get(url, params=params, timeout=TIMEOUT)
+def http_get_json_conditional(url: str, params: Optional[Dict[str, Any]] = None,
+                              headers: Optional[Dict[str, str]] = None) -> Tuple[Any, Dict[str, str]]:
+    """(parsed JSON, validators); NOT_MODIFIED when a conditional request gets a 304."""
+    LIMITER.acquire(url)
+    with METRICS.timed(url) as t:
+        r = SESSION.get(url, params=params, headers=headers or None, timeout=TIMEOUT)
+        t.status = r.status_code
+    LIMITER.observe(url, r.status_code, r.headers)
     if r.status_code in (429,) or r.status_code >= 500:
-        raise TransientHTTPError(f"Transient {r.status_code} for {url}")
+        raise TransientHTTPError(f"Transient {r.status_code} for {url}",
+                                 retry_after=parse_retry_after(r.headers.get("Retry-After")))
+    if r.status_code == 304 and headers:
+        return NOT_MODIFIED, validators_from(r.headers)
     if r.status_code != 200:
-        return {}
+        return {}, {}
     try:
-        return r.json()
+        with PROFILER.phase("json"):
+            return r.json(), validators_from(r.headers)
     except Exception:
-        return {}
+        return {}, {}
+
+def http_get_json(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return http_get_json_conditional(url, params)[0]
 
 # ----------- External metadata fetchers -----------
 def fetch_crossref_by_doi(doi: str) -> Dict[str, Any]:
     if not norm(doi):
         return {}
-    url = CROSSREF_WORKS + requests.utils.quote(doi, safe="")
-    data = http_get_json(url)
-    return data.get("message", {}) if isinstance(data, dict) else {}
+    def fetch(headers: Dict[str, str]):
+        url = CROSSREF_WORKS + quote(doi, safe="")
+        data, validators = http_get_json_conditional(url, headers=headers)
+        if data is NOT_MODIFIED:
+            return data, validators
+        return (data.get("message", {}) if isinstance(data, dict) else {}), validators
+    return cached_conditional(CACHE, "crossref", normalize_doi(doi), fetch)
 
 def fetch_openalex_by_doi(doi: str) -> Dict[str, Any]:
     if not norm(doi):
         return {}
-    url = OPENALEX_BASE + "doi:" + requests.utils.quote(doi, safe="")
-    data = http_get_json(url)
-    if isinstance(data, dict) and data.get("id"):
-        return data
-    return {}
-
-def fetch_openalex_by_title(title: str) -> Dict[str, Any]:
-    if not norm(title):
-        return {}
-    url = OPENALEX_BASE.rstrip("/")
-    data = http_get_json(url, params={"search": title, "per_page": 1})
-    if isinstance(data, dict):
-        res = data.get("results", [])
-        if res:
-            return res[0]
-    return {}
+    def fetch(headers: Dict[str, str]):
+        url = OPENALEX_BASE + "doi:" + quote(doi, safe="")
+        data, validators = http_get_json_conditional(url, params=select_params(OPENALEX_SELECT), headers=headers)
+        if data is NOT_MODIFIED or (isinstance(data, dict) and data.get("id")):
+            return data, validators
+        return {}, {}
+    return cached_conditional(CACHE, "openalex", normalize_doi(doi), fetch, covers(OPENALEX_SELECT))
 
 # ----------- Field mappers -----------
+@profiled("mapping")
 def crossref_fields(msg: Dict[str, Any]) -> Dict[str, Any]:
     title = ""
     if isinstance(msg.get("title"), list) and msg["title"]:
@@ -172,8 +212,10 @@ def crossref_fields(msg: Dict[str, Any]) -> Dict[str, Any]:
         "keywords": "; ".join(keywords_list) if keywords_list else ""
     }
 
+@profiled("mapping")
 def openalex_fields(obj: Dict[str, Any]) -> Dict[str, Any]:
-    host = obj.get("host_venue", {}) or {}
+    # host_venue is gone from OpenAlex (and not in the select=); its successor is primary_location.source
+    host = obj.get("host_venue", {}) or (obj.get("primary_location") or {}).get("source") or {}
     biblio = obj.get("biblio", {}) or {}
 
     # Abstract reconstruction (inverted index)
@@ -228,21 +270,38 @@ def openalex_fields(obj: Dict[str, Any]) -> Dict[str, Any]:
         "url": obj.get("primary_location", {}).get("landing_page_url","") or obj.get("id",""),
         "authors": "; ".join(authors),
         "abstract": abstract,
-        "doi": obj.get("doi","") or "",
+        # OpenAlex gives the DOI as a URL; the doi column holds the bare DOI
+        "doi": re.sub(r"^https?://(dx\.)?doi\.org/", "", obj.get("doi","") or "", flags=re.I),
         "issn": issn,
         "keywords": "; ".join(keywords) if keywords else "",
         "citation_count": cited_by_count if cited_by_count is not None else ""
     }
 
-def get_metadata(doi: str, title: str) -> Dict[str, Any]:
+def crossref_meta(doi: str) -> Dict[str, Any]:
+    """crossref_fields() of the DOI's Crossref record; {} if there is none."""
+    if not norm(doi):
+        return {}
+    if normalize_doi(doi) in PREFETCHED["crossref"]:
+        return PREFETCHED["crossref"][normalize_doi(doi)]
+    cr = fetch_crossref_by_doi(doi)
+    return crossref_fields(cr) if cr else {}
+
+def openalex_meta(doi: str) -> Dict[str, Any]:
+    """openalex_fields() of the DOI's OpenAlex work; {} if there is none."""
+    if not norm(doi):
+        return {}
+    if normalize_doi(doi) in PREFETCHED["openalex"]:
+        return PREFETCHED["openalex"][normalize_doi(doi)]
+    oa = fetch_openalex_by_doi(doi)
+    return openalex_fields(oa) if oa else {}
+
+def get_metadata(doi: str, title: str, year: str = "", authors: str = "") -> Dict[str, Any]:
     if norm(doi):
-        cr = fetch_crossref_by_doi(doi)
-        if cr:
-            fields = crossref_fields(cr)
+        fields = crossref_meta(doi)
+        if fields:
             # Try OpenAlex to fill blanks and citation_count/keywords
-            oa = fetch_openalex_by_doi(doi)
-            if oa:
-                f2 = openalex_fields(oa)
+            f2 = openalex_meta(doi)
+            if f2:
                 for k, v in f2.items():
                     if not norm(fields.get(k, "")):
                         fields[k] = v
@@ -251,11 +310,61 @@ def get_metadata(doi: str, title: str) -> Dict[str, Any]:
                     fields["abstract"] = f2["abstract"]
             return fields
     if norm(title):
-        oa = fetch_openalex_by_title(title)
+        # best-scoring candidate for title/year/first author, or nothing
+        oa = RESOLVER.resolve(title, year, authors)
         if oa:
             return openalex_fields(oa)
     return {}
 
+# Columns that trigger a metadata fetch when any of them is blank
+META_COLS = ["journal","volume","issue","pages","publisher","abstract","source_url","keywords","issn","journal_abbrev","citation_count"]
+
+def needs_metadata(row) -> bool:
+    return any([not norm(row.get(c,"")) for c in META_COLS])
+
+def prefetch_metadata(rows: List[Dict[str, Any]]) -> None:
+    """
+    Before the row loop: resolve every DOI that will need metadata in batches of 50,
+    and run the title searches for rows without a DOI concurrently.
+    """
+    RESOLVER.prefetch((norm(row.get("title","")), norm(row.get("year","")), norm(row.get("authors","")))
+                      for row in rows if needs_metadata(row) and not norm(row.get("doi","")))
+    dois = [norm(row.get("doi","")) for row in rows if needs_metadata(row)]
+    dois = [d for d in dois if d]
+    if not dois:
+        return
+    cr = resolve_dois(dois, "crossref", http_get_json, CACHE, CROSSREF_WORKS.rstrip("/"),
+                      transform=crossref_fields, into=PREFETCHED["crossref"])
+    # get_metadata asks OpenAlex for every DOI Crossref knows
+    oa_dois = [d for d, fields in cr.items() if fields]
+    resolve_dois(oa_dois, "openalex", http_get_json, CACHE, OPENALEX_BASE.rstrip("/"),
+                 transform=openalex_fields, into=PREFETCHED["openalex"], select=OPENALEX_SELECT)
+
+# Columns filled from Crossref/OpenAlex when empty
+FILL_COLS = ["journal","journal_abbrev","volume","issue","pages","publisher","abstract",
+             "title","doi","keywords","issn"]
+
+def metadata_updates(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata values for one row; merge_records only writes them into empty cells."""
+    if not needs_metadata(row):
+        return {}
+    meta = get_metadata(norm(row.get("doi","")), norm(row.get("title","")),
+                        norm(row.get("year","")), norm(row.get("authors","")))
+    rec = {k: meta[k] for k in FILL_COLS if k in meta}
+    if meta.get("citation_count", "") != "":
+        rec["citation_count"] = meta["citation_count"]
+    if norm(meta.get("url","")):
+        rec["source_url"] = meta["url"]
+    return rec
+
+def overlay(row: Dict[str, Any], rec: Dict[str, Any]) -> Dict[str, Any]:
+    """The row as it will look once `rec` is merged (filled cells win)."""
+    cur = dict(row)
+    for k, v in rec.items():
+        if not norm(cur.get(k,"")):
+            cur[k] = v
+    return cur
+
 # ----------- Formatting helpers -----------
 def parse_authors(authors_str: str) -> List[Tuple[str,str]]:
     # Authors stored as "Given Family; Given Family; ..."
@@ -280,19 +389,20 @@ def format_author_apa(given: str, family: str) -> str:
     initials = " ".join([f"{w[0]}." for w in given.split() if w])
     return f"{family}, {initials}".strip()
 
+def format_authors_apa(authors_str: str) -> str:
+    authors = parse_authors(authors_str)
+    if not authors:
+        return ""
+    if len(authors) <= 20:
+        return ", ".join([format_author_apa(g, f) for g, f in authors])
+    # APA: first 19 + ... + last
+    first19 = authors[:19]
+    last = authors[-1]
+    return ", ".join([format_author_apa(g,f) for g,f in first19]) + ", ... " + format_author_apa(last[0], last[1])
+
 def format_citation_apa(authors_str: str, year: str, title: str,
                         journal: str, volume: str, issue: str, pages: str, doi_url: str) -> str:
-    authors = parse_authors(authors_str)
-    if authors:
-        if len(authors) <= 20:
-            auth_formatted = ", ".join([format_author_apa(g, f) for g, f in authors])
-        else:
-            # APA: first 19 + ... + last
-            first19 = authors[:19]
-            last = authors[-1]
-            auth_formatted = ", ".join([format_author_apa(g,f) for g,f in first19]) + ", ... " + format_author_apa(last[0], last[1])
-    else:
-        auth_formatted = ""
+    auth_formatted = format_authors_apa(authors_str)
 
     y = f"({year})." if year else "(n.d.)."
     t = f" {title.strip()}." if title else ""
@@ -310,11 +420,36 @@ def format_citation_apa(authors_str: str, year: str, title: str,
     d = f" {doi_url}" if doi_url else ""
     return f"{auth_formatted} {y}{t}{jv}{d}".strip()
 
+def citation_apa_column(df: "pd.DataFrame") -> "pd.Series":
+    """format_citation_apa over a whole frame: string ops per column, author parsing per cell."""
+    c = {k: text(df[k]) for k in ["authors","year","title","journal","volume","issue","pages","doi_url"]}
+    def when(mask: "pd.Series", s: "pd.Series") -> "pd.Series":
+        return s.where(mask, "")
+    y = when(c["year"].ne(""), "(" + c["year"] + ").").replace("", "(n.d.).")
+    t = when(c["title"].ne(""), " " + c["title"] + ".")
+    has_vol = c["volume"].ne("")
+    jv = (when(c["journal"].ne(""), " " + c["journal"])
+          + when(has_vol, ", " + c["volume"])
+          + when(has_vol & c["issue"].ne(""), "(" + c["issue"] + ")")
+          + when(c["pages"].ne(""), ", " + c["pages"]))
+    jv = when(jv.ne(""), jv + ".")
+    d = when(c["doi_url"].ne(""), " " + c["doi_url"])
+    auth = c["authors"].map(format_authors_apa)
+    return (auth + " " + y + t + jv + d).str.strip()
+
+LAB_NAMES = {"Adrian Stier","A. C. Stier","Adrian C. Stier","Stier, A.", "Stier, A. C."}
+
+def infer_collaborators(authors_str: str) -> str:
+    """Authors other than the lab PI, '; '-joined (very light heuristic)."""
+    parts = [a.strip() for a in authors_str.split(";") if a.strip()]
+    labs = [n.lower() for n in LAB_NAMES]
+    others = [p for p in parts if not any(lbl in p.lower() for lbl in labs)]
+    return "; ".join(others)
+
 # ----------- AI helpers -----------
 def ai_classify_study_and_sdg(title: str, abstract: str) -> Tuple[str, str]:
-    if not _HAS_OPENAI or not OPENAI_API_KEY:
+    if not llm.available():
         return "", ""
-    client = OpenAI(api_key=OPENAI_API_KEY)
     system = (
         "You classify research papers USING ONLY the provided title+abstract. "
         "Return two concise tags:\n"
@@ -322,20 +457,7 @@ def ai_classify_study_and_sdg(title: str, abstract: str) -> Tuple[str, str]:
         "2) sdg_tags as terse codes like 'SDG 14; SDG 13' (if none, return empty)."
     )
     user = f"Title: {title or '[untitled]'}\n\nAbstract:\n{abstract or '[none]'}\n\nReturn just two lines:\nstudy_type: <one>\nsdg_tags: <codes or empty>"
-    out = ""
-    for attempt in range(5):
-        try:
-            resp = client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[{"role":"system","content":system},
-                          {"role":"user","content":user}],
-                temperature=0.0,
-                max_tokens=120
-            )
-            out = resp.choices[0].message.content.strip()
-            break
-        except Exception:
-            time.sleep(min(2**attempt, 30))
+    out = llm.chat(system, user, temperature=0.0, max_tokens=120, prompt="classify")
     study_type, sdg_tags = "", ""
     for line in out.splitlines():
         if line.lower().startswith("study_type:"):
@@ -345,29 +467,14 @@ def ai_classify_study_and_sdg(title: str, abstract: str) -> Tuple[str, str]:
     return study_type, sdg_tags
 
 def ai_keywords_fallback(title: str, abstract: str) -> str:
-    if not _HAS_OPENAI or not OPENAI_API_KEY:
+    if not llm.available():
         return ""
-    client = OpenAI(api_key=OPENAI_API_KEY)
     system = (
         "Extract 5–8 concise, lowercased keyword phrases from ONLY the given title+abstract. "
         "Return a single semicolon-separated string."
     )
     user = f"Title: {title}\n\nAbstract:\n{abstract}\n\nKeywords:"
-    out = ""
-    for attempt in range(5):
-        try:
-            resp = client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[{"role":"system","content":system},
-                          {"role":"user","content":user}],
-                temperature=0.2,
-                max_tokens=80
-            )
-            out = resp.choices[0].message.content.strip()
-            break
-        except Exception:
-            time.sleep(min(2**attempt, 30))
-    return out
+    return llm.chat(system, user, temperature=0.2, max_tokens=80, prompt="keywords")
 
 def gen_summaries(title: str, abstract: str, overwrite: bool,
                   existing_plain: str, existing_wim: str) -> Tuple[str, str]:
@@ -378,10 +485,9 @@ def gen_summaries(title: str, abstract: str, overwrite: bool,
     if not (need_plain or need_wim):
         return plain, wim
 
-    if not _HAS_OPENAI or not OPENAI_API_KEY:
+    if not llm.available():
         return plain or "", wim or ""
 
-    client = OpenAI(api_key=OPENAI_API_KEY)
     system = (
         "You create plain-language outputs for scientific papers. "
         "Use ONLY the provided title and abstract; no external facts. "
@@ -389,20 +495,7 @@ def gen_summaries(title: str, abstract: str, overwrite: bool,
         "2) On a new line, 'Why it matters: <clause>'."
     )
     user = f"Title: {title or '[untitled]'}\n\nAbstract:\n{abstract or '[none]'}\n\nWrite outputs."
-    out = ""
-    for attempt in range(5):
-        try:
-            resp = client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[{"role":"system","content":system},
-                          {"role":"user","content":user}],
-                temperature=0.2,
-                max_tokens=240
-            )
-            out = resp.choices[0].message.content.strip()
-            break
-        except Exception:
-            time.sleep(min(2**attempt, 30))
+    out = llm.chat(system, user, temperature=0.2, max_tokens=240, prompt="summaries")
 
     if out:
         parts = [p.strip() for p in out.split("\n") if p.strip()]
@@ -418,22 +511,181 @@ def gen_summaries(title: str, abstract: str, overwrite: bool,
         if need_wim:   wim = wim_text
     return plain or "", wim or ""
 
+def missing_ai_fields(row, current, overwrite_summaries: bool) -> List[str]:
+    """AI fields the combined call should fill: `row` is the input, `current` the row after metadata."""
+    want: List[str] = []
+    if overwrite_summaries or not norm(row.get("plain_summary","")):
+        want.append("plain_summary")
+    if overwrite_summaries or not norm(row.get("why_it_matters","")):
+        want.append("why_it_matters")
+    # existing study_type / sdg_tags / keywords are never replaced, so they are never asked for
+    for k in ("study_type", "sdg_tags", "keywords"):
+        if not norm(current.get(k,"")):
+            want.append(k)
+    return want
+
+# Each AI step is a pipeline stage reading the input `row` and `current` (the row after
+# metadata) and returning {column: value}; stages run on worker threads, so they only read.
+def fields_updates(row, current, args) -> Dict[str, str]:
+    """Combined mode: one structured call for every missing AI field."""
+    want = missing_ai_fields(row, current, args.overwrite_summaries)
+    title, abstract = str(current.get("title", "")), str(current.get("abstract", ""))
+    return {k: v for k, v in llm.enrich_fields(title, abstract, want).items() if v}
+
+def summary_updates(row, current, args) -> Dict[str, str]:
+    updates: Dict[str, str] = {}
+    plain_existing = str(row.get("plain_summary","") or "").strip()
+    wim_existing   = str(row.get("why_it_matters","") or "").strip()
+    plain, wim = gen_summaries(
+        title=str(current.get("title", "")),
+        abstract=str(current.get("abstract", "")),
+        overwrite=args.overwrite_summaries,
+        existing_plain=plain_existing,
+        existing_wim=wim_existing
+    )
+    if (args.overwrite_summaries or not plain_existing) and plain:
+        updates["plain_summary"] = plain
+    if (args.overwrite_summaries or not wim_existing) and wim:
+        updates["why_it_matters"] = wim
+    return updates
+
+def classify_updates(row, current, args) -> Dict[str, str]:
+    """AI study_type + sdg_tags."""
+    updates: Dict[str, str] = {}
+    if args.overwrite_ai_tags or (not norm(row.get("study_type","")) or not norm(row.get("sdg_tags",""))):
+        st, sdg = ai_classify_study_and_sdg(title=str(current.get("title", "")), abstract=str(current.get("abstract", "")))
+        if not norm(row.get("study_type","")) and st:
+            updates["study_type"] = st
+        if not norm(row.get("sdg_tags","")) and sdg:
+            updates["sdg_tags"] = sdg
+    return updates
+
+def keyword_updates(row, current, args) -> Dict[str, str]:
+    """Keywords fallback via AI if still missing after metadata."""
+    if (args.overwrite_ai_tags or not norm(row.get("keywords",""))) and not norm(current.get("keywords","")):
+        kw = ai_keywords_fallback(title=str(current.get("title", "")), abstract=str(current.get("abstract", "")))
+        if kw:
+            return {"keywords": kw}
+    return {}
+
+AI_STAGES = {
+    "combined": [("ai_fields", fields_updates)],
+    "separate": [("summaries", summary_updates), ("classify", classify_updates), ("keywords", keyword_updates)],
+}
+
+META_WORKERS = 4  # rows fetching Crossref/OpenAlex at once (LIMITER still paces each host)
+
+def build_pipeline(args) -> Pipeline:
+    """
+    metadata -> current -> AI stage(s). The separate-mode prompts are independent
+    of each other and run side by side, sharing one --llm_workers limit; while
+    they run, metadata for the next rows is already being fetched.
+    """
+    def ai_stage(name, fn) -> Stage:
+        return Stage(name, lambda c: {name: fn(c["row"], c["current"], args)}, needs=("row", "current"),
+                     gives=(name,), limit=args.llm_workers, group="llm")
+
+    return Pipeline([
+        Stage("metadata", lambda c: {"meta": metadata_updates(c["row"])}, needs=("row",), gives=("meta",), limit=META_WORKERS),
+        Stage("overlay", lambda c: {"current": overlay(c["row"], c["meta"])}, needs=("row", "meta"),
+              gives=("current",), inline=True),
+    ] + [ai_stage(name, fn) for name, fn in AI_STAGES[args.llm_mode]])
+
+def row_outcome(ctx: Dict[str, Any], ai_names: List[str]) -> str:
+    """'ok', or why the row is still missing metadata / AI fields (for the run report)."""
+    row, current = ctx["row"], ctx["current"]
+    if not norm(current.get("journal","")):
+        return "no_metadata"
+    if llm.available() and not norm(row.get("study_type","")) and not any(ctx[name] for name in ai_names):
+        return "no_ai"
+    return "ok"
+
 # ----------- Main processing -----------
-def main():
-    ap = argparse.ArgumentParser(description="Extended enrichment for Adrian's publication CSV.")
-    ap.add_argument("--in", dest="inp", required=True, help="Input CSV/XLSX path")
-    ap.add_argument("--out", dest="out", required=True, help="Output CSV/XLSX path")
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None):
+    ap = argparse.ArgumentParser(prog=prog, description="Extended enrichment for Adrian's publication CSV.")
+    ap.add_argument("--in", dest="inp", required=True, help="Input CSV/XLSX/Parquet/Feather path")
+    ap.add_argument("--out", dest="out", required=True, help="Output CSV/XLSX/Parquet/Feather path")
     ap.add_argument("--limit", type=int, default=None, help="Process first N rows")
     ap.add_argument("--overwrite_summaries", action="store_true", help="Regenerate plain_summary & why_it_matters")
     ap.add_argument("--overwrite_ai_tags", action="store_true", help="Regenerate AI tags (study_type, sdg_tags, keywords if empty)")
     ap.add_argument("--infer_collaborators", action="store_true", help="Infer collaborators from author list (non-lab names)")
-    args = ap.parse_args()
+    ap.add_argument("--llm_mode", choices=["combined", "separate"], default="combined",
+                    help="combined: one structured LLM call per row for the missing AI fields; separate: the old three prompts")
+    ap.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="SQLite response cache shared by the enrichment scripts")
+    ap.add_argument("--no_cache", action="store_true", help="Always hit Crossref/OpenAlex; do not read or write the cache")
+    ap.add_argument("--checkpoint", default="", help="Checkpoint journal path (default: <out>.journal.jsonl)")
+    ap.add_argument("--resume", action="store_true", help="Skip rows already finished in the checkpoint journal")
+    ap.add_argument("--llm_workers", type=int, default=llm.DEFAULT_WORKERS, help="Concurrent LLM requests")
+    ap.add_argument("--llm_rpm", type=float, default=llm.DEFAULT_RPM, help="LLM requests-per-minute budget")
+    ap.add_argument("--llm_tpm", type=float, default=llm.DEFAULT_TPM, help="LLM tokens-per-minute budget")
+    ap.add_argument("--llm_cache_bypass", action="store_true", help="Ignore cached LLM completions (fresh answers still replace them)")
+    ap.add_argument("--llm_invalidate", default="", help="Comma-separated prompt names whose cached completions are dropped first, or 'all'")
+    ap.add_argument("--refresh_citations", action="store_true", help="Only refresh citation_count (bulk OpenAlex) and record a dated snapshot")
+    ap.add_argument("--citation_store", default="", help="SQLite file for citation snapshots (default: .citations.sqlite next to the scripts)")
+    ap.add_argument("--no_sidecar", action="store_true", help="Do not read or write the Parquet sidecar of a CSV/XLSX input")
+    ap.add_argument("--report", default="", help="Run report JSON path (default: <out>.report.json)")
+    ap.add_argument("--profile", action="store_true", help="Profile the run (cProfile, tracemalloc, per-stage timings)")
+    ap.add_argument("--profile_prefix", default="", help="Profile output prefix (default: <out>.profile)")
+    ap.add_argument("--shard", type=parse_shard, default=None, metavar="I/N",
+                    help="Process only shard I of N (rows split by DOI/title) and write <out>.shard-I-of-N")
+    ap.add_argument("--shards", type=shard_count, default=0, metavar="N",
+                    help="Run N shards as parallel processes sharing the rate budget, then merge them into --out")
+    args = ap.parse_args(argv)
+    if args.refresh_citations and (args.shard or args.shards):
+        ap.error("--refresh_citations is a single bulk request pass; it cannot be sharded")
+    if args.shards:
+        if args.shard:
+            ap.error("--shard and --shards cannot be combined")
+        sys.exit(run_shards(argv, args.shards, args.out, os.path.abspath(__file__)))
+    if args.shard:
+        # this process's outputs get the shard suffix; its pacing is 1/N of the run's budget
+        share = split_budget(args.shard[1])
+        args.llm_rpm *= share
+        args.llm_tpm *= share
+        for opt in ("out", "checkpoint", "report", "profile_prefix"):
+            if getattr(args, opt):
+                setattr(args, opt, shard_path(getattr(args, opt), *args.shard))
+    if args.profile:
+        PROFILER.start()
+    # Heavy dependencies are imported here rather than at module load (fast --help and startup)
+    import requests
+    from tqdm import tqdm
+    # Optional .env
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+    global SESSION
+    SESSION = requests.Session()
+    SESSION.headers.update({"User-Agent": USER_AGENT})
+
+    if args.refresh_citations:
+        store = CitationStore(args.citation_store) if args.citation_store else CitationStore()
+        try:
+            n, found, changed = refresh_file(args.inp, args.out, store, get_json=http_get_json)
+        finally:
+            store.close()
+        print(f"[OK] Citations: {found} of {n} DOIs found, {changed} rows changed → {args.out}")
+        print(LIMITER.summary())
+        METRICS.write_report(args.report or args.out + ".report.json", script="enrich_pubs_mac_ext --refresh_citations",
+                             argv=sys.argv[1:], sections={"citations": {"dois": n, "found": found, "changed": changed}})
+        if args.profile:
+            for path in PROFILER.write(args.profile_prefix or args.out + ".profile", title="enrich_pubs_mac_ext --refresh_citations"):
+                print(f"Profile: {path}")
+        return
+
+    global CACHE, RESOLVER, OPENALEX_SELECT
+    CACHE = None if args.no_cache else ResponseCache(args.cache)
+    OPENALEX_SELECT = projection(openalex_fields, also=("id",))
+    RESOLVER = TitleResolver(http_get_json, CACHE, base=OPENALEX_BASE, select=OPENALEX_SELECT)
+    # LLM completions cost money, so they stay cached under --no_cache too
+    llm.configure_cache(CACHE or ResponseCache(args.cache), bypass=args.llm_cache_bypass,
+                        invalidate=args.llm_invalidate.split(","))
 
     # Read
-    if args.inp.lower().endswith(".csv"):
-        df = pd.read_csv(args.inp)
-    else:
-        df = pd.read_excel(args.inp)
+    with PROFILER.phase("load", exclusive=True):
+        df = read_table(args.inp, sidecar=not args.no_sidecar)
 
     # Ensure expected original columns exist (keep exact names)
     expected = [
@@ -459,112 +711,91 @@ def main():
     rows = df.index.tolist()
     if args.limit is not None:
         rows = rows[:args.limit]
+    if args.shard:
+        mine = shard_rows(df, *args.shard)
+        keep = set(mine)
+        rows = [idx for idx in rows if idx in keep]
+
+    # Checkpoint journal: skip rows already finished (and unchanged) on --resume
+    journal = Journal(args.checkpoint or args.out + ".journal.jsonl")
+    done = journal.load_data(RecordStore(STRINGS)) if args.resume else RecordStore()
+    salt = f"summaries={args.overwrite_summaries};ai_tags={args.overwrite_ai_tags};collab={args.infer_collaborators};llm={args.llm_mode}"
+    input_cols = list(df.columns)
+    inputs = df.loc[rows].to_dict("index")
+    fps = {idx: row_fingerprint(inputs[idx], input_cols, salt) for idx in rows}
+    # Per-row results ({column: value}), kept compactly; merged into df in one step after the loop
+    overwrite = ["plain_summary", "why_it_matters"] if args.overwrite_summaries else []
+    results = RecordStore(STRINGS)
+    for idx in rows:
+        if fps[idx] in done:
+            results[idx] = {k: v for k, v in done[fps[idx]].items() if k in df.columns}
+    pending = [idx for idx in rows if fps[idx] not in done]
+    del done
+    if args.resume:
+        print(f"Resuming: {len(rows) - len(pending)} of {len(rows)} rows already done")
+    journal.open(reset=not args.resume)
+
+    prefetch_metadata([inputs[idx] for idx in pending])
+
+    llm.configure_budget(rpm=args.llm_rpm, tpm=args.llm_tpm)
+    pipe = build_pipeline(args)
+    ai_names = [name for name, _ in AI_STAGES[args.llm_mode]]
+    progress = tqdm(total=len(pending), desc="Enriching pubs (extended)")
+
+    def finish(k: int, ctx: Dict[str, Any], err: Optional[BaseException], secs: float) -> None:
+        idx = pending[k - 1]
+        progress.update(1)
+        key = norm(ctx["row"].get("doi","")) or norm(ctx["row"].get("title",""))[:80]
+        if err is not None:
+            print(f"Error on row {idx}: {err}", file=sys.stderr)
+            METRICS.row("error", key, error=repr(err)[:200])
+            return
+        METRICS.row(row_outcome(ctx, ai_names), key)
+        # Metadata for empty cells only; the original DOI / 'pdf link ' are never overwritten
+        rec = dict(ctx["meta"])
+        for name in ai_names:
+            rec.update(ctx[name])
+        results[idx] = rec
+        journal.append(fps[idx], idx, rec, t=time.time(), elapsed=secs)
 
-    for idx in tqdm(rows, desc="Enriching pubs (extended)"):
-        row = df.loc[idx]
-
-        # Preserve original DOI and 'pdf link ' values (we won't overwrite if present)
-        doi = str(row.get("doi","") or "").strip()
-        title = str(row.get("title","") or "").strip()
-        abstract_existing = str(row.get("abstract","") or "").strip()
-
-        # Determine if we need external metadata
-        need_meta = any([not norm(row.get(c,"")) for c in
-                        ["journal","volume","issue","pages","publisher","abstract","source_url","keywords","issn","journal_abbrev","citation_count"]])
-
-        meta = {}
-        if need_meta:
-            meta = get_metadata(doi, title)
-
-        # Fill fields if empty (do not overwrite filled cells)
-        for k in ["journal","journal_abbrev","volume","issue","pages","publisher","abstract",
-                  "title","doi","keywords","issn"]:
-            if k in meta and not norm(row.get(k,"")):
-                df.at[idx, k] = meta[k]
-
-        # citation_count: respect existing numeric value; else fill from meta if available
-        if not str(row.get("citation_count","") or "").strip():
-            if "citation_count" in meta and meta["citation_count"] != "":
-                df.at[idx, "citation_count"] = meta["citation_count"]
-
-        # source_url
-        if not norm(row.get("source_url","")) and norm(meta.get("url","")):
-            df.at[idx, "source_url"] = meta["url"]
-
-        # DOI URL (deterministic)
-        doi_now = str(df.at[idx, "doi"]).strip() if "doi" in df.columns else doi
-        if doi_now and not norm(row.get("doi_url","")):
-            df.at[idx, "doi_url"] = f"https://doi.org/{doi_now}"
-
-        # Citation APA (deterministic)
-        if not norm(row.get("citation_apa","")):
-            apa = format_citation_apa(
-                authors_str=str(df.at[idx, "authors"]),
-                year=str(df.at[idx, "year"]),
-                title=str(df.at[idx, "title"]),
-                journal=str(df.at[idx, "journal"]),
-                volume=str(df.at[idx, "volume"]),
-                issue=str(df.at[idx, "issue"]),
-                pages=str(df.at[idx, "pages"]),
-                doi_url=str(df.at[idx, "doi_url"]),
-            )
-            df.at[idx, "citation_apa"] = apa
-
-        # AI summaries (optional overwrite)
-        plain_existing = str(row.get("plain_summary","") or "").strip()
-        wim_existing   = str(row.get("why_it_matters","") or "").strip()
-        plain, wim = gen_summaries(
-            title=str(df.at[idx, "title"]),
-            abstract=str(df.at[idx, "abstract"]),
-            overwrite=args.overwrite_summaries,
-            existing_plain=plain_existing,
-            existing_wim=wim_existing
-        )
-        if (args.overwrite_summaries or not plain_existing) and plain:
-            df.at[idx, "plain_summary"] = plain
-        if (args.overwrite_summaries or not wim_existing) and wim:
-            df.at[idx, "why_it_matters"] = wim
-
-        # AI study_type + sdg_tags
-        if args.overwrite_ai_tags or (not norm(row.get("study_type","")) or not norm(row.get("sdg_tags",""))):
-            st, sdg = ai_classify_study_and_sdg(
-                title=str(df.at[idx, "title"]),
-                abstract=str(df.at[idx, "abstract"]),
-            )
-            if not norm(row.get("study_type","")) and st:
-                df.at[idx, "study_type"] = st
-            if not norm(row.get("sdg_tags","")) and sdg:
-                df.at[idx, "sdg_tags"] = sdg
-
-        # Keywords fallback via AI if still missing
-        if (args.overwrite_ai_tags or not norm(row.get("keywords",""))) and not norm(df.at[idx, "keywords"]):
-            kw = ai_keywords_fallback(
-                title=str(df.at[idx, "title"]),
-                abstract=str(df.at[idx, "abstract"]),
-            )
-            if kw:
-                df.at[idx, "keywords"] = kw
-
-        # Optionally infer collaborators (very light heuristic)
-        if args.infer_collaborators and not norm(row.get("collaborators","")):
-            # If authors exist and your name detected, list other authors as collaborators
-            authors_str = str(df.at[idx, "authors"])
-            if authors_str:
-                parts = [a.strip() for a in authors_str.split(";") if a.strip()]
-                labs = {"Adrian Stier","A. C. Stier","Adrian C. Stier","Stier, A.", "Stier, A. C."}
-                others = [p for p in parts if not any(lbl.lower() in p.lower() for lbl in [n.lower() for n in labs])]
-                if others:
-                    df.at[idx, "collaborators"] = "; ".join(others)
-
-        time.sleep(0.35)  # polite pacing
+    try:
+        pipe.run_sync(({"row": inputs.pop(idx)} for idx in pending), finish, window=max(args.llm_workers, META_WORKERS) * 2)
+    finally:
+        progress.close()
+    journal.close()
+
+    # One vectorized merge, then the deterministic columns over the whole frame
+    with PROFILER.phase("merge", exclusive=True):
+        merge_records(df, results, overwrite=overwrite)
+        sub = df.loc[rows]
+        doi = text(sub["doi"])
+        fill_where_blank(df, rows, "doi_url", ("https://doi.org/" + doi).where(doi.ne(""), ""))
+        fill_where_blank(df, rows, "citation_apa", citation_apa_column(df.loc[rows]))
+        if args.infer_collaborators:
+            fill_where_blank(df, rows, "collaborators", text(sub["authors"]).map(infer_collaborators))
 
     # Write out
-    if args.out.lower().endswith(".csv"):
-        df.to_csv(args.out, index=False)
-    else:
-        df.to_excel(args.out, index=False)
+    with PROFILER.phase("write", exclusive=True):
+        if args.shard:
+            write_shard(df, mine, args.out, *args.shard, source=args.inp)
+        else:
+            write_table(df, args.out)
 
     print(f"[OK] Wrote → {args.out}")
+    print(LIMITER.summary())
+    print(RESOLVER.summary())
+    print(llm.BUDGET.summary())
+    print(pipe.summary())
+    print(METRICS.summary())
+    report = METRICS.write_report(args.report or args.out + ".report.json", script="enrich_pubs_mac_ext",
+                                  argv=sys.argv[1:], rows=len(rows), resumed=len(rows) - len(pending), sections={
+        "cache": CACHE.report() if CACHE else None, "llm_cache": llm.CACHE.report() if llm.CACHE not in (None, CACHE) else None,
+        "llm": llm.BUDGET.stats, "titles": RESOLVER.stats, "pipeline": pipe.stats})
+    if report:
+        print(f"Run report: {report}")
+    if args.profile:
+        for path in PROFILER.write(args.profile_prefix or args.out + ".profile", title="enrich_pubs_mac_ext"):
+            print(f"Profile: {path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
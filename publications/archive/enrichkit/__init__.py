@@ -0,0 +1,7 @@
+"""
+Shared helpers for the publication enrichment scripts in this folder
+(enrich_publications.py, enrich_pubs_mac.py, enrich_pubs_mac_ext.py).
+
+The scripts import from here directly (they live next to this package), so
+each module keeps its own dependencies light and optional.
+"""
@@ -0,0 +1,365 @@
+"""
+Persistent response cache for Crossref / OpenAlex / Unpaywall lookups.
+
+Entries live in a single SQLite file keyed by (source, key), where key is a
+normalized DOI or search query. Each source has its own TTL: Crossref
+bibliographic data never expires, while OpenAlex records (which carry
+cited_by_count) go stale after a day.
+
+Responses may carry HTTP validators (ETag / Last-Modified), which are kept
+with the entry. When such an entry expires, cached_conditional() asks the
+server with If-None-Match / If-Modified-Since; a 304 serves the stored body
+and renews its TTL, so refreshing an unchanged record costs no payload and
+no JSON parsing of a new one.
+
+Projections. Records fetched with a field selection (OpenAlex select=, see
+enrichkit/openalex.py) hold only some fields. Readers pass `covers`, a
+predicate on the stored value: an entry that lacks fields this reader needs
+counts as a miss, is fetched again without validators (they belong to the
+other selection), and the new fields are stored together with the old ones.
+
+The file is safe to share between threads and processes: every thread gets its
+own connection, the database runs in WAL mode, and writers wait on a busy
+timeout instead of failing. The cache is size-bounded; once it grows past
+max_bytes the least recently used entries are evicted.
+
+Usage:
+    cache = ResponseCache(".enrich_cache.sqlite")
+    msg = cached(cache, "crossref", normalize_doi(doi), lambda: fetch(doi))
+    rec = cached_conditional(cache, "openalex", key, lambda headers: get(url, headers))
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "ENRICH_CACHE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".enrich_cache.sqlite"),
+)
+
+DAY = 24 * 3600
+
+# Seconds until an entry expires; None = never.
+DEFAULT_TTLS: Dict[str, Optional[int]] = {
+    "crossref": None,          # bibliographic metadata is effectively immutable
+    "openalex": DAY,           # includes cited_by_count
+    "openalex_search": 7 * DAY,
+    "openalex_work": DAY,      # works resolved by title, keyed by OpenAlex ID
+    "title_index": None,       # title|year|first author -> OpenAlex work ID (misses are stored with a TTL)
+    "unpaywall": 7 * DAY,      # OA locations change occasionally
+    "ogimage": 30 * DAY,       # og:image / og:title per landing page URL
+    "robots": DAY,             # robots.txt per publisher domain
+    "llm": None,               # "llm:<prompt>" completions, keyed by a hash of the full request
+}
+FALLBACK_TTL = 7 * DAY
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+_EVICT_EVERY = 64  # writes between size checks
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    source      TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    body        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    fetched_at  REAL NOT NULL,
+    expires_at  REAL,
+    accessed_at REAL NOT NULL,
+    etag        TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (source, key)
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+"""
+# columns added after the first release; older cache files get them on open
+_ADDED_COLUMNS = {"etag": "TEXT", "last_modified": "TEXT"}
+
+Validators = Dict[str, str]
+NOT_MODIFIED = object()  # returned by a conditional fetch on HTTP 304
+
+
+def normalize_doi(doi: Any) -> str:
+    """Lowercase DOI without resolver prefix, e.g. 'https://doi.org/10.1/X' -> '10.1/x'."""
+    if not isinstance(doi, str):
+        return ""
+    d = doi.strip().lower()
+    d = re.sub(r"^(https?://(dx\.)?doi\.org/|doi:)", "", d)
+    return d.strip()
+
+
+def normalize_query(q: Any) -> str:
+    """Collapse whitespace and case so trivially different queries share an entry."""
+    if not isinstance(q, str):
+        return ""
+    return re.sub(r"\s+", " ", q).strip().lower()
+
+
+class ResponseCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 ttls: Optional[Dict[str, Optional[int]]] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.by_source: Dict[str, Dict[str, int]] = {}  # source -> {"hits", "misses"}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._conn() as con:
+            con.executescript(_SCHEMA)
+            have = {r[1] for r in con.execute("PRAGMA table_info(responses)")}
+            for col, typ in _ADDED_COLUMNS.items():
+                if col not in have:
+                    try:
+                        con.execute(f"ALTER TABLE responses ADD COLUMN {col} {typ}")
+                    except sqlite3.OperationalError:
+                        pass  # another process added it first
+
+    # ---- connections ----
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("PRAGMA busy_timeout=30000")
+            self._local.con = con
+        return con
+
+    def close(self) -> None:
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+    # ---- reads / writes ----
+    def ttl_for(self, source: str) -> Optional[int]:
+        if source in self.ttls:
+            return self.ttls[source]
+        return self.ttls.get(source.split(":", 1)[0], FALLBACK_TTL)
+
+    def get(self, source: str, key: str, covers: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        """Return the cached value, or None when missing, expired or (with covers) lacking fields."""
+        if not key:
+            return None
+        now = time.time()
+        con = self._conn()
+        row = con.execute(
+            "SELECT body, expires_at FROM responses WHERE source = ? AND key = ?",
+            (source, key),
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < now):
+            self._count(source, "misses")
+            return None
+        value = json.loads(row[0])
+        if covers is not None and not covers(value):
+            self._count(source, "misses")
+            return None
+        con.execute(
+            "UPDATE responses SET accessed_at = ? WHERE source = ? AND key = ?",
+            (now, source, key),
+        )
+        self._count(source, "hits")
+        return value
+
+    def _count(self, source: str, kind: str) -> None:
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+            st = self.by_source.setdefault(source, {"hits": 0, "misses": 0})
+            st[kind] += 1
+
+    def get_stale(self, source: str, key: str) -> Optional[Tuple[Any, Validators]]:
+        """(value, validators) even when the entry has expired; None when missing."""
+        if not key:
+            return None
+        row = self._conn().execute(
+            "SELECT body, etag, last_modified FROM responses WHERE source = ? AND key = ?",
+            (source, key),
+        ).fetchone()
+        if row is None:
+            return None
+        validators = {k: v for k, v in (("etag", row[1]), ("last_modified", row[2])) if v}
+        return json.loads(row[0]), validators
+
+    def set(self, source: str, key: str, value: Any, ttl: Optional[int] = -1,
+            validators: Optional[Validators] = None) -> None:
+        """Store value (with its HTTP validators, if any); ttl=-1 means 'use the source default'."""
+        if not key:
+            return
+        if ttl == -1:
+            ttl = self.ttl_for(source)
+        now = time.time()
+        body = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        validators = validators or {}
+        con = self._conn()
+        con.execute(
+            "INSERT OR REPLACE INTO responses "
+            "(source, key, body, size, fetched_at, expires_at, accessed_at, etag, last_modified) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (source, key, body, len(body), now, (now + ttl) if ttl is not None else None, now,
+             validators.get("etag"), validators.get("last_modified")),
+        )
+        with self._lock:
+            self._writes += 1
+            check = self._writes % _EVICT_EVERY == 0
+        if check:
+            self.evict()
+
+    def renew(self, source: str, key: str, validators: Optional[Validators] = None) -> None:
+        """Restart an entry's TTL after a 304; new validators (if sent) replace the old ones."""
+        ttl = self.ttl_for(source)
+        now = time.time()
+        validators = validators or {}
+        self._conn().execute(
+            "UPDATE responses SET fetched_at = ?, expires_at = ?, accessed_at = ?, "
+            "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+            "WHERE source = ? AND key = ?",
+            (now, (now + ttl) if ttl is not None else None, now,
+             validators.get("etag"), validators.get("last_modified"), source, key),
+        )
+        with self._lock:
+            self.revalidated += 1
+
+    def get_or_fetch(self, source: str, key: str, fetch: Callable[[], Any],
+                     covers: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Cached value if fresh, else fetch() and store it (empty results are not cached)."""
+        hit = self.get(source, key, covers)
+        if hit is not None:
+            return hit
+        other = self.other_selection(source, key, covers)
+        value = fetch()
+        if value:
+            value = with_fields_of(other, value)
+            self.set(source, key, value)
+        return value
+
+    def other_selection(self, source: str, key: str,
+                        covers: Optional[Callable[[Any], bool]]) -> Optional[Tuple[Any, Validators]]:
+        """The stored (value, validators) when it lacks fields covers() wants, else None."""
+        if covers is None:
+            return None
+        stale = self.get_stale(source, key)
+        return stale if stale is not None and not covers(stale[0]) else None
+
+    def report(self) -> Dict[str, Any]:
+        """Hit rates overall and per source, for the run report."""
+        with self._lock:
+            by_source = {src: {**st, "hit_rate": round(st["hits"] / ((st["hits"] + st["misses"]) or 1), 3)}
+                         for src, st in sorted(self.by_source.items())}
+            return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated,
+                    "hit_rate": round(self.hits / ((self.hits + self.misses) or 1), 3), "by_source": by_source}
+
+    # ---- maintenance ----
+    def total_bytes(self) -> int:
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones until under ~90% of max_bytes."""
+        con = self._conn()
+        removed = 0
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            removed += con.execute(
+                "DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+            ).rowcount
+            total = con.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                target = int(self.max_bytes * 0.9)
+                for source, key, size in con.execute(
+                    "SELECT source, key, size FROM responses ORDER BY accessed_at"
+                ).fetchall():
+                    if total <= target:
+                        break
+                    con.execute("DELETE FROM responses WHERE source = ? AND key = ?", (source, key))
+                    total -= size
+                    removed += 1
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return removed
+
+    def clear(self, source: Optional[str] = None) -> None:
+        con = self._conn()
+        if source is None:
+            con.execute("DELETE FROM responses")
+        else:
+            con.execute("DELETE FROM responses WHERE source = ?", (source,))
+
+
+def cached(cache: Optional[ResponseCache], source: str, key: str, fetch: Callable[[], Any],
+           covers: Optional[Callable[[Any], bool]] = None) -> Any:
+    """get_or_fetch that degrades to a plain fetch when caching is off."""
+    if cache is None or not key:
+        return fetch()
+    return cache.get_or_fetch(source, key, fetch, covers)
+
+
+def with_fields_of(other: Optional[Tuple[Any, Validators]], value: Any) -> Any:
+    """value plus the fields of another selection's stored record (value wins)."""
+    if other is not None and isinstance(other[0], dict) and isinstance(value, dict):
+        return {**other[0], **value}
+    return value
+
+
+def validators_from(headers: Optional[Mapping[str, Any]]) -> Validators:
+    """ETag / Last-Modified of a response, for storing with the cached body."""
+    out: Validators = {}
+    if not headers:
+        return out
+    etag, modified = headers.get("ETag"), headers.get("Last-Modified")
+    if etag:
+        out["etag"] = str(etag)
+    if modified:
+        out["last_modified"] = str(modified)
+    return out
+
+
+def conditional_headers(validators: Optional[Validators]) -> Dict[str, str]:
+    """If-None-Match / If-Modified-Since request headers for stored validators."""
+    headers: Dict[str, str] = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def cached_conditional(cache: Optional[ResponseCache], source: str, key: str,
+                       fetch: Callable[[Dict[str, str]], Tuple[Any, Validators]],
+                       covers: Optional[Callable[[Any], bool]] = None) -> Any:
+    """
+    cached() for fetchers that speak HTTP validators. fetch(headers) gets the
+    conditional request headers for an expired entry ({} otherwise) and returns
+    (value, validators), or (NOT_MODIFIED, validators) on a 304, in which case
+    the stored value is served and its TTL renewed.
+    """
+    if cache is None or not key:
+        value, _ = fetch({})
+        return {} if value is NOT_MODIFIED else value
+    hit = cache.get(source, key, covers)
+    if hit is not None:
+        return hit
+    stale = cache.get_stale(source, key)
+    other = None
+    if stale is not None and covers is not None and not covers(stale[0]):
+        other, stale = stale, None  # its validators are for the other selection
+    value, validators = fetch(conditional_headers(stale[1]) if stale else {})
+    if value is NOT_MODIFIED:
+        if stale is None:
+            return {}
+        cache.renew(source, key, validators)
+        return stale[0]
+    if value:
+        value = with_fields_of(other, value)
+        cache.set(source, key, value, validators=validators)
+    return value
@@ -0,0 +1,123 @@
+"""
+Crash-safe checkpoint journal for the enrichment loops.
+
+Every finished row is appended to a JSON-lines file and flushed to disk
+straight away:
+
+    {"fp": "<row fingerprint>", "row": <row key>, "t": <unix time>, "elapsed": <seconds>, "data": {...}}
+
+The fingerprint hashes the row's input columns (DOI, title and whatever else
+the loop reads) plus a salt for the flags that change the output. On --resume
+a row whose fingerprint is already in the journal is skipped and its stored
+"data" is used to rebuild the output; editing any input cell changes the
+fingerprint, so that row is redone. A torn last line from a crash is ignored,
+and cut off when the journal is reopened for appending.
+"""
+import hashlib
+import json
+import math
+import os
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional
+
+
+def jsonable(v: Any) -> Any:
+    """Plain-JSON version of a cell value (NaN -> None, numpy scalars -> Python)."""
+    if v is None:
+        return None
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    if hasattr(v, "item") and not isinstance(v, (list, dict, str, bytes)):
+        try:
+            v = v.item()
+        except Exception:
+            pass
+        if isinstance(v, float) and math.isnan(v):
+            return None
+    if isinstance(v, (str, int, float, bool, list, dict)) or v is None:
+        return v
+    return str(v)
+
+
+def row_fingerprint(values: Mapping[str, Any], cols: Iterable[str], salt: str = "") -> str:
+    """Stable hash of the given columns of a row (dict or pandas Series)."""
+    payload = [salt] + [[c, jsonable(values.get(c))] for c in cols]
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class Journal:
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+
+    def _entries(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn write from an interrupted run
+                if isinstance(entry, dict) and entry.get("fp"):
+                    yield entry
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """fingerprint -> latest journal entry; unreadable lines are skipped."""
+        return {entry["fp"]: entry for entry in self._entries()}
+
+    def load_data(self, into: Any) -> Any:
+        """Put fingerprint -> "data" of the latest entry into `into` (a dict or a RecordStore) and return it."""
+        for entry in self._entries():
+            if isinstance(entry.get("data"), dict):
+                into[entry["fp"]] = entry["data"]
+        return into
+
+    def open(self, reset: bool = False) -> "Journal":
+        """Open for appending; reset=True starts a fresh journal."""
+        d = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(d, exist_ok=True)
+        if not reset:
+            self._drop_torn_tail()
+        self._fh = open(self.path, "w" if reset else "a", encoding="utf-8")
+        return self
+
+    def _drop_torn_tail(self) -> None:
+        """Truncate a partial last line (a crash mid-write) so the next entry starts on its own line."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                step = min(64 * 1024, pos)
+                f.seek(pos - step)
+                nl = f.read(step).rfind(b"\n")
+                if nl >= 0:
+                    pos = pos - step + nl + 1
+                    break
+                pos -= step
+            if pos < end:
+                f.truncate(pos)
+
+    def append(self, fp: str, row: Any, data: Dict[str, Any],
+               t: Optional[float] = None, elapsed: Optional[float] = None) -> None:
+        entry = {"fp": fp, "row": jsonable(row), "t": t, "elapsed": elapsed,
+                 "data": {k: jsonable(v) for k, v in data.items()}}
+        self._fh.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
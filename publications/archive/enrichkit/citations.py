@@ -0,0 +1,210 @@
+"""
+Citation-count refresh without a full enrichment.
+
+Only OpenAlex's cited_by_count is fetched, for all DOIs at once, through
+filter pages that ask for just three fields:
+
+    /works?filter=doi:a|b|...&select=id,doi,cited_by_count&per_page=100
+
+so a library of a few hundred papers costs a handful of small requests.
+Each run appends a dated snapshot to a local SQLite store (one row per DOI
+per day, re-runs on the same day overwrite it), which keeps the history for
+trend lines, and rewrites the citation_count column of the publications
+file in place. Nothing else in the file is touched.
+
+    python -m enrichkit.citations --in enriched_publications.json
+    python -m enrichkit.citations --in pubs.csv --out pubs_refreshed.csv --email you@org
+    python enrich_pubs_mac_ext.py --in pubs.csv --out pubs.csv --refresh_citations
+
+CSV, XLSX and the JSON array written by enrich_publications.py are
+supported; rows without a DOI keep their count.
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import sqlite3
+import sys
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .cache import normalize_doi
+from .metrics import METRICS
+from .ratelimit import LIMITER
+from .tables import read_table, write_table
+
+OPENALEX_WORKS = "https://api.openalex.org/works"
+COUNT_BATCH = 100  # OpenAlex accepts up to 100 OR-ed filter values
+SELECT = "id,doi,cited_by_count"
+TIMEOUT = 30
+RETRIES = 4
+
+DEFAULT_STORE_PATH = os.getenv(
+    "CITATION_STORE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".citations.sqlite"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS citations (
+    doi   TEXT NOT NULL,
+    day   TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (doi, day)
+) WITHOUT ROWID;
+"""
+
+GetJson = Callable[..., Dict[str, Any]]
+
+
+# ---- fetching ----
+def _get_json(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """GET through the shared limiter, retrying 429/5xx a few times; {} on failure."""
+    import requests
+
+    for _ in range(RETRIES):
+        LIMITER.acquire(url)
+        try:
+            with METRICS.timed(url) as t:
+                r = requests.get(url, params=params, timeout=TIMEOUT)
+                t.status = r.status_code
+        except requests.RequestException:
+            continue
+        LIMITER.observe(url, r.status_code, r.headers)  # pauses the host on 429/503
+        if r.status_code == 429 or r.status_code >= 500:
+            continue
+        if r.status_code != 200:
+            return {}
+        try:
+            return r.json()
+        except ValueError:
+            return {}
+    return {}
+
+
+def fetch_counts(dois: Iterable[str], get_json: Optional[GetJson] = None,
+                 email: str = "", base: str = OPENALEX_WORKS) -> Dict[str, int]:
+    """{normalized doi: cited_by_count} for every DOI OpenAlex knows; failed pages are skipped."""
+    get_json = get_json or _get_json
+    # ',' and '|' are filter separators
+    wanted = [d for d in dict.fromkeys(normalize_doi(x) for x in dois) if "/" in d and "," not in d and "|" not in d]
+    counts: Dict[str, int] = {}
+    for i in range(0, len(wanted), COUNT_BATCH):
+        params = {"filter": "doi:" + "|".join(wanted[i:i + COUNT_BATCH]), "select": SELECT, "per_page": COUNT_BATCH}
+        if email:
+            params["mailto"] = email
+        try:
+            data = get_json(base, params=params)
+        except Exception:
+            continue
+        for w in (data.get("results") or []) if isinstance(data, dict) else []:
+            if isinstance(w, dict) and isinstance(w.get("cited_by_count"), int):
+                counts[normalize_doi(w.get("doi"))] = w["cited_by_count"]
+    return counts
+
+
+# ---- snapshots ----
+class CitationStore:
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._con = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._con.executescript(_SCHEMA)
+
+    def record(self, counts: Dict[str, int], day: Optional[str] = None) -> None:
+        day = day or dt.date.today().isoformat()
+        self._con.execute("BEGIN")
+        self._con.executemany("INSERT OR REPLACE INTO citations (doi, day, count) VALUES (?, ?, ?)",
+                              [(d, day, n) for d, n in counts.items()])
+        self._con.execute("COMMIT")
+
+    def history(self, doi: str) -> List[Tuple[str, int]]:
+        """[(day, count)] oldest first."""
+        return self._con.execute("SELECT day, count FROM citations WHERE doi = ? ORDER BY day",
+                                 (normalize_doi(doi),)).fetchall()
+
+    def close(self) -> None:
+        self._con.close()
+
+
+# ---- publications files ----
+def _doi_column(columns: Iterable[str]) -> str:
+    for c in ("doi", "DOI"):
+        if c in columns:
+            return c
+    raise ValueError("no doi column")
+
+
+def refresh_frame(df, counts: Dict[str, int], col: str = "citation_count") -> int:
+    """Overwrite `col` with the fetched counts (rows without one keep theirs); returns rows changed."""
+    from .frame import text  # pandas is only needed for tabular files
+
+    if col not in df.columns:
+        df[col] = ""
+    new = text(df[_doi_column(df.columns)]).map(lambda d: counts.get(normalize_doi(d)))
+    mask = new.notna()
+    changed = int((text(df.loc[mask, col]) != new[mask].astype(int).astype(str)).sum())
+    if df[col].dtype != object:
+        df[col] = df[col].astype(object)
+    df.loc[mask, col] = new[mask].astype(int)
+    return changed
+
+
+def refresh_records(records: List[Dict[str, Any]], counts: Dict[str, int], col: str = "citation_count") -> int:
+    changed = 0
+    for rec in records:
+        n = counts.get(normalize_doi(rec.get("doi") or rec.get("DOI") or ""))
+        if n is not None:
+            changed += rec.get(col) != n
+            rec[col] = n
+    return changed
+
+
+def refresh_file(inp: str, out: str = "", store: Optional[CitationStore] = None, email: str = "",
+                 get_json: Optional[GetJson] = None) -> Tuple[int, int, int]:
+    """Refresh citation counts of a CSV/XLSX/Parquet/Feather/JSON file; returns (rows with a DOI, counts found, rows changed)."""
+    out = out or inp
+    low = inp.lower()
+    if low.endswith(".json"):
+        with open(inp, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        dois = [r.get("doi") or r.get("DOI") or "" for r in records]
+    else:
+        df = read_table(inp)
+        dois = df[_doi_column(df.columns)].tolist()
+    dois = [d for d in (normalize_doi(x) for x in dois) if d]
+
+    counts = fetch_counts(dois, get_json=get_json, email=email)
+    if store is not None:
+        store.record(counts)
+
+    if low.endswith(".json"):
+        changed = refresh_records(records, counts)
+        tmp = out + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, out)
+    else:
+        changed = refresh_frame(df, counts)
+        write_table(df, out)
+    return len(dois), len(counts), changed
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> None:
+    ap = argparse.ArgumentParser(prog=prog, description="Refresh citation_count from OpenAlex and snapshot it.")
+    ap.add_argument("--in", dest="inp", required=True, help="Publications CSV/XLSX/Parquet/Feather/JSON")
+    ap.add_argument("--out", default="", help="Output path (default: rewrite --in)")
+    ap.add_argument("--store", default=DEFAULT_STORE_PATH, help="SQLite file for the dated snapshots")
+    ap.add_argument("--email", default="", help="Contact email for the OpenAlex polite pool")
+    args = ap.parse_args(argv)
+
+    store = CitationStore(args.store)
+    try:
+        n, found, changed = refresh_file(args.inp, args.out, store, email=args.email)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Failed to refresh {args.inp}: {e}")
+    finally:
+        store.close()
+    print(f"Citations: {found} of {n} DOIs found, {changed} rows changed → {args.out or args.inp}")
+    print(LIMITER.summary())
+
+
+if __name__ == "__main__":
+    main()
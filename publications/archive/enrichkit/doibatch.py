@@ -0,0 +1,124 @@
+"""
+Batched DOI resolution for Crossref and OpenAlex.
+
+Instead of one request per DOI, DOIs are resolved in groups of 50:
+  - OpenAlex:  /works?filter=doi:a|b|c&per_page=50
+  - Crossref:  /works?filter=doi:a,doi:b,doi:c&rows=50
+
+The raw records come back keyed by normalized DOI, so callers can feed them
+into their existing crossref_fields / openalex_fields mappers, or pass the
+mapper as `transform` (and a RecordStore as `into`) so only the mapped
+fields are kept and each raw batch is dropped as soon as it is mapped. DOIs that were
+part of a successful batch but not found map to {} (known-missing), which
+lets callers skip the per-DOI fallback request. DOIs already fresh in the
+response cache are not re-requested, and new records are written back to it.
+Expired entries that carry HTTP validators are left out as well: a batch
+response has no per-record ETag, so those are cheaper to revalidate one by
+one with a conditional GET (see cache.cached_conditional).
+
+`select` names the fields to request (OpenAlex and Crossref both take a
+select= list of top-level fields; the DOI field is always added). Cached
+records lacking any of them are fetched again in the batch, keeping the
+fields they had (see enrichkit/openalex.py).
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from enrichkit.cache import ResponseCache, normalize_doi, with_fields_of
+from enrichkit.openalex import covers
+
+BATCH_SIZE = 50
+
+OPENALEX_WORKS = "https://api.openalex.org/works"
+CROSSREF_WORKS = "https://api.crossref.org/works"
+
+GetJson = Callable[..., Dict[str, Any]]
+
+
+def _chunks(seq: List[str], n: int) -> Iterable[List[str]]:
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+def _batchable(doi: str) -> bool:
+    # ',' and '|' are filter separators; such DOIs fall back to single lookups
+    return "/" in doi and "," not in doi and "|" not in doi
+
+
+def _fetch_openalex(group: List[str], get_json: GetJson, base: str, select: str) -> Optional[List[dict]]:
+    params = {"filter": "doi:" + "|".join(group), "per_page": BATCH_SIZE}
+    if select:
+        params["select"] = select
+    data = get_json(base, params=params)
+    if not isinstance(data, dict) or "results" not in data:
+        return None
+    return [w for w in data.get("results") or [] if isinstance(w, dict)]
+
+
+def _fetch_crossref(group: List[str], get_json: GetJson, base: str, select: str) -> Optional[List[dict]]:
+    params = {"filter": ",".join("doi:" + d for d in group), "rows": BATCH_SIZE}
+    if select:
+        params["select"] = select
+    data = get_json(base, params=params)
+    msg = data.get("message") if isinstance(data, dict) else None
+    if not isinstance(msg, dict) or "items" not in msg:
+        return None
+    return [it for it in msg.get("items") or [] if isinstance(it, dict)]
+
+
+_FETCHERS = {
+    "openalex": (_fetch_openalex, "doi", OPENALEX_WORKS),
+    "crossref": (_fetch_crossref, "DOI", CROSSREF_WORKS),
+}
+
+
+def resolve_dois(dois: Iterable[str], source: str, get_json: GetJson,
+                 cache: Optional[ResponseCache] = None,
+                 base: Optional[str] = None,
+                 transform: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                 into: Any = None, select: Optional[Sequence[str]] = None) -> Any:
+    """
+    Resolve DOIs against `source` ('crossref' or 'openalex') in batches.
+
+    Returns {normalized_doi: record}; record is {} when the DOI was queried
+    successfully but does not exist upstream. DOIs whose batch failed are
+    left out so the caller falls back to a single lookup. Found records are
+    cached raw and stored as transform(record); `into` (a dict or a
+    RecordStore) receives them instead of a new dict and is returned.
+    """
+    fetch_group, doi_key, default_base = _FETCHERS[source]
+    base = base or default_base
+    transform = transform or (lambda rec: rec)
+    fields = sorted(set(select) | {doi_key}) if select else []
+    has_fields = covers(fields) if fields else None
+
+    wanted = list(dict.fromkeys(d for d in (normalize_doi(x) for x in dois) if _batchable(d)))
+    out = {} if into is None else into
+    pending: List[str] = []
+    others: Dict[str, Any] = {}  # cached records of another selection, by DOI
+    for d in wanted:
+        hit = cache.get(source, d, has_fields) if cache is not None else None
+        if hit is not None:
+            out[d] = transform(hit)
+            continue
+        other = cache.other_selection(source, d, has_fields) if cache is not None else None
+        if other is not None:
+            others[d] = other
+        elif cache is not None and (cache.get_stale(source, d) or (None, {}))[1]:
+            continue
+        pending.append(d)
+
+    for group in _chunks(pending, BATCH_SIZE):
+        try:
+            records = fetch_group(group, get_json, base, ",".join(fields))
+        except Exception:
+            records = None
+        if records is None:
+            continue
+        found = {normalize_doi(r.get(doi_key)): r for r in records}
+        for d in group:
+            rec = found.get(d) or {}
+            if rec and cache is not None:
+                rec = with_fields_of(others.get(d), rec)
+                cache.set(source, d, rec)
+            out[d] = transform(rec) if rec else {}
+    return out
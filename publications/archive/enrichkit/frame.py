@@ -0,0 +1,88 @@
+"""
+Column-wise DataFrame helpers for the mac enrichers.
+
+The row loops no longer write cells one at a time with df.at; each row
+produces a plain {column: value} record, and merge_records() folds all of
+them into the frame in one step per column. The long-standing rule holds:
+a cell that already has a value is never overwritten (unless its column is
+listed in `overwrite`), and empty results never blank out a cell.
+
+"Empty" means NaN/None or a blank string (what pandas reads for an empty
+CSV cell), the same test as norm() in enrich_pubs_mac_ext.py.
+
+pandas is imported on first use, so importing the scripts stays cheap.
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, Hashable, Iterable, Sequence, Union
+
+from .records import RecordStore
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def cell_text(v: Any) -> str:
+    """One cell as a trimmed string; NaN/None become ""."""
+    if v is None or (isinstance(v, float) and v != v):
+        return ""
+    return str(v).strip()
+
+
+def text(s: pd.Series) -> pd.Series:
+    """Cells as trimmed strings; NaN/None become ""."""
+    return s.astype(object).where(s.notna(), "").astype(str).str.strip()
+
+
+def blank(s: pd.Series) -> pd.Series:
+    """True where a cell is NaN/None or only whitespace."""
+    return text(s).eq("")
+
+
+def _writable(df: pd.DataFrame, col: str) -> None:
+    # string results going into an all-NaN float column (typical for an empty CSV column)
+    if col not in df.columns:
+        df[col] = ""
+    if df[col].dtype != object:
+        df[col] = df[col].astype(object)
+
+
+def merge_records(df: pd.DataFrame, records: Union[Dict[Hashable, Dict[str, Any]], RecordStore],
+                  overwrite: Iterable[str] = ()) -> int:
+    """
+    Write {row index: {column: value}} (a dict or a RecordStore) into df, one
+    vectorized assignment per column. Only empty cells are filled unless the
+    column is in `overwrite`; empty values are skipped. Returns the number of
+    cells written.
+    """
+    if not records:
+        return 0
+    import pandas as pd
+
+    if isinstance(records, RecordStore):
+        # as stored, so a value does not depend on which other rows are in the batch
+        upd = records.to_frame(dtype=object)
+    else:
+        upd = pd.DataFrame.from_dict(records, orient="index")
+    overwrite = set(overwrite)
+    written = 0
+    for col in upd.columns:
+        new = upd[col]
+        mask = ~blank(new)
+        if col not in overwrite and col in df.columns:
+            mask &= blank(df.loc[new.index, col]).to_numpy()
+        if not mask.any():
+            continue
+        _writable(df, col)
+        df.loc[new.index[mask], col] = new[mask].to_numpy()
+        written += int(mask.sum())
+    return written
+
+
+def fill_where_blank(df: pd.DataFrame, rows: Sequence[Hashable], col: str, values: pd.Series) -> int:
+    """Set df[col] to `values` (indexed like rows) where the cell is empty and the value is not."""
+    _writable(df, col)
+    mask = blank(df.loc[rows, col]) & ~blank(values)
+    if mask.any():
+        df.loc[mask[mask].index, col] = values[mask]
+    return int(mask.sum())
@@ -0,0 +1,296 @@
+"""
+Shared OpenAI access for the enrichment scripts.
+
+One client per process (get_client) instead of a new OpenAI() per call, a
+retrying chat() wrapper for the free-text prompts, and enrich_fields(), which
+asks for several AI fields in ONE JSON-schema-constrained completion:
+
+    enrich_fields(title, abstract, ["plain_summary", "study_type", "keywords"])
+    -> {"plain_summary": "...", "study_type": "Experiment", "keywords": "kelp; urchins; ..."}
+
+Only the requested fields go into the schema, so a row that just needs
+keywords pays for a keywords-sized prompt and answer. Values come back as the
+same strings the separate prompts produced ("SDG 14; SDG 13", semicolon-joined
+keywords, "Why it matters: ..."), so the columns do not change format.
+
+Completions are cached in the shared response cache (configure_cache) under
+source "llm:<prompt name>", keyed by a hash of everything that shapes the
+answer: model, system and user prompt, temperature, max_tokens, response
+format and the prompt's version in PROMPT_VERSIONS. Rerunning with
+--overwrite_summaries / --overwrite_ai_tags after a prompt tweak only pays for
+the prompts whose text changed; bump a version (or pass --llm_invalidate) to
+force a prompt to be asked again with unchanged text.
+
+Calls can run concurrently: the scripts run them as pipeline stages sharing
+the "llm" group (enrichkit/pipeline.py), at most --llm_workers at once, and
+every completion first reserves room in BUDGET, separate requests-per-minute
+and tokens-per-minute buckets shared by all workers. The token reservation is an estimate (prompt chars / 4 plus
+max_tokens) and is settled against the usage the API reports. A 429 pauses
+both buckets for the server's Retry-After, so workers back off together.
+The client honours OPENAI_BASE_URL, which is how bench/openai_stub.py stands
+in for the real endpoint.
+
+Nothing here raises: without the openai package or OPENAI_API_KEY, or after
+the retries run out, the callers get "" / {}. The openai package (most of a
+second to import) is only imported by the first completion that misses the
+cache, so runs answered from the cache, and --help, never load it.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from enrichkit.cache import ResponseCache
+from enrichkit.metrics import METRICS
+from enrichkit.profiling import profiled
+from enrichkit.ratelimit import TokenBucket, parse_retry_after
+
+_HAS_OPENAI = importlib.util.find_spec("openai") is not None  # found, not imported
+
+DEFAULT_MODEL = "gpt-4o-mini"
+METRICS_HOST = "openai"  # label of completions in the run report
+
+RETRIES = 5
+
+# Defaults match OpenAI's tier-1 limits for gpt-4o-mini
+DEFAULT_RPM = 500
+DEFAULT_TPM = 200_000
+DEFAULT_WORKERS = 8
+
+# prompt name -> version; bumping one orphans that prompt's cached completions
+PROMPT_VERSIONS: Dict[str, int] = {
+    "summaries": 1,
+    "classify": 1,
+    "keywords": 1,
+    "fields": 1,
+}
+
+STUDY_TYPES = ["Review", "Experiment", "Meta-analysis", "Modeling", "Conceptual", "Other"]
+
+# field -> (JSON schema, max answer tokens)
+FIELD_SPECS: Dict[str, Any] = {
+    "plain_summary": ({"type": "string",
+                       "description": "2-3 short sentences at about Grade 7 reading level"}, 200),
+    "why_it_matters": ({"type": "string",
+                        "description": "one concise clause on why the work matters (no prefix)"}, 60),
+    "study_type": ({"type": "string", "enum": STUDY_TYPES}, 10),
+    "sdg_tags": ({"type": "array", "items": {"type": "string"},
+                  "description": "UN SDG codes like 'SDG 14'; empty list if none apply"}, 30),
+    "keywords": ({"type": "array", "items": {"type": "string"},
+                  "description": "5-8 concise, lowercased keyword phrases"}, 80),
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+CACHE: Optional[ResponseCache] = None
+BYPASS = False  # skip cache reads (fresh answers are still written back)
+
+
+# The scripts load .env after importing this module, so the environment is read on use.
+def model() -> str:
+    return os.getenv("OPENAI_MODEL", DEFAULT_MODEL)
+
+
+def available() -> bool:
+    return _HAS_OPENAI and bool(os.getenv("OPENAI_API_KEY"))
+
+
+def get_client():
+    """The process-wide OpenAI client (None when unavailable)."""
+    global _client
+    if not available():
+        return None
+    with _client_lock:
+        if _client is None:
+            try:
+                from openai import OpenAI
+            except Exception:
+                return None
+            # retries (and 429 handling) happen in _complete, where the budget sees them
+            _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        return _client
+
+
+# ---- request / token budgets ----
+def estimate_tokens(system: str, user: str, max_tokens: int) -> int:
+    """Rough upper bound for one call: ~4 characters per prompt token plus the answer cap."""
+    return (len(system) + len(user)) // 4 + 8 + max_tokens
+
+
+class LLMBudget:
+    """Requests-per-minute and tokens-per-minute buckets shared by every worker."""
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM):
+        self.requests = TokenBucket(rpm / 60.0, rpm / 60.0)
+        self.tokens = TokenBucket(tpm / 60.0, tpm / 60.0)
+        for b in (self.requests, self.tokens):
+            b.tokens = max(1.0, b.rate)  # the API grants a full second's worth up front
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "tokens": 0, "throttled": 0, "waited": 0.0}
+
+    def acquire(self, estimate: int) -> float:
+        """Block until one request of `estimate` tokens fits both budgets; returns seconds slept."""
+        wait_s = max(self.requests.reserve(), self.tokens.reserve(estimate))
+        if wait_s > 0:
+            time.sleep(wait_s)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["waited"] += wait_s
+        return wait_s
+
+    def settle(self, estimate: int, used: Optional[int]) -> None:
+        """Correct the token bucket once the real usage is known."""
+        used = estimate if used is None else used
+        self.tokens.refund(estimate - used)
+        with self._lock:
+            self.stats["tokens"] += used
+
+    def throttled(self, seconds: float) -> None:
+        self.requests.pause(seconds)
+        self.tokens.pause(seconds)
+        with self._lock:
+            self.stats["throttled"] += 1
+
+    def summary(self) -> str:
+        st = self.stats
+        if not st["requests"]:
+            return ""
+        return (f"LLM: {st['requests']} requests, {st['tokens']} tokens, "
+                f"{st['waited']:.1f}s waiting for budget"
+                + (f", {st['throttled']} throttled" if st["throttled"] else ""))
+
+
+BUDGET = LLMBudget()
+
+
+def configure_budget(rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM) -> None:
+    global BUDGET
+    BUDGET = LLMBudget(rpm, tpm)
+
+
+def configure_cache(cache: Optional[ResponseCache], bypass: bool = False,
+                    invalidate: Iterable[str] = ()) -> None:
+    """Use `cache` for completions; drop the cached answers of the named prompts ("all" for every one)."""
+    global CACHE, BYPASS
+    CACHE, BYPASS = cache, bypass
+    names = [n.strip() for n in invalidate if n.strip()]
+    if cache is None or not names:
+        return
+    for name in (PROMPT_VERSIONS if "all" in names else names):
+        cache.clear(f"llm:{name}")
+
+
+def completion_key(prompt: str, system: str, user: str, temperature: float,
+                   max_tokens: int, extra: Dict[str, Any]) -> str:
+    payload = [PROMPT_VERSIONS.get(prompt, 0), model(), system, user, temperature, max_tokens, extra]
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@profiled("llm")
+def chat(system: str, user: str, temperature: float = 0.2, max_tokens: int = 240,
+         prompt: str = "", **extra: Any) -> str:
+    """
+    One chat completion with modest retries; returns the stripped text or "".
+    Named prompts are served from / written to the completion cache.
+    """
+    key = completion_key(prompt, system, user, temperature, max_tokens, extra) \
+        if CACHE is not None and prompt else ""
+    if key and not BYPASS:
+        hit = CACHE.get(f"llm:{prompt}", key)
+        if isinstance(hit, str):
+            return hit
+    text = _complete(system, user, temperature, max_tokens, extra)
+    if key and text:
+        CACHE.set(f"llm:{prompt}", key, text)
+    return text
+
+
+def _complete(system: str, user: str, temperature: float, max_tokens: int,
+              extra: Dict[str, Any]) -> str:
+    client = get_client()
+    if client is None:
+        return ""
+    estimate = estimate_tokens(system, user, max_tokens)
+    for attempt in range(RETRIES):
+        BUDGET.acquire(estimate)
+        t0 = time.perf_counter()
+        try:
+            resp = client.chat.completions.create(
+                model=model(),
+                messages=[{"role": "system", "content": system},
+                          {"role": "user", "content": user}],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **extra,
+            )
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            METRICS.request(METRICS_HOST, status, time.perf_counter() - t0, None if status else type(e).__name__)
+            headers = getattr(getattr(e, "response", None), "headers", None) or {}
+            pause = parse_retry_after(headers.get("retry-after")) if status == 429 else None
+            BUDGET.settle(estimate, 0)
+            backoff = pause if pause is not None else min(2**attempt, 30)
+            METRICS.backoff(METRICS_HOST, backoff)
+            if status == 429:
+                # every worker waits out the pause in BUDGET.acquire()
+                BUDGET.throttled(backoff)
+            else:
+                time.sleep(backoff)
+            continue
+        METRICS.request(METRICS_HOST, 200, time.perf_counter() - t0)
+        usage = getattr(resp, "usage", None)
+        BUDGET.settle(estimate, getattr(usage, "total_tokens", None))
+        return (resp.choices[0].message.content or "").strip()
+    return ""
+
+
+def fields_schema(fields: Sequence[str]) -> Dict[str, Any]:
+    """Strict JSON schema object for just these fields."""
+    return {
+        "type": "object",
+        "properties": {f: FIELD_SPECS[f][0] for f in fields},
+        "required": list(fields),
+        "additionalProperties": False,
+    }
+
+
+def _as_text(field: str, value: Any) -> str:
+    if isinstance(value, list):
+        value = "; ".join(str(v).strip() for v in value if str(v).strip())
+    value = str(value or "").strip()
+    if field == "why_it_matters" and value and not value.lower().startswith("why it matters:"):
+        value = f"Why it matters: {value}"
+    return value
+
+
+def enrich_fields(title: str, abstract: str, fields: Sequence[str]) -> Dict[str, str]:
+    """Ask for every missing AI field of one publication in a single structured call."""
+    fields = [f for f in dict.fromkeys(fields) if f in FIELD_SPECS]
+    if not fields or not available():
+        return {}
+    creative = {"plain_summary", "why_it_matters", "keywords"} & set(fields)
+    system = (
+        "You enrich records of scientific papers USING ONLY the provided title and abstract; "
+        "no external facts. Fill every field of the JSON schema; use an empty string or "
+        "empty list when the text gives nothing to go on."
+    )
+    user = f"Title: {title or '[untitled]'}\n\nAbstract:\n{abstract or '[none]'}"
+    text = chat(
+        system, user,
+        temperature=0.2 if creative else 0.0,
+        max_tokens=20 + sum(FIELD_SPECS[f][1] for f in fields),
+        prompt="fields",
+        response_format={"type": "json_schema", "json_schema": {
+            "name": "publication_fields", "strict": True, "schema": fields_schema(fields)}},
+    )
+    try:
+        out = json.loads(text) if text else {}
+    except ValueError:
+        return {}
+    if not isinstance(out, dict):
+        return {}
+    return {f: _as_text(f, out.get(f)) for f in fields if f in out}
@@ -0,0 +1,230 @@
+"""
+Run metrics for the enrichment scripts, and the JSON run report.
+
+One process-wide registry (METRICS, like LIMITER) that the shared helpers
+feed as they work:
+
+  - every HTTP request, per host: status codes, latency histogram, and the
+    exceptions that the scripts' fetchers otherwise swallow
+        with METRICS.timed(url) as t:
+            r = session.get(url, ...)
+            t.status = r.status_code
+  - retries and backoff sleeps (tenacity's wait_retry_after, LLM retries)
+  - per-stage latency of the row pipeline
+  - row outcomes ("ok", "no_metadata", "error", ...) with a few sample rows
+
+Failed requests (non-2xx/304 statuses and exceptions) are kept as samples,
+and blank rows in the report list the failures whose URL mentions their DOI,
+which is usually the answer to "why did this row come back empty?".
+
+write_report() adds what the other components already count (rate limiter
+waits, cache hit rates, LLM tokens, pipeline busy time) and writes one JSON
+file, by default next to the script's output:
+
+    METRICS.write_report(args.out + ".report.json", script="enrich_pubs_mac",
+                         sections={"cache": CACHE.report(), "llm": llm.BUDGET.stats})
+"""
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import quote
+
+from .ratelimit import LIMITER, host_of
+
+# latency histogram bucket upper bounds, seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MAX_FAILURES = 200   # failed-request samples kept
+MAX_ROW_SAMPLES = 50  # sample rows kept per outcome
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.n += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (capped at the observed max)."""
+        if not self.n:
+            return 0.0
+        seen, target = 0, q * self.n
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target and c:
+                return round(min(BUCKETS[i] if i < len(BUCKETS) else self.max, self.max), 4)
+        return round(self.max, 4)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "count": self.n,
+            "total_s": round(self.total, 3),
+            "mean_s": round(self.total / self.n, 4) if self.n else 0.0,
+            "p50_s": self.quantile(0.50),
+            "p95_s": self.quantile(0.95),
+            "max_s": round(self.max, 4),
+            "buckets": {(f"le_{b}" if i < len(BUCKETS) else "inf"): c
+                        for i, (b, c) in enumerate(zip(BUCKETS + (None,), self.counts)) if c},
+        }
+
+
+class _Timed:
+    """Context manager from Metrics.timed(); set .status once the response is in."""
+
+    def __init__(self, metrics: "Metrics", url: str):
+        self.metrics = metrics
+        self.url = url
+        self.status: Optional[int] = None
+
+    def __enter__(self) -> "_Timed":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        error = exc_type.__name__ if exc_type is not None else None
+        self.metrics.request(self.url, self.status, time.perf_counter() - self.t0, error)
+        return False  # never swallows
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.hosts: Dict[str, Dict[str, Any]] = {}
+            self.latency: Dict[str, Histogram] = {}
+            self.stages: Dict[str, Histogram] = {}
+            self.rows: Dict[str, int] = {}
+            self.row_samples: Dict[str, List[Dict[str, Any]]] = {}
+            self.failures: Deque[Dict[str, Any]] = deque(maxlen=MAX_FAILURES)
+
+    def _host(self, host: str) -> Dict[str, Any]:
+        h = self.hosts.get(host)
+        if h is None:
+            h = self.hosts[host] = {"requests": 0, "status": {}, "errors": {}, "retries": 0, "backoff_s": 0.0}
+            self.latency[host] = Histogram()
+        return h
+
+    # ---- recording ----
+    def timed(self, url: str) -> _Timed:
+        return _Timed(self, url)
+
+    def request(self, url: str, status: Optional[int], seconds: float, error: Optional[str] = None) -> None:
+        """One finished request: its HTTP status, or the exception class that ended it."""
+        host = host_of(url)
+        with self._lock:
+            h = self._host(host)
+            h["requests"] += 1
+            self.latency[host].add(seconds)
+            if error is not None:
+                h["errors"][error] = h["errors"].get(error, 0) + 1
+            elif status is not None:
+                h["status"][str(status)] = h["status"].get(str(status), 0) + 1
+            if error is not None or (status is not None and not (200 <= status < 300 or status == 304)):
+                self.failures.append({"t": round(time.time(), 3), "host": host, "url": url,
+                                      "reason": error or f"http {status}"})
+
+    def backoff(self, url: str, seconds: float) -> None:
+        """A retry of a request to url's host, after sleeping `seconds`."""
+        with self._lock:
+            h = self._host(host_of(url))
+            h["retries"] += 1
+            h["backoff_s"] += seconds
+
+    def stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages.setdefault(name, Histogram()).add(seconds)
+
+    def row(self, outcome: str, key: Any = "", **detail: Any) -> None:
+        """Outcome of one row; `key` (DOI or title) is kept for the first few rows of each outcome."""
+        with self._lock:
+            self.rows[outcome] = self.rows.get(outcome, 0) + 1
+            samples = self.row_samples.setdefault(outcome, [])
+            if len(samples) < MAX_ROW_SAMPLES:
+                samples.append({"key": str(key or ""), **detail})
+
+    # ---- reporting ----
+    def _explain(self, key: str) -> List[str]:
+        """Failure reasons of requests whose URL mentions this row's DOI."""
+        if "/" not in key:
+            return []
+        needles = {key, quote(key), quote(key, safe="")}
+        return list(dict.fromkeys(f"{f['host']}: {f['reason']}" for f in self.failures
+                                  if any(n in f["url"] for n in needles)))
+
+    def report(self, sections: Optional[Dict[str, Any]] = None, **info: Any) -> Dict[str, Any]:
+        limiter = LIMITER.report()
+        with self._lock:
+            hosts = {}
+            for host, h in sorted(self.hosts.items()):
+                hosts[host] = {**h, "backoff_s": round(h["backoff_s"], 3),
+                               "latency": self.latency[host].report(),
+                               "limiter": limiter.get(host, {})}
+            rows = {"counts": dict(self.rows), "samples": {
+                outcome: samples[:5] if outcome == "ok" else
+                [{**s, "failures": self._explain(s["key"])} for s in samples]
+                for outcome, samples in self.row_samples.items()
+            }}
+            failures: Dict[str, Dict[str, int]] = {}
+            for f in self.failures:
+                by_reason = failures.setdefault(f["host"], {})
+                by_reason[f["reason"]] = by_reason.get(f["reason"], 0) + 1
+            out = {
+                **info,
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "wall_s": round(time.time() - self.started, 3),
+                "hosts": hosts,
+                "stages": {k: v.report() for k, v in self.stages.items()},
+                "rows": rows,
+                "recent_failures": {"by_host": failures, "samples": list(self.failures)[-20:]},
+                "sleep_s": {
+                    "rate_limiter": round(sum(r.get("seconds_waited", 0.0) for r in limiter.values()), 3),
+                    "backoff": round(sum(h["backoff_s"] for h in self.hosts.values()), 3),
+                },
+            }
+        out.update(sections or {})
+        return out
+
+    def write_report(self, path: str, sections: Optional[Dict[str, Any]] = None, **info: Any) -> Optional[str]:
+        """Write report() as JSON (atomically); returns the path, or None if it could not be written."""
+        if not path:
+            return None
+        try:
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.report(sections, **info), f, ensure_ascii=False, indent=2, default=str)
+            os.replace(tmp, path)
+            return path
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Failed to write run report {path}: {e}", file=sys.stderr)
+            return None
+
+    def summary(self) -> str:
+        with self._lock:
+            bad = {host: sum(h["errors"].values()) + sum(n for s, n in h["status"].items()
+                                                         if not (s.startswith("2") or s == "304"))
+                   for host, h in self.hosts.items()}
+            retries = sum(h["retries"] for h in self.hosts.values())
+            rows = dict(self.rows)
+        parts = [f"{h} {n}" for h, n in sorted(bad.items()) if n]
+        return ("Failed requests: " + (", ".join(parts) if parts else "none")
+                + (f"; {retries} retries" if retries else "")
+                + ("; rows: " + ", ".join(f"{k} {v}" for k, v in sorted(rows.items())) if rows else ""))
+
+
+# One registry per process, shared by every script and helper.
+METRICS = Metrics()
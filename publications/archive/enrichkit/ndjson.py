@@ -0,0 +1,150 @@
+"""
+Streaming output for the enrichment scripts.
+
+Finished rows are appended to an NDJSON file (one JSON object per line) and,
+optionally, to a CSV as they complete, flushed after every row so partial
+results can be read (or tailed) while a run is still going. Nothing is held
+in memory between rows.
+
+finalize_json() turns the NDJSON into the pretty JSON array the website
+reads, also streaming, one record at a time; the bytes match
+json.dump(records, f, ensure_ascii=False, indent=2). write_json_array() does
+the same for any iterable of records. From the shell:
+
+    python -m enrichkit.ndjson enriched_publications.ndjson enriched_publications.json
+
+orjson is used when installed (several times faster than json.dumps);
+otherwise the stdlib encoder produces the same output.
+"""
+import csv
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    import orjson
+    _HAS_ORJSON = True
+except Exception:
+    _HAS_ORJSON = False
+
+
+def dumps_line(rec: Dict[str, Any]) -> str:
+    """Compact one-line JSON for an NDJSON record."""
+    if _HAS_ORJSON:
+        return orjson.dumps(rec, default=str).decode("utf-8")
+    return json.dumps(rec, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def dumps_pretty(rec: Any) -> str:
+    """indent=2 JSON, identical for both encoders."""
+    if _HAS_ORJSON:
+        return orjson.dumps(rec, default=str, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(rec, ensure_ascii=False, indent=2, default=str)
+
+
+def join_list(v: Any) -> Any:
+    """CSV cell for a value: lists become '; '-joined strings."""
+    if isinstance(v, list):
+        return "; ".join([str(x) for x in v])
+    return v
+
+
+def _open_append(path: str, reset: bool):
+    d = os.path.dirname(os.path.abspath(path))
+    os.makedirs(d, exist_ok=True)
+    return open(path, "w" if reset else "a", encoding="utf-8", newline="")
+
+
+class NDJSONWriter:
+    def __init__(self, path: str, reset: bool = True):
+        self.path = path
+        self._fh = _open_append(path, reset)
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        self._fh.write(dumps_line(rec) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self) -> "NDJSONWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CSVStreamWriter:
+    """Row-at-a-time CSV with a fixed header (lists joined like the batch CSV)."""
+    def __init__(self, path: str, columns: Sequence[str], reset: bool = True):
+        self.path = path
+        fresh = reset or not os.path.exists(path) or os.path.getsize(path) == 0
+        self._fh = _open_append(path, reset)
+        self._w = csv.DictWriter(self._fh, fieldnames=list(columns), extrasaction="ignore")
+        if fresh:
+            self._w.writeheader()
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        self._w.writerow({k: join_list(v) for k, v in rec.items()})
+        self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self) -> "CSVStreamWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def iter_ndjson(path: str) -> Iterator[Dict[str, Any]]:
+    """Records of an NDJSON file; a torn last line (interrupted run) is skipped."""
+    loads = orjson.loads if _HAS_ORJSON else json.loads
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = loads(line)
+            except ValueError:
+                continue
+            if isinstance(rec, dict):
+                yield rec
+
+
+def write_json_array(records: Iterable[Dict[str, Any]], json_path: str) -> int:
+    """Write records as a pretty (indent=2) JSON array, atomically; returns the record count."""
+    tmp = json_path + ".tmp"
+    n = 0
+    with open(tmp, "w", encoding="utf-8") as out:
+        for rec in records:
+            out.write("[\n" if n == 0 else ",\n")
+            out.write("\n".join("  " + line for line in dumps_pretty(rec).split("\n")))
+            n += 1
+        out.write("\n]" if n else "[]")
+    os.replace(tmp, json_path)
+    return n
+
+
+def finalize_json(ndjson_path: str, json_path: str) -> int:
+    """Stream an NDJSON file into a pretty JSON array (written atomically); returns the record count."""
+    return write_json_array(iter_ndjson(ndjson_path), json_path)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        sys.exit("usage: python -m enrichkit.ndjson IN.ndjson OUT.json")
+    n = finalize_json(argv[0], argv[1])
+    print(f"Wrote {n} records → {argv[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+og:image / og:title scraping from publisher landing pages, head only.
+
+The old scraper downloaded the whole landing page and ran BeautifulSoup's
+html.parser over it to read two <meta> tags. Here the response is streamed
+and reading stops at </head> (or after MAX_HEAD_BYTES), so a multi-megabyte
+article page costs a few kilobytes; non-HTML responses (PDFs) are dropped
+after the headers. The <meta> tags are picked out of the head with a regex.
+
+Politeness:
+  - robots.txt is fetched once per domain (kept in memory, and in the shared
+    response cache when one is configured) and disallowed pages are skipped
+  - requests to the same domain are serialized with a per-domain lock, while
+    different publishers are scraped concurrently
+  - every request still goes through the shared per-host rate limiter
+
+Results are cached per URL ("ogimage" in the response cache), so re-runs do
+not touch publisher sites again for pages already seen.
+
+    scraper = OGScraper(cache)
+    image_url, alt_text = scraper.fetch(url)
+"""
+import html
+import re
+import threading
+from typing import Dict, Optional, Tuple
+from urllib import robotparser
+from urllib.parse import urlparse
+
+from .cache import ResponseCache
+from .metrics import METRICS
+from .ratelimit import LIMITER
+
+USER_AGENT = "Mozilla/5.0 (compatible; ORL-Bot/1.0)"
+ROBOTS_AGENT = "ORL-Bot"
+MAX_HEAD_BYTES = 256 * 1024  # give up on pages whose <head> is larger than this
+CHUNK = 16 * 1024
+TIMEOUT = 25
+
+_HEAD_END = re.compile(rb"</head\s*>|<body[\s>]", re.I)
+_META = re.compile(r"<meta\b([^>]*)>", re.I | re.S)
+_ATTR = re.compile(r"""([a-zA-Z_:][-\w:.]*)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+))""", re.S)
+_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([-\w.:]+)""", re.I)
+
+
+def meta_properties(head: str) -> Dict[str, str]:
+    """{property: content} for the <meta property=...> tags of an HTML head; the first tag wins."""
+    out: Dict[str, str] = {}
+    for tag in _META.finditer(head):
+        attrs = {m.group(1).lower(): html.unescape(m.group(2) if m.group(2) is not None else
+                                                  m.group(3) if m.group(3) is not None else m.group(4))
+                 for m in _ATTR.finditer(tag.group(1))}
+        prop = attrs.get("property")
+        if prop and prop not in out and "content" in attrs:
+            out[prop] = attrs["content"]
+    return out
+
+
+def _decode(raw: bytes, content_type: str) -> str:
+    m = re.search(r"charset=([-\w.:]+)", content_type or "", re.I) or _CHARSET.search(raw)
+    enc = m.group(1) if m else "utf-8"
+    enc = enc.decode("ascii", "ignore") if isinstance(enc, bytes) else enc
+    try:
+        return raw.decode(enc, errors="replace")
+    except LookupError:
+        return raw.decode("utf-8", errors="replace")
+
+
+class OGScraper:
+    def __init__(self, cache: Optional[ResponseCache] = None, user_agent: str = USER_AGENT,
+                 max_head_bytes: int = MAX_HEAD_BYTES, respect_robots: bool = True):
+        self.cache = cache
+        self.user_agent = user_agent
+        self.max_head_bytes = max_head_bytes
+        self.respect_robots = respect_robots
+        import requests  # deferred: importing the enrichers (or --help) should not pay for it
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        self._lock = threading.Lock()
+        self._domain_locks: Dict[str, threading.Lock] = {}
+        self._robots: Dict[str, Optional[robotparser.RobotFileParser]] = {}
+        self._seen: Dict[str, Tuple[str, str]] = {}
+        self.stats = {"pages": 0, "bytes": 0, "cached": 0, "robots_blocked": 0, "not_html": 0}
+
+    def _domain_lock(self, domain: str) -> threading.Lock:
+        with self._lock:
+            return self._domain_locks.setdefault(domain, threading.Lock())
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    # ---- robots.txt ----
+    def _robots_txt(self, root: str) -> Optional[str]:
+        """robots.txt body; "" = allow everything, None = disallow everything (401/403)."""
+        if self.cache is not None:
+            hit = self.cache.get("robots", root)
+            if hit is not None:
+                return hit.get("body")
+        body: Optional[str] = ""
+        try:
+            LIMITER.acquire(root)
+            with METRICS.timed(root + "/robots.txt") as t:
+                r = self.session.get(root + "/robots.txt", timeout=TIMEOUT)
+                t.status = r.status_code
+            LIMITER.observe(root, r.status_code, r.headers)
+            if r.status_code in (401, 403):
+                body = None
+            elif r.status_code == 200:
+                body = r.text
+        except Exception:
+            return ""  # unreachable: allow, but do not remember it
+        if self.cache is not None:
+            self.cache.set("robots", root, {"body": body})
+        return body
+
+    def allowed(self, url: str) -> bool:
+        """robots.txt check; call with the domain lock held."""
+        if not self.respect_robots:
+            return True
+        p = urlparse(url)
+        root = f"{p.scheme}://{p.netloc}"
+        if root not in self._robots:
+            body = self._robots_txt(root)
+            rp = robotparser.RobotFileParser()
+            if body is None:
+                rp.disallow_all = True
+            else:
+                rp.parse(body.splitlines())
+            self._robots[root] = rp
+        return self._robots[root].can_fetch(ROBOTS_AGENT, url)
+
+    # ---- pages ----
+    def read_head(self, url: str) -> Optional[str]:
+        """The page up to </head>, decoded; None for errors and non-HTML responses."""
+        LIMITER.acquire(url)
+        with METRICS.timed(url) as t:
+            r = self.session.get(url, timeout=TIMEOUT, stream=True)
+            t.status = r.status_code
+        try:
+            LIMITER.observe(url, r.status_code, r.headers)
+            if r.status_code != 200:
+                return None
+            ctype = r.headers.get("Content-Type") or ""
+            if ctype and "html" not in ctype.lower():
+                self._count("not_html")
+                return None
+            buf = bytearray()
+            for chunk in r.iter_content(CHUNK):
+                scan_from = max(0, len(buf) - 8)
+                buf += chunk
+                if _HEAD_END.search(buf, scan_from) or len(buf) >= self.max_head_bytes:
+                    break
+            self._count("pages")
+            self._count("bytes", len(buf))
+            return _decode(bytes(buf), ctype)
+        finally:
+            r.close()
+
+    def _scrape(self, url: str) -> Optional[Tuple[str, str]]:
+        domain = urlparse(url).netloc.lower()
+        with self._domain_lock(domain):
+            if url in self._seen:  # another row scraped it while we waited
+                return self._seen[url]
+            if not self.allowed(url):
+                self._count("robots_blocked")
+                found = ("", "")
+            else:
+                head = self.read_head(url)
+                if head is None:
+                    return None
+                props = meta_properties(head)
+                found = ((props.get("og:image") or "").strip(), (props.get("og:title") or "").strip())
+            self._seen[url] = found
+            return found
+
+    def fetch(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        """(og:image, og:title) for a landing page; (None, None) when unavailable."""
+        if not url or not isinstance(url, str):
+            return (None, None)
+        if urlparse(url).path.lower().endswith(".pdf"):
+            return (None, None)
+        found = self._seen.get(url)
+        if found is None and self.cache is not None:
+            hit = self.cache.get("ogimage", url)
+            if hit is not None:
+                found = (hit.get("image", ""), hit.get("alt", ""))
+                self._count("cached")
+        if found is None:
+            try:
+                found = self._scrape(url)
+            except Exception:
+                found = None
+            if found is None:
+                return (None, None)  # network error: try again next run
+            if self.cache is not None:
+                self.cache.set("ogimage", url, {"image": found[0], "alt": found[1]})
+        self._seen[url] = found
+        return (found[0] or None, found[1] or None)
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"og:image: {s['pages']} pages, {s['bytes'] / 1024:.0f} KiB read, {s['cached']} cached, "
+                f"{s['robots_blocked']} blocked by robots.txt, {s['not_html']} not HTML")
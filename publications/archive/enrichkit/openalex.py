@@ -0,0 +1,114 @@
+"""
+select= projections for OpenAlex work requests, derived from the code that reads the works.
+
+A full OpenAlex work is tens of kilobytes of JSON, most of it referenced_works,
+related_works, counts_by_year, concepts and every author's affiliations, while
+the scripts' mappers read about a dozen top-level keys. With `select=a,b,c`
+OpenAlex returns only those top-level fields (each one whole, null when
+empty), on single works, filters and searches alike:
+
+    OPENALEX_SELECT = projection(openalex_fields, also=("id",))
+    get_json(url, params=select_params(OPENALEX_SELECT))
+
+projection() parses the source of each reader and collects the constant keys
+it reads from the work parameter: work.get("key"), work["key"], "key" in work.
+Truth tests (`if work`, `work and ...`) are fine; any other use of the
+parameter (passing it to a helper, iterating it, reassigning it) raises
+ValueError, because the keys behind it cannot be seen. So a mapper that reads
+a new field gets it requested automatically, and one that starts reading
+fields some other way fails on the first run instead of silently getting
+blanks. RETIRED fields, which OpenAlex no longer serves and would reject in a
+select, are left out; readers see them as missing, as they already did.
+
+Cache. Works are cached as they were fetched, and the scripts share the
+cache, so a cached work may be a projection made for another script (or a
+full record from before projections). covers() tells whether a record has
+every field a reader needs; the cache helpers (cache.cached_conditional,
+doibatch.resolve_dois, titles.TitleResolver) refetch a record that does not,
+and keep the fields it already had, so two scripts with different projections
+do not keep replacing each other's entries.
+"""
+import ast
+import inspect
+import textwrap
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+# Fields OpenAlex has dropped from the Work object (replaced by primary_location / locations)
+RETIRED = frozenset({"host_venue", "alternate_host_venues"})
+
+
+def _const(node: Optional[ast.AST]) -> Optional[str]:
+    return node.value if isinstance(node, ast.Constant) and isinstance(node.value, str) else None
+
+
+@lru_cache(maxsize=None)
+def fields_read(fn: Callable[..., Any], param: Optional[str] = None) -> Tuple[str, ...]:
+    """Top-level keys fn reads from its argument `param` (default: the first one), sorted."""
+    fn = inspect.unwrap(fn)
+    lines, first = inspect.getsourcelines(fn)
+    tree = ast.parse(textwrap.dedent("".join(lines)))
+    func = tree.body[0]
+    if not isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        raise ValueError(f"{fn!r} is not a plain function")
+    names = [a.arg for a in func.args.posonlyargs + func.args.args + func.args.kwonlyargs]
+    param = param or names[0]
+    if param not in names:
+        raise ValueError(f"{fn.__qualname__} has no parameter {param!r}")
+
+    def is_param(node: Optional[ast.AST]) -> bool:
+        return isinstance(node, ast.Name) and node.id == param
+
+    keys: Set[str] = set()
+    explained: Set[int] = set()  # ids of the Name nodes accounted for
+    for node in ast.walk(func):
+        key, name = None, None
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "get"
+                and is_param(node.func.value) and node.args):
+            key, name = _const(node.args[0]), node.func.value
+        elif isinstance(node, ast.Subscript) and is_param(node.value):
+            key, name = _const(node.slice), node.value
+        elif (isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], (ast.In, ast.NotIn))
+              and is_param(node.comparators[0])):
+            key, name = _const(node.left), node.comparators[0]
+        else:
+            # truth tests
+            tests = (node.values if isinstance(node, ast.BoolOp)
+                     else [node.operand] if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not)
+                     else [node.test] if isinstance(node, (ast.If, ast.IfExp, ast.While)) else [])
+            explained.update(id(t) for t in tests if is_param(t))
+            continue
+        if key is None:
+            raise ValueError(f"{fn.__qualname__} line {first + node.lineno - 1}: "
+                             f"reads {param!r} with a key that is not a constant")
+        keys.add(key)
+        explained.add(id(name))
+    for node in ast.walk(func):
+        if isinstance(node, ast.Name) and node.id == param and id(node) not in explained:
+            raise ValueError(f"{fn.__qualname__} line {first + node.lineno - 1}: {param!r} is used other "
+                             f"than by key, so the fields it needs cannot be derived")
+    return tuple(sorted(keys))
+
+
+def projection(*readers: Any, also: Iterable[str] = ()) -> Tuple[str, ...]:
+    """
+    Union of the fields the readers read, plus `also`, without RETIRED ones.
+    A reader is a function (its first parameter is the work) or (function, parameter name).
+    """
+    fields = set(also)
+    for r in readers:
+        fn, param = r if isinstance(r, tuple) else (r, None)
+        fields.update(fields_read(fn, param))
+    return tuple(sorted(fields - RETIRED))
+
+
+def select_params(fields: Iterable[str]) -> Dict[str, str]:
+    """{"select": "a,b,c"} to merge into request params; {} (everything) when fields is empty."""
+    fields = list(fields)
+    return {"select": ",".join(fields)} if fields else {}
+
+
+def covers(fields: Iterable[str]) -> Callable[[Any], bool]:
+    """Predicate: does a cached work (dict) carry every one of fields? Empty results always do."""
+    fields = tuple(fields)
+    return lambda rec: not isinstance(rec, dict) or not rec or all(f in rec for f in fields)
@@ -0,0 +1,194 @@
+"""
+Stage-DAG executor for the per-row enrichment steps.
+
+Each step is a Stage that declares the context keys it reads (needs) and
+writes (gives). Keys no stage gives are row inputs. Wiring is implied: a
+stage waits only for the stages that give what it needs, so independent
+stages of a row run at the same time, and with several rows in flight the
+stages of different rows overlap as well (metadata for row N+1 is fetched
+while the LLM is still summarizing row N).
+
+    pipe = Pipeline([
+        Stage("crossref", lambda c: {"cr": crossref_lookup(c["doi"])}, needs=("doi",), gives=("cr",), limit=2),
+        Stage("openalex", lambda c: {"oa": openalex_lookup(c["doi"])}, needs=("doi",), gives=("oa",), limit=2),
+        Stage("build", lambda c: {"out": build(c["cr"], c["oa"])}, needs=("cr", "oa"), gives=("out",), inline=True),
+    ])
+    async for i, ctx, err, secs in pipe.run(({"doi": d} for d in dois), window=8):
+        ...
+
+A stage function gets a dict holding just its `needs` and returns a dict with
+(a subset of) its `gives`. It runs in a worker thread, so blocking I/O is
+fine; `limit` caps how many rows can be inside that stage at once, or inside
+all stages of the same `group` together. Cheap CPU-only stages can set
+inline=True and run on the event loop thread.
+If any stage of a row raises, the row is reported with that error and its
+remaining stages are cancelled; other rows carry on.
+
+run_sync() drives the same loop from plain synchronous scripts and calls
+on_result(i, ctx, err, secs) on the calling thread for every finished row.
+Per-stage latencies also go to the run metrics (enrichkit/metrics.py).
+"""
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (Any, AsyncIterator, Callable, Dict, Iterable, List, Optional,
+                    Sequence, Tuple)
+
+from .metrics import METRICS
+
+Context = Dict[str, Any]
+RowResult = Tuple[int, Context, Optional[BaseException], float]
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Context], Optional[Context]]
+    needs: Tuple[str, ...] = ()
+    gives: Tuple[str, ...] = ()
+    limit: int = 2
+    inline: bool = False
+    group: str = ""  # stages with the same group share one limit (e.g. every LLM call)
+
+    @property
+    def slot(self) -> str:
+        return self.group or self.name
+
+
+class Pipeline:
+    def __init__(self, stages: Sequence[Stage]):
+        names = [s.name for s in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"duplicate stage names: {names}")
+        givers: Dict[str, str] = {}
+        for s in stages:
+            for k in s.gives:
+                if k in givers:
+                    raise ValueError(f"{k!r} is given by both {givers[k]!r} and {s.name!r}")
+                givers[k] = s.name
+        self.deps: Dict[str, List[str]] = {
+            s.name: list(dict.fromkeys(givers[k] for k in s.needs if k in givers)) for s in stages
+        }
+        self.stages = self._toposort(stages)
+        self.inputs = sorted({k for s in stages for k in s.needs if k not in givers})
+        self.stats: Dict[str, Dict[str, float]] = {s.name: {"calls": 0, "busy": 0.0} for s in stages}
+
+    def _toposort(self, stages: Sequence[Stage]) -> List[Stage]:
+        by_name = {s.name: s for s in stages}
+        order: List[Stage] = []
+        state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def visit(name: str) -> None:
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"stage cycle through {name!r}")
+            state[name] = 1
+            for d in self.deps[name]:
+                visit(d)
+            state[name] = 2
+            order.append(by_name[name])
+
+        for s in stages:
+            visit(s.name)
+        return order
+
+    # ---- one row ----
+    async def _stage(self, st: Stage, ctx: Context, deps: List["asyncio.Future"],
+                     sem: asyncio.Semaphore, executor: ThreadPoolExecutor) -> None:
+        if deps:
+            await asyncio.gather(*deps)
+        inputs = {k: ctx.get(k) for k in st.needs}
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                if st.inline:
+                    out = st.fn(inputs)
+                else:
+                    out = await asyncio.get_running_loop().run_in_executor(executor, st.fn, inputs)
+            finally:
+                secs = time.perf_counter() - t0
+                stat = self.stats[st.name]
+                stat["calls"] += 1
+                stat["busy"] += secs
+                METRICS.stage(st.name, secs)
+        for k, v in (out or {}).items():
+            if k in st.gives:
+                ctx[k] = v
+
+    async def _row(self, ctx: Context, sems: Dict[str, asyncio.Semaphore],
+                   executor: ThreadPoolExecutor) -> Tuple[Context, Optional[BaseException], float]:
+        t0 = time.perf_counter()
+        tasks: Dict[str, asyncio.Future] = {}
+        for st in self.stages:
+            deps = [tasks[d] for d in self.deps[st.name]]
+            tasks[st.name] = asyncio.ensure_future(self._stage(st, ctx, deps, sems[st.slot], executor))
+        try:
+            await asyncio.gather(*tasks.values())
+            return ctx, None, time.perf_counter() - t0
+        except Exception as e:
+            for t in tasks.values():
+                t.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            return ctx, e, time.perf_counter() - t0
+
+    # ---- many rows ----
+    async def run(self, items: Iterable[Context], window: int = 8,
+                  ordered: bool = True) -> AsyncIterator[RowResult]:
+        """
+        Push every item (its initial context) through the stages with at most
+        `window` rows in flight; yield (row_number, ctx, error, seconds), in input
+        order when `ordered`, else as rows finish. Row numbers start at 1.
+        """
+        window = max(1, int(window))
+        limits: Dict[str, int] = {}
+        for s in self.stages:
+            limits[s.slot] = max(limits.get(s.slot, 1), s.limit)
+        sems = {slot: asyncio.Semaphore(n) for slot, n in limits.items()}
+        threads = sum(limits[slot] for slot in {s.slot for s in self.stages if not s.inline}) or 1
+        executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="stage")
+        inflight: deque = deque()
+        try:
+            for i, item in enumerate(items, 1):
+                inflight.append((i, asyncio.ensure_future(self._row(dict(item), sems, executor))))
+                while len(inflight) >= window:
+                    for res in await self._next(inflight, ordered):
+                        yield res
+            while inflight:
+                for res in await self._next(inflight, ordered):
+                    yield res
+        finally:
+            for _, task in inflight:
+                task.cancel()
+            await asyncio.gather(*[t for _, t in inflight], return_exceptions=True)
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    async def _next(inflight: deque, ordered: bool) -> List[RowResult]:
+        if ordered:
+            i, task = inflight.popleft()
+            ctx, err, secs = await task
+            return [(i, ctx, err, secs)]
+        await asyncio.wait([t for _, t in inflight], return_when=asyncio.FIRST_COMPLETED)
+        out: List[RowResult] = []
+        for entry in [e for e in inflight if e[1].done()]:
+            inflight.remove(entry)
+            ctx, err, secs = entry[1].result()
+            out.append((entry[0], ctx, err, secs))
+        return out
+
+    def run_sync(self, items: Iterable[Context], on_result: Callable[[int, Context, Optional[BaseException], float], None],
+                 window: int = 8, ordered: bool = False) -> None:
+        """Blocking run for synchronous scripts; on_result runs on this thread."""
+        async def _drive() -> None:
+            async for i, ctx, err, secs in self.run(items, window=window, ordered=ordered):
+                on_result(i, ctx, err, secs)
+        asyncio.run(_drive())
+
+    def summary(self) -> str:
+        lines = [f"  {s.name}: {int(self.stats[s.name]['calls'])} calls, {self.stats[s.name]['busy']:.1f}s busy"
+                 + ("" if s.inline else f" (limit {s.limit}{', ' + s.group if s.group else ''})")
+                 for s in self.stages if self.stats[s.name]["calls"]]
+        return "Pipeline stages:\n" + "\n".join(lines) if lines else ""
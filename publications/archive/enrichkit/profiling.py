@@ -0,0 +1,229 @@
+"""
+Profiling mode (--profile) for the enrichment scripts.
+
+PROFILER.start() turns on, for the rest of the run:
+
+  - cProfile in every thread: the main thread directly, pipeline / pool
+    worker threads through threading.setprofile (each new thread gets its own
+    profile, merged at the end)
+  - a stack sampler that looks at all threads every SAMPLE_INTERVAL seconds
+    and counts the stacks it sees; this is wall time, so threads blocked on
+    the network show up as well as busy ones
+  - tracemalloc, for the peak and the largest allocation sites
+
+and the named phases the scripts mark get wall and CPU time per phase:
+
+    with PROFILER.phase("load", exclusive=True):   # exclusive: also peak memory
+        df = pd.read_csv(path)
+
+    @profiled("mapping")
+    def crossref_fields(msg): ...
+
+Phases nest (json parsing inside fetch, tagging inside mapping) and are
+counted in both. Wall minus CPU of a phase is time spent waiting: on the
+network, the rate limiter or a lock. When profiling is off, phase() and
+@profiled cost one attribute check.
+
+PROFILER.write(prefix) leaves three files:
+  <prefix>.txt     phases table, top functions by cumulative time, top allocation sites
+  <prefix>.folded  collapsed stacks (flamegraph.pl, speedscope, inferno)
+  <prefix>.pstats  the merged cProfile data (python -m pstats, snakeviz)
+"""
+import cProfile
+import functools
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+MAX_STACK = 64
+
+
+class _NoPhase:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+class _Phase:
+    def __init__(self, profiler: "Profiler", name: str, exclusive: bool):
+        self.profiler = profiler
+        self.name = name
+        self.exclusive = exclusive
+
+    def __enter__(self) -> None:
+        if self.exclusive:
+            tracemalloc.reset_peak()
+            self.mem0 = tracemalloc.get_traced_memory()[0]
+        self.cpu0 = time.thread_time()
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> bool:
+        wall = time.perf_counter() - self.t0
+        cpu = time.thread_time() - self.cpu0
+        peak = tracemalloc.get_traced_memory()[1] - self.mem0 if self.exclusive else None
+        self.profiler._record(self.name, wall, cpu, peak)
+        return False
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self._profiles: List[cProfile.Profile] = []
+        self._stacks: Dict[str, int] = {}
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.started = 0.0
+        self.stopped = 0.0
+
+    # ---- phases ----
+    def phase(self, name: str, exclusive: bool = False):
+        """Time a block as `name`; exclusive=True (nothing else running) also records its peak memory."""
+        return _Phase(self, name, exclusive) if self.enabled else _NO_PHASE
+
+    def _record(self, name: str, wall: float, cpu: float, peak: Optional[int]) -> None:
+        with self._lock:
+            p = self.phases.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "peak": 0})
+            p["calls"] += 1
+            p["wall"] += wall
+            p["cpu"] += cpu
+            if peak is not None:
+                p["peak"] = max(p["peak"], peak)
+
+    # ---- start / stop ----
+    def start(self) -> None:
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started = time.perf_counter()
+        tracemalloc.start()  # one frame per allocation: enough for per-line stats, far cheaper
+        self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        main = cProfile.Profile()
+        self._profiles.append(main)
+        threading.setprofile(self._thread_hook)
+        main.enable()
+
+    def _thread_hook(self, frame, event, arg) -> None:
+        # first profiling event of a new thread: give the thread its own cProfile
+        # (enable() replaces this hook for the thread)
+        prof = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(prof)
+        prof.enable()
+
+    def stop(self) -> None:
+        if not self.enabled:
+            return
+        self._profiles[0].disable()
+        threading.setprofile(None)
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.stopped = time.perf_counter()
+        self.enabled = False
+
+    # ---- sampling ----
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            names = {t.ident: re.sub(r"[_-]\d+$", "", t.name) for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join([names.get(ident, "thread")] + stack[::-1])
+                with self._lock:
+                    self._stacks[key] = self._stacks.get(key, 0) + 1
+
+    # ---- output ----
+    def stats(self) -> Optional[pstats.Stats]:
+        profiles = [p for p in self._profiles if p.getstats()]
+        if not profiles:
+            return None
+        st = pstats.Stats(profiles[0], stream=io.StringIO())
+        for p in profiles[1:]:
+            st.add(p)
+        return st
+
+    def summary_text(self, stats: Optional[pstats.Stats], snapshot: Optional[tracemalloc.Snapshot],
+                     peak: int, title: str = "") -> str:
+        out = io.StringIO()
+        wall = (self.stopped or time.perf_counter()) - self.started
+        out.write(f"Profile{' of ' + title if title else ''}: {wall:.2f}s wall, "
+                  f"{len(self._profiles)} profiled thread(s), peak traced memory {peak / 2**20:.1f} MB\n\n")
+        out.write("Phases (nested phases are also counted in their parent; wait = wall - CPU):\n")
+        out.write(f"  {'phase':<12}{'calls':>8}{'wall s':>10}{'CPU s':>10}{'wait s':>10}{'peak MB':>10}\n")
+        for name, p in sorted(self.phases.items(), key=lambda kv: -kv[1]["wall"]):
+            out.write(f"  {name:<12}{int(p['calls']):>8}{p['wall']:>10.2f}{p['cpu']:>10.2f}"
+                      f"{max(0.0, p['wall'] - p['cpu']):>10.2f}"
+                      f"{(p['peak'] / 2**20 if p['peak'] else 0):>10.1f}\n")
+        if stats is not None:
+            out.write(f"\nTop {TOP_FUNCTIONS} functions by cumulative time (all threads):\n")
+            stats.stream = out
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        if snapshot is not None:
+            out.write(f"\nTop {TOP_ALLOCATIONS} allocation sites still held at the end of the run:\n")
+            for s in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                frame = s.traceback[0]
+                out.write(f"  {s.size / 2**20:8.2f} MB {s.count:>9} blocks  {frame.filename}:{frame.lineno}\n")
+        return out.getvalue()
+
+    def write(self, prefix: str, title: str = "") -> List[str]:
+        """Stop profiling and write <prefix>.txt / .folded / .pstats; returns the paths written."""
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+        self.stop()
+        tracemalloc.stop()
+        stats = self.stats()
+        written = []
+        try:
+            if stats is not None:
+                stats.dump_stats(prefix + ".pstats")
+                written.append(prefix + ".pstats")
+            with open(prefix + ".folded", "w", encoding="utf-8") as f:
+                for stack, n in sorted(self._stacks.items()):
+                    f.write(f"{stack} {n}\n")
+            written.append(prefix + ".folded")
+            with open(prefix + ".txt", "w", encoding="utf-8") as f:
+                f.write(self.summary_text(stats, snapshot, peak, title))
+            written.append(prefix + ".txt")
+        except OSError as e:
+            print(f"Failed to write profile {prefix}: {e}", file=sys.stderr)
+        return written
+
+
+def profiled(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator: count every call of the function as phase `name` while profiling."""
+    def wrap(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def inner(*args: Any, **kwargs: Any) -> Any:
+            if not PROFILER.enabled:
+                return fn(*args, **kwargs)
+            with PROFILER.phase(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+# One profiler per process; off unless a script's --profile starts it.
+PROFILER = Profiler()
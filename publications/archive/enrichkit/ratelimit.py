@@ -0,0 +1,235 @@
+"""
+Adaptive per-host rate limiting shared by the enrichment scripts.
+
+Each host gets a token bucket. Callers reserve a token before a request
+(acquire() sleeps until it is due) and report the response afterwards
+(observe()), which adapts the bucket:
+
+  - 429 / 503: pause the host for Retry-After (or a short backoff) and halve the rate
+  - X-Rate-Limit-Limit / X-Rate-Limit-Interval (Crossref): move the ceiling to
+    80% of the advertised budget
+  - X-RateLimit-Remaining: 0 with X-RateLimit-Reset: pause until the reset
+  - success: creep back up towards the ceiling (additive increase)
+
+report() gives the effective requests/second per host for the run summary.
+"""
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional, Tuple
+from urllib.parse import urlparse
+
+# host -> (starting rate, ceiling) in requests per second
+DEFAULT_RATES: Dict[str, Tuple[float, float]] = {
+    "api.crossref.org": (5.0, 15.0),
+    "api.openalex.org": (5.0, 10.0),   # OpenAlex allows 10 req/s
+    "api.unpaywall.org": (3.0, 8.0),
+}
+# publisher landing pages and anything else
+OTHER_RATE: Tuple[float, float] = (1.0, 2.0)
+
+MIN_RATE = 0.1
+DEFAULT_BACKOFF = 5.0  # seconds to pause on 429/503 without Retry-After
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).netloc or url).lower()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds; accepts delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if re.fullmatch(r"\d+(\.\d+)?", value):
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _parse_interval(value: str) -> Optional[float]:
+    # Crossref sends e.g. "1s"
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*(ms|s|m)?\s*", value or "")
+    if not m:
+        return None
+    n = float(m.group(1))
+    return n / 1000 if m.group(2) == "ms" else n * 60 if m.group(2) == "m" else n
+
+
+def _header(headers: Mapping[str, Any], name: str) -> Optional[str]:
+    if not headers:
+        return None
+    v = headers.get(name)
+    if v is None:  # plain dicts are case-sensitive
+        lname = name.lower()
+        for k, val in headers.items():
+            if k.lower() == lname:
+                return val
+    return v
+
+
+class TokenBucket:
+    def __init__(self, rate: float, ceiling: float):
+        self.rate = rate
+        self.ceiling = ceiling
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self, n: float = 1.0) -> float:
+        """Take n tokens; return how long the caller must wait before using them."""
+        with self.lock:
+            now = time.monotonic()
+            burst = max(1.0, self.rate)
+            self.tokens = min(burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def refund(self, n: float) -> None:
+        """Give back n tokens (negative n takes more) after the real cost is known."""
+        with self.lock:
+            self.tokens = min(max(1.0, self.rate), self.tokens + n)
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def set_rate(self, rate: float) -> None:
+        with self.lock:
+            self.rate = max(MIN_RATE, min(rate, self.ceiling))
+
+
+class RateLimiter:
+    def __init__(self, rates: Optional[Dict[str, Tuple[float, float]]] = None, scale: float = 1.0):
+        self.rates = dict(DEFAULT_RATES)
+        if rates:
+            self.rates.update(rates)
+        self.scale = scale  # <1.0 when several processes share one budget
+        self.fast = False
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            b = self._buckets.get(host)
+            if b is None:
+                start, ceiling = self.rates.get(host, OTHER_RATE)
+                b = TokenBucket((ceiling if self.fast else start) * self.scale, ceiling * self.scale)
+                self._buckets[host] = b
+                self._stats[host] = {"requests": 0, "throttled": 0, "waited": 0.0,
+                                     "first": 0.0, "last": 0.0}
+            return b
+
+    def start_at_ceiling(self) -> None:
+        """Skip the ramp-up: every host starts at its ceiling (the old --fast behaviour)."""
+        with self._lock:
+            self.fast = True
+            buckets = list(self._buckets.values())
+        for b in buckets:
+            b.set_rate(b.ceiling)
+
+    # ---- before / after each request ----
+    def delay(self, url: str) -> float:
+        """Reserve a slot for url and return the wait (for async callers)."""
+        host = host_of(url)
+        wait = self.bucket(host).reserve()
+        with self._lock:
+            st = self._stats[host]
+            now = time.time() + wait
+            st["requests"] += 1
+            st["waited"] += wait
+            st["first"] = st["first"] or now
+            st["last"] = now
+        return wait
+
+    def acquire(self, url: str) -> float:
+        """Block until a request to url's host is allowed; returns seconds slept."""
+        wait = self.delay(url)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def observe(self, url: str, status: int, headers: Optional[Mapping[str, Any]] = None) -> Optional[float]:
+        """Adapt to a response; returns the Retry-After pause applied, if any."""
+        host = host_of(url)
+        b = self.bucket(host)
+
+        # Advertised per-interval budget (Crossref: "X-Rate-Limit-Limit: 50", "...-Interval: 1s").
+        # A bare X-RateLimit-Limit is often a daily quota, so only Remaining/Reset are used for it.
+        limit = _header(headers, "X-Rate-Limit-Limit")
+        secs = _parse_interval(_header(headers, "X-Rate-Limit-Interval") or "")
+        if limit and secs and re.fullmatch(r"\s*\d+(\.\d+)?\s*", str(limit)):
+            b.ceiling = max(MIN_RATE, float(limit) / secs * 0.8 * self.scale)  # keep some headroom
+            if b.rate > b.ceiling:
+                b.set_rate(b.ceiling)
+        remaining = _header(headers, "X-RateLimit-Remaining")
+        if remaining is not None and str(remaining).strip() == "0":
+            reset = _header(headers, "X-RateLimit-Reset")
+            try:
+                r = float(reset)
+                b.pause(r - time.time() if r > 1e9 else r)  # epoch or seconds
+            except (TypeError, ValueError):
+                pass
+
+        if status == 429 or status == 503:
+            pause = parse_retry_after(_header(headers, "Retry-After"))
+            b.pause(pause if pause is not None else DEFAULT_BACKOFF)
+            b.set_rate(b.rate * 0.5)
+            with self._lock:
+                self._stats[host]["throttled"] += 1
+            return pause if pause is not None else DEFAULT_BACKOFF
+        if 200 <= status < 400:
+            b.set_rate(b.rate + b.ceiling * 0.05)
+        return None
+
+    # ---- reporting ----
+    def report(self) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for host, st in self._stats.items():
+                span = st["last"] - st["first"]
+                n = int(st["requests"])
+                out[host] = {
+                    "requests": n,
+                    "throttled": int(st["throttled"]),
+                    "seconds_waited": round(st["waited"], 3),
+                    "rate_now": round(self._buckets[host].rate, 3),
+                    "effective_rps": round((n - 1) / span, 3) if n > 1 and span > 0 else float(n),
+                }
+        return out
+
+    def summary(self) -> str:
+        lines = [f"  {h}: {r['requests']} req, {r['effective_rps']} req/s"
+                 + (f", {r['throttled']} throttled" if r["throttled"] else "")
+                 for h, r in sorted(self.report().items())]
+        return "Rate limiter:\n" + "\n".join(lines) if lines else ""
+
+
+class TransientHTTPError(Exception):
+    """Retryable HTTP failure (429 / 5xx); carries the server's Retry-After if sent."""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def wait_retry_after(retry_state) -> float:
+    """tenacity wait: honour Retry-After when present, else exponential 1..30 s."""
+    from .metrics import METRICS  # metrics imports this module
+
+    exc = retry_state.outcome.exception() if retry_state.outcome else None
+    ra = getattr(exc, "retry_after", None)
+    wait = min(max(ra, 0.0), 120.0) if ra is not None else min(30.0, max(1.0, 2 ** (retry_state.attempt_number - 1)))
+    url = retry_state.args[0] if retry_state.args and isinstance(retry_state.args[0], str) else "?"
+    METRICS.backoff(url, wait)
+    return wait
+
+
+# One limiter per process, shared by every script and helper.
+LIMITER = RateLimiter()
@@ -0,0 +1,280 @@
+"""
+Compact in-memory store for enriched records.
+
+A dict per record costs about a kilobyte before its values, and every
+record carries its own copy of strings such as the journal, the publisher
+or "Ecology; Marine Biology". For a department-wide export (tens of
+thousands of works) the scripts' per-row results and prefetched metadata
+therefore take far more memory than the data itself. RecordStore keeps the
+same records column by column instead:
+
+    store = RecordStore()
+    store["10.1/abc"] = {"journal": "Ecology", "authors": "A. Smith; B. Jones", "citation_count": 12}
+    store["10.1/abc"]   -> {"journal": "Ecology", "authors": "A. Smith; B. Jones", "citation_count": 12}
+
+Each column has a kind, chosen by name (INTERNED_COLUMNS, INT_COLUMNS,
+SEQ_COLUMNS; anything else is "text"):
+
+  - str   interned: one array('I') slot per record pointing into a shared
+          Interner, so each distinct value is stored once (ints too: a year
+          is "2019" in one script and 2019 in another)
+  - int   array('q'), for citation_count; "" (the scripts' "unknown") is
+          a sentinel as well as None
+  - seq   lists of strings (tags, funders) and '; '-joined strings (authors,
+          keywords), stored as interned IDs in one flat array('I'); reading
+          gives back a list or the identical joined string
+  - text  a plain list of references, for long unique strings (titles,
+          abstracts, summaries) where interning cannot help
+
+Values that do not fit their column's kind (a float in a str column, text in
+an int column, nested data) go to a small side dict unchanged, so
+the store is lossless: a record reads back equal to what was stored, keys in
+column order, and a key that was never set is left out rather than None.
+An empty record ({}, e.g. a DOI known to be missing upstream) reads back as {}.
+
+The store behaves like a dict of records (in, [], get, update, len, items)
+and to_frame() builds a DataFrame column by column, without per-record dicts.
+Writes take a lock; reads do not. `python bench/bench_memory.py` measures
+bytes per record against dicts and a pandas frame.
+"""
+import threading
+from array import array
+from typing import TYPE_CHECKING, Any, Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from .tables import LIST_COLUMNS, LIST_SEP
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+INTERNED_COLUMNS = frozenset({
+    "journal", "journal_abbrev", "publisher", "issn", "volume", "issue", "year",
+    "audience_level", "region_system", "study_type", "lab_project",
+})
+INT_COLUMNS = frozenset({"citation_count"})
+SEQ_COLUMNS = frozenset(LIST_COLUMNS) | {"authors"}
+
+# str columns: IDs 0 and 1 are reserved
+_ABSENT_ID, _NONE_ID = 0, 1
+# int columns
+_ABSENT_INT, _NONE_INT, _EMPTY_INT = -2**63, -2**63 + 1, -2**63 + 2
+_MIN_INT = -2**63 + 3
+# seq columns: length >= 0 is a list, <= -3 a joined string of (-3 - length) parts
+_ABSENT_LEN, _NONE_LEN, _JOINED = -1, -2, -3
+
+_ABSENT = object()  # text columns
+
+
+class Interner:
+    """Distinct strings (or ints), each stored once, by small integer ID."""
+
+    def __init__(self):
+        self.ids: Dict[Any, int] = {}
+        self.strings: List[Any] = [None, None]  # the reserved IDs
+        self._lock = threading.Lock()
+
+    def id(self, s: Any) -> int:
+        i = self.ids.get(s)
+        if i is None:
+            with self._lock:
+                i = self.ids.get(s)
+                if i is None:
+                    i = self.ids[s] = len(self.strings)
+                    self.strings.append(s)
+        return i
+
+    def __len__(self) -> int:
+        return len(self.strings) - 2
+
+
+class _Column:
+    __slots__ = ("name", "kind", "data", "starts")
+
+    def __init__(self, name: str, kind: str, rows: int):
+        self.name = name
+        self.kind = kind
+        self.starts: Optional[array] = None
+        if kind == "str":
+            self.data: Any = array("I", [_ABSENT_ID]) * rows
+        elif kind == "int":
+            self.data = array("q", [_ABSENT_INT]) * rows
+        elif kind == "seq":
+            self.data = array("i", [_ABSENT_LEN]) * rows  # lengths
+            self.starts = array("I", [0]) * rows          # offsets into RecordStore._items
+        else:
+            self.data = [_ABSENT] * rows
+
+
+def column_kind(name: str) -> str:
+    if name in INTERNED_COLUMNS:
+        return "str"
+    if name in INT_COLUMNS:
+        return "int"
+    if name in SEQ_COLUMNS:
+        return "seq"
+    return "text"
+
+
+class RecordStore:
+    def __init__(self, interner: Optional[Interner] = None):
+        self.strings = interner or Interner()
+        self._rows: Dict[Hashable, int] = {}
+        self._n = 0
+        self._cols: List[_Column] = []
+        self._by_name: Dict[str, _Column] = {}
+        self._items = array("I")  # interned IDs of all seq values, back to back
+        self._odd: Dict[Tuple[int, str], Any] = {}  # values that do not fit their column
+        self._lock = threading.Lock()
+
+    # ---- writing ----
+    def _column(self, name: str) -> _Column:
+        col = self._by_name.get(name)
+        if col is None:
+            col = self._by_name[name] = _Column(name, column_kind(name), self._n)
+            self._cols.append(col)
+        return col
+
+    def _store(self, col: _Column, row: int, v: Any) -> bool:
+        """Encode v into col at row; False if it does not fit the column's kind."""
+        kind = col.kind
+        if kind == "text":
+            col.data[row] = v
+        elif kind == "str":
+            if v is None:
+                col.data[row] = _NONE_ID
+            elif type(v) is str or type(v) is int:  # not bool: True == 1
+                col.data[row] = self.strings.id(v)
+            else:
+                return False
+        elif kind == "int":
+            if v is None:
+                col.data[row] = _NONE_INT
+            elif type(v) is str and not v:
+                col.data[row] = _EMPTY_INT
+            elif type(v) is int and _MIN_INT <= v < 2**63:
+                col.data[row] = v
+            else:
+                return False
+        else:  # seq
+            if v is None:
+                col.data[row] = _NONE_LEN
+                return True
+            if type(v) is str:
+                parts, joined = (v.split(LIST_SEP) if v else []), True
+            elif type(v) is list and all(type(x) is str for x in v):
+                parts, joined = v, False
+            else:
+                return False
+            col.starts[row] = len(self._items)
+            self._items.extend(self.strings.id(p) for p in parts)
+            col.data[row] = _JOINED - len(parts) if joined else len(parts)
+        return True
+
+    def __setitem__(self, key: Hashable, rec: Mapping[str, Any]) -> None:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = self._n
+                self._n += 1
+                for col in self._cols:
+                    self._grow(col)
+            else:  # overwrite: clear the old values (their seq items stay behind unused)
+                for col in self._cols:
+                    self._clear(col, row)
+                for k in [k for k in self._odd if k[0] == row]:
+                    del self._odd[k]
+            for name, v in rec.items():
+                col = self._column(str(name))
+                if not self._store(col, row, v):
+                    self._odd[(row, col.name)] = v
+
+    def _grow(self, col: _Column) -> None:
+        if col.kind == "str":
+            col.data.append(_ABSENT_ID)
+        elif col.kind == "int":
+            col.data.append(_ABSENT_INT)
+        elif col.kind == "seq":
+            col.data.append(_ABSENT_LEN)
+            col.starts.append(0)
+        else:
+            col.data.append(_ABSENT)
+
+    def _clear(self, col: _Column, row: int) -> None:
+        col.data[row] = {"str": _ABSENT_ID, "int": _ABSENT_INT, "seq": _ABSENT_LEN}.get(col.kind, _ABSENT)
+
+    def update(self, records: Mapping[Hashable, Mapping[str, Any]]) -> None:
+        for key, rec in records.items():
+            self[key] = rec
+
+    # ---- reading ----
+    def _value(self, col: _Column, row: int) -> Any:
+        """Decoded value, or _ABSENT."""
+        v = col.data[row]
+        kind = col.kind
+        if kind == "text":
+            return v
+        if kind == "str":
+            if v == _ABSENT_ID:
+                return self._odd.get((row, col.name), _ABSENT)
+            return None if v == _NONE_ID else self.strings.strings[v]
+        if kind == "int":
+            if v == _ABSENT_INT:
+                return self._odd.get((row, col.name), _ABSENT)
+            return None if v == _NONE_INT else "" if v == _EMPTY_INT else v
+        if v == _ABSENT_LEN:
+            return self._odd.get((row, col.name), _ABSENT)
+        if v == _NONE_LEN:
+            return None
+        start, strings = col.starts[row], self.strings.strings
+        if v >= 0:
+            return [strings[i] for i in self._items[start:start + v]]
+        return LIST_SEP.join(strings[i] for i in self._items[start:start + _JOINED - v])
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        out = {}
+        for col in self._cols:
+            v = self._value(col, row)
+            if v is not _ABSENT:
+                out[col.name] = v
+        return out
+
+    def __getitem__(self, key: Hashable) -> Dict[str, Any]:
+        return self._record(self._rows[key])
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        row = self._rows.get(key)
+        return default if row is None else self._record(row)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._rows)
+
+    def keys(self) -> Iterable[Hashable]:
+        return self._rows.keys()
+
+    def items(self) -> Iterator[Tuple[Hashable, Dict[str, Any]]]:
+        for key, row in self._rows.items():
+            yield key, self._record(row)
+
+    def columns(self) -> List[str]:
+        return [col.name for col in self._cols]
+
+    def to_frame(self, keys: Optional[Iterable[Hashable]] = None, dtype: Any = None) -> "pd.DataFrame":
+        """
+        DataFrame indexed by key (all keys, or the given ones in that order); unset cells are None.
+        dtype=object keeps every value as stored (pandas would make ints with gaps floats).
+        """
+        import pandas as pd
+
+        keys = list(self._rows) if keys is None else [k for k in keys if k in self._rows]
+        rows = [self._rows[k] for k in keys]
+        data = {}
+        for col in self._cols:
+            values = [self._value(col, r) for r in rows]
+            if any(v is not _ABSENT for v in values):
+                data[col.name] = [None if v is _ABSENT else v for v in values]
+        return pd.DataFrame(data, index=pd.Index(keys), dtype=dtype)
@@ -0,0 +1,297 @@
+"""
+Sharded runs of the sheet enrichers: several processes, one merged output.
+
+One Python process spends much of a large run holding the GIL (JSON
+parsing, abstract reconstruction, tagging), however many threads wait on
+the network. Sharding splits the rows over processes instead:
+
+    python enrich_pubs_mac_ext.py --in pubs.csv --out out.csv --shards 4     # run 4 shards, then merge
+    python enrich_pubs_mac_ext.py --in pubs.csv --out out.csv --shard 2/4    # one shard, by hand
+    python enrich.py merge --out out.csv --shards 4                          # merge by hand
+
+A row belongs to shard hash(key) % n + 1, where the key is the normalized
+DOI, else the normalized title, else the row's position, so a row keeps
+its shard across runs and edits elsewhere in the sheet (and --resume finds
+its journal). Shard i writes only its own rows to `out.shard-i-of-n.csv`
+(same format as --out) with their original positions in a SHARD_ROW
+column, and a small `.manifest.json` naming the input and its row count.
+Its checkpoint journal, run report and profile get the same suffix.
+
+Rate limits are a budget for the whole run: each shard paces every host
+and the LLM at 1/n of the normal rate (RateLimiter.scale), so the n
+processes together send what one process would. A 429 slows down only
+the shard that received it.
+
+--shards N is the launcher: it starts N copies of the same command line
+with --shard i/N, each logging to `out.shard-i-of-N.log`, waits for them,
+then merges. merge_shards() reads the shard tables, checks they come from
+the same input, puts the rows back in the original order and fails, naming
+the rows, if any row is missing or appears twice.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from .cache import normalize_doi
+from .ratelimit import LIMITER
+from .tables import table_format, write_table
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SHARD_ROW = "_shard_row"
+MAX_LISTED = 20  # missing rows named in an error
+LOG_TAIL = 15    # lines of a failed shard's log shown by the launcher
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'2/4' -> (2, 4); an argparse type."""
+    m = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", spec or "")
+    if not m or not 1 <= int(m.group(1)) <= int(m.group(2)):
+        raise argparse.ArgumentTypeError(f"expected i/n with 1 <= i <= n, got {spec!r}")
+    return int(m.group(1)), int(m.group(2))
+
+
+def shard_count(spec: str) -> int:
+    """'4' -> 4; an argparse type for --shards, which must be at least 1."""
+    try:
+        n = int(spec)
+    except (TypeError, ValueError):
+        n = 0
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"expected a number of shards >= 1, got {spec!r}")
+    return n
+
+
+def shard_path(path: str, i: int, n: int) -> str:
+    """out.csv -> out.shard-2-of-4.csv (also for journal, report and profile paths)."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{i}-of-{n}{ext}"
+
+
+# ---- which rows ----
+def _text(v: Any) -> str:
+    if v is None or (isinstance(v, float) and v != v):
+        return ""
+    return str(v).strip()
+
+
+def row_key(row: Any, position: int) -> str:
+    """What decides a row's shard: DOI, else title, else position."""
+    doi = normalize_doi(_text(row.get("doi")))
+    if doi:
+        return "doi:" + doi
+    title = re.sub(r"\W+", " ", _text(row.get("title")).lower()).strip()
+    if title:
+        return "title:" + title
+    return f"row:{position}"
+
+
+def shard_of(key: str, n: int) -> int:
+    """1..n, stable across runs and machines (unlike hash())."""
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big") % n + 1
+
+
+def shard_rows(df: "pd.DataFrame", i: int, n: int) -> List[Any]:
+    """Index labels of the rows of shard i/n, in sheet order."""
+    cols = [c for c in ("doi", "title") if c in df.columns]
+    records = df[cols].to_dict("records") if cols else [{}] * len(df)
+    return [idx for pos, (idx, row) in enumerate(zip(df.index, records)) if shard_of(row_key(row, pos), n) == i]
+
+
+def split_budget(n: int) -> float:
+    """This process gets 1/n of every host's rate; returns the share (for the LLM budget)."""
+    LIMITER.scale = 1.0 / n
+    return LIMITER.scale
+
+
+# ---- one shard's output ----
+def _manifest_path(path: str) -> str:
+    return path + ".manifest.json"
+
+
+def write_shard(df: "pd.DataFrame", rows: Sequence[Any], path: str, i: int, n: int, source: str) -> None:
+    """Write the given rows of df, with their positions in df, as shard i/n of the output."""
+    part = df.loc[list(rows)]
+    part.insert(0, SHARD_ROW, df.index.get_indexer(list(rows)))
+    write_table(part, path)
+    st = os.stat(source)
+    manifest = {"shard": i, "of": n, "rows": len(part), "total": len(df), "source": os.path.abspath(source),
+                "source_size": st.st_size, "source_mtime_ns": st.st_mtime_ns, "written": time.time()}
+    with open(_manifest_path(path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def _read_shard(path: str) -> "pd.DataFrame":
+    # CSV cells are kept as the exact text the shard wrote, so the merged file matches a single run
+    import pandas as pd
+
+    fmt = table_format(path)
+    if fmt == "csv":
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+    if fmt == "parquet":
+        return pd.read_parquet(path)
+    if fmt == "feather":
+        return pd.read_feather(path)
+    return pd.read_excel(path)
+
+
+# ---- merge ----
+def _listed(positions: Sequence[int]) -> str:
+    shown = ", ".join(str(p + 1) for p in positions[:MAX_LISTED])
+    return shown + (f" and {len(positions) - MAX_LISTED} more" if len(positions) > MAX_LISTED else "")
+
+
+def merge_shards(out: str, n: int, remove: bool = False) -> int:
+    """
+    Combine out.shard-1-of-n ... out.shard-n-of-n into out, in the original row
+    order; returns the row count. Raises ValueError (nothing is written) if a
+    shard is missing, the shards disagree about their input, or any row is
+    missing or duplicated. remove=True deletes the shard tables afterwards.
+    """
+    import pandas as pd
+
+    if n < 1:
+        raise ValueError(f"the number of shards must be at least 1, got {n}")
+    paths = [shard_path(out, i, n) for i in range(1, n + 1)]
+    manifests: List[Dict[str, Any]] = []
+    problems = []
+    for i, path in enumerate(paths, 1):
+        try:
+            with open(_manifest_path(path), "r", encoding="utf-8") as f:
+                manifests.append(json.load(f))
+        except (OSError, ValueError):
+            problems.append(f"shard {i}/{n}: no finished output ({path})")
+    if problems:
+        raise ValueError("; ".join(problems))
+    same = {(m["of"], m["total"], m["source"], m["source_size"], m["source_mtime_ns"]) for m in manifests}
+    if len(same) > 1:
+        raise ValueError("the shards were run on different inputs or shard counts: " + "; ".join(
+            f"shard {m['shard']}/{m['of']}: {m['source']} ({m['total']} rows, "
+            f"modified {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(m['source_mtime_ns'] / 1e9))})"
+            for m in manifests))
+    total = manifests[0]["total"]
+
+    parts = []
+    for i, (path, m) in enumerate(zip(paths, manifests), 1):
+        part = _read_shard(path)
+        if SHARD_ROW not in part.columns or len(part) != m["rows"]:
+            raise ValueError(f"shard {i}/{n}: {path} does not match its manifest "
+                             f"({len(part)} rows, expected {m['rows']})")
+        part[SHARD_ROW] = part[SHARD_ROW].astype(int)
+        parts.append(part)
+    merged = pd.concat(parts, ignore_index=True, sort=False)
+
+    positions = merged[SHARD_ROW]
+    duplicated = sorted(set(positions[positions.duplicated()].tolist()))
+    missing = sorted(set(range(total)) - set(positions.tolist()))
+    if duplicated or missing:
+        raise ValueError("; ".join(
+            ([f"{len(missing)} row(s) missing (numbered from 1): {_listed(missing)}"] if missing else [])
+            + ([f"{len(duplicated)} row(s) in more than one shard: {_listed(duplicated)}"] if duplicated else [])))
+
+    merged = merged.sort_values(SHARD_ROW, kind="stable").drop(columns=[SHARD_ROW]).reset_index(drop=True)
+    write_table(merged, out)
+    if remove:
+        for path in paths:
+            for p in (path, _manifest_path(path)):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+    return len(merged)
+
+
+# ---- launcher ----
+def _without_shards(argv: Sequence[str]) -> List[str]:
+    out: List[str] = []
+    skip = False
+    for a in argv:
+        if skip:
+            skip = False
+        elif a == "--shards":
+            skip = True
+        elif not a.startswith("--shards="):
+            out.append(a)
+    return out
+
+
+def _command(argv: Sequence[str], script: str) -> List[str]:
+    """The interpreter command line that ran this process, up to the script's own arguments."""
+    orig = list(getattr(sys, "orig_argv", []))
+    if argv and len(orig) > len(argv) and orig[-len(argv):] == list(argv):
+        # however it was started: the script, enrich.py, python -m, a wrapper
+        return [sys.executable] + orig[1:len(orig) - len(argv)]
+    return [sys.executable, script]
+
+
+def run_shards(argv: Optional[Sequence[str]], n: int, out: str, script: str) -> int:
+    """
+    Run the script's own command line as n shard processes (--shard i/n) at
+    once, then merge their outputs into out. Returns an exit code.
+    """
+    argv = list(sys.argv[1:] if argv is None else argv)
+    base = _command(argv, script)
+    args = _without_shards(argv)
+    procs = []
+    t0 = time.perf_counter()
+    try:
+        for i in range(1, n + 1):
+            log_path = shard_path(out, i, n) + ".log"
+            log = open(log_path, "w", encoding="utf-8")
+            proc = subprocess.Popen(base + args + ["--shard", f"{i}/{n}"], stdout=log, stderr=subprocess.STDOUT)
+            procs.append((i, proc, log, log_path))
+        print(f"Started {n} shards (logs: {shard_path(out, 1, n)}.log ...)")
+        failed = []
+        for i, proc, log, log_path in procs:
+            code = proc.wait()
+            log.close()
+            print(f"  shard {i}/{n}: {'done' if code == 0 else f'exit {code}'} "
+                  f"after {time.perf_counter() - t0:.1f}s")
+            if code != 0:
+                failed.append((i, log_path))
+    except KeyboardInterrupt:
+        for _, proc, log, _ in procs:
+            proc.terminate()
+            proc.wait()
+            log.close()
+        print("Interrupted; rerun with --resume to continue from the shard journals.")
+        return 130
+
+    for i, log_path in failed:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+            tail = f.readlines()[-LOG_TAIL:]
+        print(f"--- shard {i}/{n} ({log_path}) ---\n" + "".join(tail), file=sys.stderr)
+    if failed:
+        print("Not merging; fix the failure and rerun with --resume.", file=sys.stderr)
+        return 1
+    try:
+        rows = merge_shards(out, n, remove=True)
+    except (OSError, ValueError) as e:
+        print(f"Merge failed: {e}", file=sys.stderr)
+        return 1
+    print(f"[OK] Merged {n} shards, {rows} rows → {out}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> None:
+    ap = argparse.ArgumentParser(prog=prog, description="Merge the outputs of a sharded run into one table.")
+    ap.add_argument("--out", required=True, help="The --out the shards were run with")
+    ap.add_argument("--shards", type=shard_count, required=True, help="Number of shards (n in --shard i/n)")
+    ap.add_argument("--remove", action="store_true", help="Delete the shard tables after a successful merge")
+    args = ap.parse_args(argv)
+    try:
+        rows = merge_shards(args.out, args.shards, remove=args.remove)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Merge failed: {e}")
+    print(f"Merged {args.shards} shards, {rows} rows → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
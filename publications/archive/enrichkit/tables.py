@@ -0,0 +1,318 @@
+"""
+Reading and writing the publication tables: CSV, Excel, Parquet and Arrow.
+
+    df = read_table("stier_publications_from_bib.xlsx")   # Parquet sidecar after the first read
+    write_table(df, "pubs_enriched_out.parquet")
+
+The format follows the extension: .csv, .parquet / .pq, .feather / .arrow,
+anything else is Excel (as the scripts always assumed). Parquet and Arrow
+need pyarrow, an optional dependency (`pip install pyarrow`); CSV and Excel
+work without it.
+
+List columns. Inside the scripts, and in CSV/Excel, tag-like columns are
+'; '-joined strings ("kelp; urchins"). Parquet/Arrow output stores the
+columns in LIST_COLUMNS as typed list<string> columns instead, and
+read_table() joins any list column back into the same strings, so the
+scripts behave the same whatever the input format and a Parquet round trip
+keeps the lists.
+
+Sidecars. Parsing a large workbook with openpyxl takes seconds; reading the
+same frame from Parquet takes milliseconds. With pyarrow installed, the
+first read of a CSV/Excel file leaves `.<name>.sidecar.parquet` next to it:
+the frame exactly as pandas read it, stamped with the source's size, mtime
+and SHA-256. Later reads use the sidecar when size and mtime still match, or
+when only the mtime moved but the content hash is unchanged (the stamp is
+then refreshed). Any other change re-reads the source. Frames pyarrow
+cannot store losslessly (say, numbers and text mixed in one column) are
+simply not cached, and an unwritable directory just means no sidecar.
+
+Streaming. iter_rows() is for inputs that are only read row by row (a
+Zotero export going through enrich_publications.py): it reads just the
+named columns, a chunk of rows at a time, so memory follows the chunk size
+rather than the file. CSV is read as text (dtype=str): the values are those
+in the file whatever the chunk boundaries, where type inference per chunk
+could make "2019" an int in one chunk and 2019.0 in the next. Parquet is
+read batch by batch and Arrow through a memory map; Excel has no streaming
+reader and is loaded whole (via its sidecar) before being cut into chunks.
+
+Encoding. CSVs are UTF-8 or, failing that, latin-1 (old Excel exports).
+csv_encoding() decides by decoding the raw bytes incrementally, so a file is
+parsed once, instead of being parsed as UTF-8 and parsed again after a
+UnicodeDecodeError at the last row.
+"""
+import codecs
+import hashlib
+import importlib.util
+import json
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+LIST_COLUMNS = (
+    "theme_tags", "methods_tags", "impact_tags", "funders", "data_code_links", "press_links",
+    "keywords", "sdg_tags", "collaborators",
+)
+LIST_SEP = "; "
+
+SIDECAR_VERSION = 1  # bump when the way sources are read changes
+_META_KEY = b"enrichkit.sidecar"
+
+
+def has_arrow() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def table_format(path: str) -> str:
+    """'csv', 'parquet', 'feather' or 'excel', from the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".feather", ".arrow"):
+        return "feather"
+    return "excel"
+
+
+def _need_arrow(path: str) -> None:
+    if not has_arrow():
+        raise RuntimeError(f"{path}: Parquet/Arrow files need pyarrow (pip install pyarrow)")
+
+
+# ---- list columns ----
+def _joined(v: Any) -> Any:
+    if isinstance(v, (list, tuple)) or (hasattr(v, "tolist") and getattr(v, "ndim", 0) == 1):
+        return LIST_SEP.join(str(x) for x in list(v))
+    return v
+
+
+def _split(v: Any) -> Any:
+    if isinstance(v, str):
+        return [p.strip() for p in v.split(";") if p.strip()]
+    if isinstance(v, (list, tuple)):
+        return [str(x) for x in v]
+    return None  # NaN / None / anything else: missing
+
+
+def join_list_columns(df: "pd.DataFrame") -> "pd.DataFrame":
+    """Turn list-valued columns (as read from Parquet/Arrow) into '; '-joined strings, in place."""
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == object:
+            first = s.dropna().head(1).tolist()
+            if first and not isinstance(first[0], str) and _joined(first[0]) is not first[0]:
+                df[col] = s.map(_joined)
+    return df
+
+
+def _arrow_ready(df: "pd.DataFrame") -> "pd.DataFrame":
+    """Copy of df that pyarrow can write: LIST_COLUMNS as lists, unstorable mixed columns as text."""
+    import pyarrow as pa
+
+    out = df.copy()
+    for col in out.columns:
+        if out[col].dtype != object:
+            continue
+        if col in LIST_COLUMNS:
+            out[col] = out[col].map(_split)
+            continue
+        try:
+            pa.array(out[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. a numeric column that received text cells from the enrichers
+            out[col] = out[col].map(_as_text)
+    return out
+
+
+def _as_text(v: Any) -> Optional[str]:
+    if v is None or (isinstance(v, float) and v != v):
+        return None
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))  # 2019.0 from a float column reads better as "2019"
+    return str(v)
+
+
+# ---- sidecars ----
+def sidecar_path(path: str) -> str:
+    d, name = os.path.split(os.path.abspath(path))
+    return os.path.join(d, f".{name}.sidecar.parquet")
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stamp(path: str, digest: Optional[str] = None) -> Dict[str, Any]:
+    st = os.stat(path)
+    return {"version": SIDECAR_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "sha256": digest or _sha256(path)}
+
+
+def _read_sidecar(path: str) -> Optional["pd.DataFrame"]:
+    import pyarrow.parquet as pq
+
+    side = sidecar_path(path)
+    try:
+        meta = pq.read_schema(side).metadata or {}
+        stamp = json.loads(meta.get(_META_KEY, b"{}"))
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    if stamp.get("version") != SIDECAR_VERSION or stamp.get("size") != st.st_size:
+        return None
+    try:
+        table = pq.read_table(side)
+    except (OSError, ValueError):
+        return None
+    if stamp.get("mtime_ns") != st.st_mtime_ns:
+        # touched or copied; still usable if the bytes are the same
+        digest = _sha256(path)
+        if stamp.get("sha256") != digest:
+            return None
+        _write_sidecar(path, table, _stamp(path, digest))
+    return table.to_pandas()
+
+
+def _write_sidecar(path: str, table: Any, stamp: Dict[str, Any]) -> None:
+    import pyarrow.parquet as pq
+
+    side = sidecar_path(path)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _META_KEY: json.dumps(stamp)})
+    tmp = side + ".tmp"
+    try:
+        pq.write_table(table, tmp)
+        os.replace(tmp, side)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _cache_sidecar(path: str, df: "pd.DataFrame", stamp: Dict[str, Any]) -> None:
+    import pyarrow as pa
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        if not table.to_pandas().equals(df):
+            return  # would not come back identical
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, ValueError, TypeError):
+        return
+    _write_sidecar(path, table, stamp)
+
+
+# ---- reading / writing ----
+def csv_encoding(path: str) -> str:
+    """'utf-8' if the whole file decodes as UTF-8, else 'latin-1' (which decodes anything)."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "latin-1"
+    return "utf-8"
+
+
+def _read_source(path: str, fmt: str) -> "pd.DataFrame":
+    import pandas as pd
+
+    if fmt == "csv":
+        return pd.read_csv(path, encoding=csv_encoding(path))
+    return pd.read_excel(path)
+
+
+def read_table(path: str, sidecar: bool = True) -> "pd.DataFrame":
+    """Read a CSV/Excel/Parquet/Arrow file; list columns come back '; '-joined."""
+    import pandas as pd
+
+    fmt = table_format(path)
+    if fmt == "parquet":
+        _need_arrow(path)
+        return join_list_columns(pd.read_parquet(path))
+    if fmt == "feather":
+        _need_arrow(path)
+        return join_list_columns(pd.read_feather(path))
+
+    if not (sidecar and has_arrow()):
+        return _read_source(path, fmt)
+    df = _read_sidecar(path)
+    if df is not None:
+        return df
+    stamp = _stamp(path)  # before reading, so an edit during the read leaves a stale stamp
+    df = _read_source(path, fmt)
+    _cache_sidecar(path, df, stamp)
+    return df
+
+
+def _chunks(path: str, wanted: Iterable[str], chunksize: int, sidecar: bool) -> Iterator["pd.DataFrame"]:
+    """Opens the source now (so a bad path or header fails here); the chunks come lazily."""
+    import pandas as pd
+
+    wanted = set(wanted)
+    fmt = table_format(path)
+    if fmt == "csv":
+        return iter(pd.read_csv(path, encoding=csv_encoding(path), usecols=lambda c: c in wanted,
+                                dtype=str, chunksize=chunksize))
+    if fmt == "parquet":
+        _need_arrow(path)
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        cols = [c for c in pf.schema_arrow.names if c in wanted]
+        return (b.to_pandas() for b in pf.iter_batches(batch_size=chunksize, columns=cols))
+    if fmt == "feather":
+        _need_arrow(path)
+        import pyarrow as pa
+
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        cols = [c for c in reader.schema.names if c in wanted]
+
+        def batches() -> Iterator["pd.DataFrame"]:
+            for b in range(reader.num_record_batches):
+                batch = reader.get_batch(b).select(cols)
+                for off in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(off, chunksize).to_pandas()
+
+        return batches()
+    df = read_table(path, sidecar=sidecar)
+    df = df[[c for c in df.columns if c in wanted]]
+    return (df.iloc[off:off + chunksize] for off in range(0, len(df), chunksize))
+
+
+def iter_rows(path: str, columns: Iterable[str], chunksize: int = 5000,
+              sidecar: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    The rows of a table as dicts of just `columns` (those the file has), read
+    chunksize rows at a time. Missing cells are None, list columns '; '-joined.
+    """
+    chunks = _chunks(path, columns, max(1, int(chunksize)), sidecar)
+
+    def rows() -> Iterator[Dict[str, Any]]:
+        for chunk in chunks:
+            chunk = join_list_columns(chunk).astype(object)
+            yield from chunk.where(chunk.notna(), None).to_dict(orient="records")
+
+    return rows()
+
+
+def write_table(df: "pd.DataFrame", path: str) -> None:
+    """Write df (without its index) in the format of path's extension."""
+    fmt = table_format(path)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        _need_arrow(path)
+        _arrow_ready(df).to_parquet(path, index=False)
+    elif fmt == "feather":
+        _need_arrow(path)
+        _arrow_ready(df).reset_index(drop=True).to_feather(path)
+    else:
+        df.to_excel(path, index=False)
@@ -0,0 +1,184 @@
+"""
+Single-pass keyword tagger for the theme / audience / policy / methods / region
+heuristics in enrich_publications.py.
+
+TAG_TABLE declares every tag as (family, label, keywords). Each family reads
+one text segment (FAMILIES), and the keywords of each segment are compiled
+into one prefix-trie regex. A record is tagged by lowercasing every segment
+once and scanning it once. Matching is plain substring matching, same as the
+old `k in s` checks: overlapping keywords are found by re-searching one
+character after each hit, and a hit on a longer keyword also counts for any
+keyword inside it ("meta-analys" implies "meta-analy"). Long segments
+(abstracts + reference titles) skip the regex and use one C-level substring
+search per keyword, which is faster there.
+
+Segments built from a Crossref record (crossref_segments) are joined the way
+the old functions joined them, so a keyword spanning two fields matches (or
+not) exactly as before:
+  title      the row title                                    -> policy
+  container  first container-title (the journal)              -> audience
+  theme      "title container"                                -> theme
+  region     subject, subtitle, container titles (space join) -> region
+  methods    title + every string in the Crossref record,     -> methods
+             one per line
+
+The old methods check searched json.dumps of the whole record, so it also
+looked at funder names, author affiliations, DOIs and URLs ("10.1002/pca.2931"
+tags PCA); the methods segment keeps that by taking every string value, at
+any depth. Only the JSON syntax and key names are left out, and keywords
+could not match across those anyway.
+"""
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+# (family, label, keywords). Order matters: it is the output order for "multi"
+# families and the priority order for "first" families.
+TAG_TABLE: List[Tuple[str, Any, Tuple[str, ...]]] = [
+    ("theme", "Coral", ("coral", "acropora", "pocillopora", "reef")),
+    ("theme", "Kelp", ("kelp", "macroalgae")),
+    ("theme", "Mutualisms", ("mutualis", "symbio", "facilitation")),
+    ("theme", "Methods/Models", ("model", "bayesian", "surplus production", "statistical", "meta-analys")),
+    ("theme", "Policy/Management", ("management", "policy", "restoration", "fishery", "ecosystem-based")),
+
+    ("audience", "Research", ("ecology letters", "coral reefs", "marine ecology", "journal", "proceedings")),
+    ("audience", "Policy", ("current biology", "nature", "science")),
+
+    ("policy", True, ("management", "policy", "harvest control", "restoration")),
+
+    ("methods", "photogrammetry", ("photogrammetry",)),
+    ("methods", "Bayesian models", ("bayesian",)),
+    ("methods", "PERMANOVA", ("permanova",)),
+    ("methods", "PCoA", ("pcoa",)),
+    ("methods", "PCA", ("pca",)),
+    ("methods", "Meta-analysis", ("meta-analy",)),
+    ("methods", "Field experiment", ("field experiment",)),
+    ("methods", "Mesocosm", ("mesocosm",)),
+    ("methods", "Machine learning", ("machine learning",)),
+] + [
+    ("region", cand.title(), (cand,))
+    for cand in ["mo'orea", "moorea", "california", "dominican republic", "caribbean", "pacific", "polynesia"]
+]
+
+# family -> (kind, segment it reads)
+#   multi: list of every matching label      first: first matching label or ""
+#   flag:  True if anything matches, else None
+FAMILIES: Dict[str, Tuple[str, str]] = {
+    "theme": ("multi", "theme"),
+    "audience": ("first", "container"),
+    "policy": ("flag", "title"),
+    "methods": ("multi", "methods"),
+    "region": ("first", "region"),
+}
+
+# Crossref keys feeding the region segment, in join order
+REGION_KEYS = ("subject", "subtitle", "container-title", "short-container-title")
+
+# Segments longer than this are scanned with str `in` per keyword instead of the regex
+LONG_TEXT = 512
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex for a set of literals, factored by common prefix (far fewer branches to try per character)."""
+    trie: Dict[str, Any] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + emit(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        # a word ending here makes the rest optional; regex stays greedy, so the longest keyword wins
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+
+class Tagger:
+    def __init__(self, table: Sequence[Tuple[str, Any, Tuple[str, ...]]] = TAG_TABLE,
+                 families: Dict[str, Tuple[str, str]] = FAMILIES):
+        self.families = families
+        self._entries: Dict[str, List[Tuple[Any, frozenset]]] = {f: [] for f in families}
+        for fam, label, ks in table:
+            self._entries[fam].append((label, frozenset(ks)))
+        # One compiled matcher per segment, holding the keywords of the families that read it
+        self._matchers: Dict[str, Tuple[Any, Dict[str, frozenset], Tuple[str, ...]]] = {}
+        for seg in dict.fromkeys(seg for _, seg in families.values()):
+            keywords = list(dict.fromkeys(
+                k for fam, (_, s) in families.items() if s == seg
+                for _, ks in self._entries[fam] for k in ks))
+            implied = {k: frozenset(j for j in keywords if j in k) for k in keywords}
+            self._matchers[seg] = (re.compile(_trie_pattern(keywords)).search, implied, tuple(keywords))
+
+    def scan(self, segment: str, text: str) -> Set[str]:
+        """Every keyword of `segment`'s families occurring in text (already lowercased)."""
+        search, implied, keywords = self._matchers[segment]
+        if len(text) > LONG_TEXT:
+            # past a few hundred characters CPython's C substring search beats
+            # the regex engine's per-position loop, even with one pass per keyword
+            return {k for k in keywords if k in text}
+        found: Set[str] = set()
+        m = search(text)
+        while m:
+            found |= implied[m.group()]
+            m = search(text, m.start() + 1)
+        return found
+
+    def tag(self, segments: Dict[str, str]) -> Dict[str, Any]:
+        """Scan each segment once and decide every family from its hits."""
+        hits = {name: self.scan(name, text.lower())
+                for name, text in segments.items() if text and name in self._matchers}
+        out: Dict[str, Any] = {}
+        for fam, (kind, seg) in self.families.items():
+            found = hits.get(seg, set())
+            labels = [label for label, ks in self._entries[fam] if found & ks]
+            if kind == "multi":
+                out[fam] = list(dict.fromkeys(labels))
+            elif kind == "first":
+                out[fam] = labels[0] if labels else ""
+            else:
+                out[fam] = True if labels else None
+        return out
+
+
+def _texts(v: Any) -> List[str]:
+    if isinstance(v, list):
+        return [str(x) for x in v]
+    if isinstance(v, str):
+        return [v]
+    return []
+
+
+def _strings(v: Any) -> Iterator[str]:
+    """Every string value in a JSON-like structure, depth first."""
+    stack = [v]
+    while stack:
+        v = stack.pop()
+        if isinstance(v, str):
+            yield v
+        elif isinstance(v, dict):
+            stack.extend(reversed(list(v.values())))
+        elif isinstance(v, list):
+            stack.extend(reversed(v))
+
+
+def crossref_segments(title: str, cr: Optional[Dict[str, Any]], container: str = "") -> Dict[str, str]:
+    """Build the text segments the tagger scans from a row title + Crossref record."""
+    title = title or ""
+    container = container or ""
+    segments = {"title": title, "container": container, "theme": f"{title} {container}"}
+    if not cr:
+        return segments
+    region: List[str] = []
+    for k in REGION_KEYS:
+        region.extend(_texts(cr.get(k)))
+    segments["region"] = " ".join(region)
+    # one string per line, so (like the old JSON text) keywords never span two fields
+    segments["methods"] = "\n".join([title, *_strings(cr)])
+    return segments
+
+
+TAGGER = Tagger()
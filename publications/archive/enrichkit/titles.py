@@ -0,0 +1,211 @@
+"""
+Title -> OpenAlex work resolution for rows without a DOI.
+
+The old lookup sent `search=<title>&per_page=1` and took the first hit, so a
+row could pick up another paper's metadata. Here each search asks for a few
+candidates, and every candidate is scored against the row:
+
+  - title:  Dice coefficient of character trigrams of the normalized titles
+            (case, accents, punctuation and HTML ignored; a candidate's
+            subtitle may be missing on the row)
+  - year:   same year 1.0, off by one (preprint vs issue) 0.5, else 0
+  - author: first author's family name matches 1.0, else 0
+
+Missing row signals drop out of the weighting. The best candidate is used
+only when its score clears `threshold` and its title similarity clears
+MIN_TITLE; otherwise the row stays blank.
+
+Resolved rows go into a local index (the "title_index" source of the
+response cache, no expiry) as work IDs, and the work record itself under
+"openalex_work", so later runs skip the search entirely. The index is keyed
+by everything score() looks at, the normalized title, the year and the first
+author's family name, so two rows sharing a title ("Editorial", "Reply to
+...") are each scored on their own. A search that OpenAlex answered but whose
+candidates all fell short is remembered for MISS_TTL before being searched
+again; a failed search is not remembered.
+
+prefetch() runs the searches for many rows concurrently before the row loop
+(OpenAlex has no multi-title search, so this is the batching available).
+
+Given `select` (the fields the caller's mapper reads; see enrichkit/openalex.py),
+searches and work lookups ask OpenAlex only for those plus the ones score()
+reads, so the five candidates of a search do not come as five full works.
+"""
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .cache import DAY, ResponseCache, cached
+from .openalex import covers, projection, select_params
+
+OPENALEX_WORKS = "https://api.openalex.org/works"
+CANDIDATES = 5
+THRESHOLD = 0.8
+MIN_TITLE = 0.75
+WEIGHTS = {"title": 0.7, "year": 0.15, "author": 0.15}
+MISS_TTL = 30 * DAY
+WORKERS = 4
+
+GetJson = Callable[..., Dict[str, Any]]
+
+
+# ---- normalization / similarity ----
+def normalize_title(title: Any) -> str:
+    if not isinstance(title, str):
+        return ""
+    t = re.sub(r"<[^>]*>", " ", title)
+    # drop accents, then treat any other non-alphanumeric (incl. unicode dashes) as a space
+    t = "".join(ch for ch in unicodedata.normalize("NFKD", t) if not unicodedata.combining(ch)).lower()
+    return re.sub(r"[^a-z0-9]+", " ", t).strip()
+
+
+def trigrams(norm_title: str) -> FrozenSet[str]:
+    t = f"  {norm_title} "
+    return frozenset(t[i:i + 3] for i in range(len(t) - 2))
+
+
+def dice(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def first_author_family(authors: Any) -> str:
+    """'Stier, Adrian C.; ...' or 'Adrian C. Stier; ...' -> 'stier'."""
+    if not isinstance(authors, str) or not authors.strip():
+        return ""
+    first = authors.split(";")[0].strip()
+    family = first.split(",")[0] if "," in first else (first.split() or [""])[-1]
+    return normalize_title(family)
+
+
+def _year(v: Any) -> Optional[int]:
+    m = re.search(r"\b(1[89]\d\d|20\d\d)\b", str(v or ""))
+    return int(m.group(1)) if m else None
+
+
+def index_key(title: Any, year: Any = "", authors: Any = "") -> str:
+    """Title index key of a row: normalized title, year and first author ("" when no title)."""
+    norm = normalize_title(title)
+    return f"{norm}|{_year(year) or ''}|{first_author_family(authors)}" if norm else ""
+
+
+def score(title: str, year: Any, authors: Any, work: Dict[str, Any]) -> Tuple[float, float]:
+    """(overall score, title similarity) of an OpenAlex work for a row."""
+    row_tg = trigrams(normalize_title(title))
+    cand = normalize_title(work.get("title") or work.get("display_name") or "")
+    main = normalize_title((work.get("title") or "").split(":")[0])
+    t_sim = max(dice(row_tg, trigrams(cand)), dice(row_tg, trigrams(main)) if main else 0.0)
+
+    parts = {"title": t_sim}
+    y = _year(year)
+    if y is not None:
+        wy = _year(work.get("publication_year"))
+        parts["year"] = 1.0 if wy == y else 0.5 if wy is not None and abs(wy - y) == 1 else 0.0
+    fam = first_author_family(authors)
+    if fam:
+        ships = work.get("authorships") or []
+        name = ((ships[0] or {}).get("author") or {}).get("display_name", "") if ships else ""
+        parts["author"] = 1.0 if name and first_author_family(name) == fam else 0.0
+    total = sum(WEIGHTS[k] for k in parts)
+    return sum(WEIGHTS[k] * v for k, v in parts.items()) / total, t_sim
+
+
+# ---- resolver ----
+class TitleResolver:
+    def __init__(self, get_json: GetJson, cache: Optional[ResponseCache] = None,
+                 base: str = OPENALEX_WORKS, threshold: float = THRESHOLD,
+                 candidates: int = CANDIDATES, workers: int = WORKERS,
+                 select: Optional[Iterable[str]] = None):
+        self.get_json = get_json
+        self.cache = cache
+        self.base = base.rstrip("/")
+        self.threshold = threshold
+        self.candidates = candidates
+        self.workers = workers
+        # () = full works
+        self.fields = projection((score, "work"), also=("id", *select)) if select is not None else ()
+        self._has_fields = covers(self.fields)
+        self._memo: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"indexed": 0, "searched": 0, "matched": 0, "rejected": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _work(self, work_id: str) -> Dict[str, Any]:
+        short = work_id.rsplit("/", 1)[-1]
+
+        def fetch() -> Dict[str, Any]:
+            data = self.get_json(f"{self.base}/{short}", params=select_params(self.fields))
+            return data if isinstance(data, dict) and data.get("id") else {}
+        return cached(self.cache, "openalex_work", short, fetch, self._has_fields)
+
+    def _search(self, title: str) -> Optional[List[Dict[str, Any]]]:
+        """Candidate works, or None when the search got no answer (non-200 or unreadable)."""
+        data = self.get_json(self.base, params={"search": title, "per_page": self.candidates,
+                                                **select_params(self.fields)})
+        res = data.get("results") if isinstance(data, dict) else None
+        if not isinstance(res, list):
+            return None
+        return [w for w in res if isinstance(w, dict)]
+
+    def best(self, title: str, year: Any, authors: Any,
+             candidates: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], float]:
+        """The best-scoring candidate if it is good enough (else None), and its score."""
+        top, top_score = None, 0.0
+        for w in candidates:
+            s, t_sim = score(title, year, authors, w)
+            if s > top_score and t_sim >= MIN_TITLE:
+                top, top_score = w, s
+        return (top, top_score) if top_score >= self.threshold else (None, top_score)
+
+    def resolve(self, title: str, year: Any = "", authors: Any = "") -> Dict[str, Any]:
+        """OpenAlex work for a title, or {} when nothing matches confidently."""
+        key = index_key(title, year, authors)
+        if not key:
+            return {}
+        if key in self._memo:
+            return self._memo[key]
+        entry = self.cache.get("title_index", key) if self.cache is not None else None
+        if entry is not None:
+            self._count("indexed")
+            work = self._work(entry["id"]) if entry.get("id") else {}
+        else:
+            self._count("searched")
+            found = self._search(title)
+            if found is None:
+                return {}  # not memoized either: a later row may get an answer
+            work, s = self.best(title, year, authors, found)
+            self._count("matched" if work else "rejected")
+            if self.cache is not None:
+                if work:
+                    self.cache.set("title_index", key, {"id": work["id"], "score": round(s, 3)}, ttl=None)
+                    self.cache.set("openalex_work", work["id"].rsplit("/", 1)[-1], work)
+                else:
+                    self.cache.set("title_index", key, {"id": "", "score": round(s, 3)}, ttl=MISS_TTL)
+            work = work or {}
+        self._memo[key] = work
+        return work
+
+    def prefetch(self, rows: Iterable[Tuple[str, Any, Any]]) -> None:
+        """Resolve many (title, year, authors) rows up front, several searches at a time."""
+        todo = list({index_key(t, y, a): (t, y, a) for t, y, a in rows if normalize_title(t)}.values())
+        if not todo:
+            return
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="titles") as ex:
+            list(ex.map(lambda r: self._safe_resolve(*r), todo))
+
+    def _safe_resolve(self, title: str, year: Any, authors: Any) -> None:
+        try:
+            self.resolve(title, year, authors)
+        except Exception:
+            pass  # the row loop retries with its own error handling
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"Title resolver: {s['indexed']} from index, {s['searched']} searched, "
+                f"{s['matched']} matched, {s['rejected']} below threshold")